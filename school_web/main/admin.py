@@ -1,115 +1,221 @@
+import io
+
+from asgiref.sync import sync_to_async
 from django.contrib import admin
 from .models import *
 from django.urls import path
 from django.shortcuts import render
-from django.db.models import Count, Q
+from django.db.models import Count, Exists, OuterRef, Q
 from django.urls import reverse
 from django.utils.html import format_html
 from django.http import HttpResponseRedirect
-from collections import defaultdict
+from django.core.exceptions import PermissionDenied
+from django.contrib import messages
+from django import forms
+from . import enrollment, generator, occupancy, timetable, workload
+from .async_reports import ReportPage, async_admin_view, load_concurrently, load_sequentially
+from .report_cache import cached_report
+from .report_stats import ReportStats
+from .pagination import keyset_list, keyset_page
+from .exports import EXPORT_CHUNK_SIZE, ExportUnavailable, export_response
+from .forms import CsvImportForm, ExtraScheduleForm, FreeResourcesForm, ScheduleForm
+from .importers import ScheduleImporter, StudentImporter, TeacherImporter
+from .search import FullTextSearchMixin
+
+
+def _int_filter(value):
+    """Значение фильтра из GET как число, None для 'all' и пустых значений"""
+    if value and value != 'all':
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return None
+
+
+EXTRA_DAY_NAMES = dict(ExtraSchedule._meta.get_field('day_of_week').choices)
+EXTRA_LESSON_NAMES = dict(ExtraSchedule.LESSON_CHOICES)
+
+
+def _extra_schedule_list(schedules):
+    """Расписание занятия из снимка: тройки [день, номер занятия, кабинет]"""
+    return [
+        {'day': EXTRA_DAY_NAMES.get(day), 'time': EXTRA_LESSON_NAMES.get(lesson_number), 'cabinet': cabinet or "—"}
+        for day, lesson_number, cabinet in schedules
+    ]
+
+
+class CsvImportMixin:
+    """Загрузка записей из CSV на странице списка модели"""
+
+    importer_class = None
+    change_list_template = 'admin/import_change_list.html'
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('import-csv/', self.admin_site.admin_view(self.import_csv_view), name='%s_%s_import_csv' % info),
+        ] + super().get_urls()
+
+    def import_csv_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        result = None
+        form = CsvImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            # Файл читается потоком, без загрузки целиком в память
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            importer = self.importer_class(delimiter=form.cleaned_data['delimiter'])
+            result = importer.run(stream, dry_run=form.cleaned_data['dry_run'])
+            if result.saved:
+                messages.success(request, f'Загружено: новых {result.created}, обновлено {result.updated}')
+                info = self.model._meta.app_label, self.model._meta.model_name
+                return HttpResponseRedirect(reverse('admin:%s_%s_changelist' % info))
+
+        context = {
+            'form': form,
+            'result': result,
+            'errors': result.errors[:200] if result else [],
+            'columns': self.importer_class.fields + self.importer_class.relations + self.importer_class.extra_columns,
+            'required': self.importer_class.required,
+            'opts': self.model._meta,
+            'title': f'Загрузка из CSV: {self.model._meta.verbose_name_plural}',
+            **self.admin_site.each_context(request),
+        }
+        return render(request, 'admin/import_csv.html', context)
 
 
 @admin.register(Teacher)
-class TeacherAdmin(admin.ModelAdmin):
+class TeacherAdmin(FullTextSearchMixin, CsvImportMixin, admin.ModelAdmin):
     list_display = ['full_name', 'post', 'get_subjects_display', 'category', 'experience']
     list_filter = ['category', 'post', 'subjects']
     search_fields = ['full_name', 'post', 'education']
+    search_index = 'search_teacher'
     filter_horizontal = ['subjects']
     list_per_page = 20
+    importer_class = TeacherImporter
+
+    # Отчеты: имя метода <имя>_page и адрес страницы
+    REPORTS = [
+        'teachers_report', 'subjects_teachers_report', 'prof_retrain_report', 'teachers_classes_report',
+        'extra_activities_report', 'schedule_report', 'extra_schedule_report', 'workload_report',
+    ]
 
     def get_urls(self):
         # Получаем оригинальные URL от родительского класса
         urls = super().get_urls()
 
-        # Определяем кастомные URL - используем self.admin_site для доступа к методам класса
-        custom_urls = [
-            path('teachers-report/', self.admin_site.admin_view(self.teachers_report), name='teachers_report'),
-            path('subjects-teachers-report/', self.admin_site.admin_view(self.subjects_teachers_report),
-                 name='subjects_teachers_report'),
-            path('prof-retrain-report/', self.admin_site.admin_view(self.prof_retrain_report),
-                 name='prof_retrain_report'),
-            path('teachers-classes-report/', self.admin_site.admin_view(self.teachers_classes_report),
-                 name='teachers_classes_report'),
-            path('extra-activities-report/', self.admin_site.admin_view(self.extra_activities_report),
-                 name='extra_activities_report'),
-            path('schedule-report/', self.admin_site.admin_view(self.schedule_report), name='schedule_report'),
-            path('extra-schedule-report/', self.admin_site.admin_view(self.extra_schedule_report),
-                 name='extra_schedule_report'),
-        ]
+        # Каждый отчет в двух вариантах: обычный и асинхронный для ASGI,
+        # в котором независимые запросы отчета выполняются одновременно
+        custom_urls = []
+        for name in self.REPORTS:
+            slug = name.replace('_', '-')
+            custom_urls += [
+                path(f'{slug}/', self.report_view(name), name=name),
+                path(f'{slug}/async/', self.async_report_view(name), name=f'{name}_async'),
+            ]
 
         # Правильно объединяем URL - сначала кастомные, потом оригинальные
         return custom_urls + urls
 
-    def schedule_report(self, request):
+    def report_view(self, name):
+        """Отчет с проверкой доступа админки и кэшем страниц"""
+        def view(request):
+            return self.render_report(request, getattr(self, f'{name}_page')(request))
+        view.__name__ = name
+        return self.admin_site.admin_view(cached_report(name)(view))
+
+    def async_report_view(self, name):
+        """Тот же отчет, но запросы отчета выполняются одновременно в разных потоках"""
+        async def view(request):
+            page = await sync_to_async(getattr(self, f'{name}_page'))(request)
+            if not isinstance(page, ReportPage):
+                return page
+            results = await load_concurrently(page.loaders)
+            return await sync_to_async(self.render_page)(request, page, results)
+        view.__name__ = f'{name}_async'
+        return async_admin_view(self.admin_site, cached_report(name)(view))
+
+    def render_report(self, request, page):
+        # Выгрузка и подгрузка строк возвращают ответ сразу
+        if not isinstance(page, ReportPage):
+            return page
+        return self.render_page(request, page, load_sequentially(page.loaders))
+
+    def render_page(self, request, page, results):
+        context = {**page.build(results), **self.admin_site.each_context(request)}
+        return render(request, page.template, context)
+
+    def export_report(self, request, name, title, header, rows):
+        """Выгрузка отчета в формате из параметра download (csv, xlsx, pdf)"""
+        try:
+            return export_response(request.GET['download'], name, title, header, rows)
+        except ExportUnavailable as error:
+            messages.error(request, str(error))
+            query = request.GET.copy()
+            del query['download']
+            return HttpResponseRedirect(f"{request.path}?{query.urlencode()}")
+
+    def report_rows(self, request, name, page, **context):
+        """Фрагмент со строками следующей страницы отчета для кнопки «Показать еще»"""
+        return render(request, 'admin/teachers/rows_fragment.html', {
+            **context,
+            'page': page,
+            'rows_template': f'admin/teachers/rows/{name}.html',
+        })
+
+    def schedule_report_page(self, request):
         """Отчет по расписанию уроков"""
-        # Получаем все расписания с оптимизацией запросов
-        schedules = Schedule.objects.all().select_related(
-            'subject', 'school_class', 'cabinet'
-        ).order_by('day_of_week', 'lesson_number', 'school_class__number')
-
         # Фильтры
         day_filter = request.GET.get('day')
         class_filter = request.GET.get('class')
         subject_filter = request.GET.get('subject')
 
-        if day_filter and day_filter != 'all':
-            schedules = schedules.filter(day_of_week=day_filter)
-
-        if class_filter and class_filter != 'all':
-            schedules = schedules.filter(school_class_id=class_filter)
-
-        if subject_filter and subject_filter != 'all':
-            schedules = schedules.filter(subject_id=subject_filter)
-
-        # Статистика
-        total_lessons = schedules.count()
-
-        # Группируем по дням недели
-        day_stats = schedules.values('day_of_week').annotate(
-            count=Count('id')
-        ).order_by('day_of_week')
-
-        # Группируем по классам
-        class_stats = schedules.values(
-            'school_class__number'
-        ).annotate(
-            count=Count('id')
-        ).order_by('school_class__number')
-
-        # Получаем список классов для фильтра
-        all_classes = SchoolGroup.objects.all().order_by('number')
-        all_subjects = Subject.objects.all().order_by('full_name')
-
-        # Группируем расписание для удобного отображения
-        schedule_by_day = defaultdict(lambda: defaultdict(list))
-
-        for schedule in schedules:
-            day_name = schedule.get_day_of_week_display()
-            class_name = schedule.school_class.number if schedule.school_class else "—"
-            schedule_by_day[day_name][class_name].append(schedule)
-
-        # Сортируем дни и классы
-        day_order = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-        sorted_days = sorted(schedule_by_day.keys(), key=lambda x: day_order.index(x) if x in day_order else 99)
-
-        context = {
-            'schedule_by_day': dict(schedule_by_day),
-            'sorted_days': sorted_days,
-            'all_classes': all_classes,
-            'all_subjects': all_subjects,
-            'total_lessons': total_lessons,
-            'day_stats': day_stats,
-            'class_stats': class_stats,
-            'day_filter': day_filter or 'all',
-            'class_filter': class_filter or 'all',
-            'subject_filter': subject_filter or 'all',
-            'title': 'Отчет по расписанию уроков',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/schedule_report.html', context)
-
-    def extra_schedule_report(self, request):
+        if request.GET.get('download'):
+            schedules = Schedule.objects.all()
+            if _int_filter(day_filter):
+                schedules = schedules.filter(day_of_week=_int_filter(day_filter))
+            if _int_filter(class_filter):
+                schedules = schedules.filter(school_class_id=_int_filter(class_filter))
+            if _int_filter(subject_filter):
+                schedules = schedules.filter(subject_id=_int_filter(subject_filter))
+            rows = (
+                (timetable.DAY_NAMES.get(day), lesson, school_class, subject, teacher, cabinet, info)
+                for day, lesson, school_class, subject, teacher, cabinet, info in schedules.order_by(
+                    'day_of_week', 'lesson_number', 'school_class__number'
+                ).values_list(
+                    'day_of_week', 'lesson_number', 'school_class__number', 'subject__full_name',
+                    'teacher__full_name', 'cabinet__number', 'info',
+                ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'schedule_report', 'Отчет по расписанию уроков',
+                ['День', 'Урок', 'Класс', 'Предмет', 'Учитель', 'Кабинет', 'Примечание'], rows,
+            )
+
+        def build(results):
+            # Расписание берем из сетки в памяти: группировка и статистика за один проход
+            grid = results['grid']
+            report = grid.report(
+                day=_int_filter(day_filter),
+                class_id=_int_filter(class_filter),
+                subject_id=_int_filter(subject_filter),
+            )
+            return {
+                **report,
+                'all_classes': grid.classes,
+                'all_subjects': grid.subjects,
+                'day_filter': day_filter or 'all',
+                'class_filter': class_filter or 'all',
+                'subject_filter': subject_filter or 'all',
+                'title': 'Отчет по расписанию уроков',
+            }
+
+        # Сетка загружается одной группой запросов (и только после изменения расписания)
+        return ReportPage('admin/teachers/schedule_report.html', {'grid': timetable.get_grid}, build)
+
+    def extra_schedule_report_page(self, request):
         """Отчет по расписанию дополнительных занятий"""
         # Получаем все расписания дополнительных занятий
         extra_schedules = ExtraSchedule.objects.all().select_related(
@@ -126,65 +232,69 @@ class TeacherAdmin(admin.ModelAdmin):
         if activity_type_filter and activity_type_filter != 'all':
             extra_schedules = extra_schedules.filter(activity__activity_type=activity_type_filter)
 
-        # Статистика
-        total_activities = extra_schedules.count()
-
-        # Группируем по дням недели
-        day_stats = extra_schedules.values('day_of_week').annotate(
-            count=Count('id')
-        ).order_by('day_of_week')
-
-        # Группируем по типам занятий
-        type_stats = extra_schedules.values(
-            'activity__activity_type'
-        ).annotate(
-            count=Count('id')
-        ).order_by('activity__activity_type')
-
-        # Группируем расписание для удобного отображения - простая структура
-        schedule_data = []
-        day_order = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
-
-        # Сначала создаем структуру для всех дней
-        day_dict = {day_name: [] for day_name in day_order}
-
-        for schedule in extra_schedules:
-            day_name = schedule.get_day_of_week_display()
-            day_dict[day_name].append({
-                'schedule': schedule,
-                'activity': schedule.activity,
-                'teacher': schedule.activity.teacher,
-                'cabinet': schedule.cabinet,
-                'time': schedule.get_lesson_number_display(),
-                'day': day_name
-            })
-
-        # Преобразуем в список для шаблона
-        for day_name in day_order:
-            activities = day_dict[day_name]
-            if activities:
-                schedule_data.append({
-                    'day_name': day_name,
-                    'activities': sorted(activities, key=lambda x: x['schedule'].lesson_number)
+        if request.GET.get('download'):
+            rows = (
+                (schedule.get_day_of_week_display(), schedule.get_lesson_number_display(),
+                 schedule.activity.name, schedule.activity.get_activity_type_display(),
+                 schedule.activity.teacher.full_name, schedule.cabinet.number, schedule.activity.max_students)
+                for schedule in extra_schedules.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'extra_schedule_report', 'Отчет по расписанию дополнительных занятий',
+                ['День', 'Время', 'Занятие', 'Тип', 'Преподаватель', 'Кабинет', 'Мест'], rows,
+            )
+
+        # Статистика одним запросом: общее количество, по дням недели и по типам занятий
+        stats = ReportStats(extra_schedules)
+        stats.count('total_activities')
+        stats.breakdown('day_stats', 'day_of_week', order='day_of_week')
+        stats.breakdown('type_stats', 'activity__activity_type', order='activity__activity_type')
+
+        def build(results):
+            # Группируем расписание для удобного отображения - простая структура
+            schedule_data = []
+            day_order = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота']
+
+            # Сначала создаем структуру для всех дней
+            day_dict = {day_name: [] for day_name in day_order}
+
+            for schedule in results['schedules']:
+                day_name = schedule.get_day_of_week_display()
+                day_dict[day_name].append({
+                    'schedule': schedule,
+                    'activity': schedule.activity,
+                    'teacher': schedule.activity.teacher,
+                    'cabinet': schedule.cabinet,
+                    'time': schedule.get_lesson_number_display(),
+                    'day': day_name
                 })
 
-        context = {
-            'schedule_data': schedule_data,
-            'total_activities': total_activities,
-            'day_stats': day_stats,
-            'type_stats': type_stats,
-            'day_filter': day_filter or 'all',
-            'activity_type_filter': activity_type_filter or 'all',
-            'title': 'Отчет по расписанию дополнительных занятий',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/extra_schedule_report.html', context)
-    def extra_activities_report(self, request):
+            # Преобразуем в список для шаблона
+            for day_name in day_order:
+                activities = day_dict[day_name]
+                if activities:
+                    schedule_data.append({
+                        'day_name': day_name,
+                        'activities': sorted(activities, key=lambda x: x['schedule'].lesson_number)
+                    })
+
+            return {
+                'schedule_data': schedule_data,
+                **results['stats'],
+                'day_filter': day_filter or 'all',
+                'activity_type_filter': activity_type_filter or 'all',
+                'title': 'Отчет по расписанию дополнительных занятий',
+            }
+
+        return ReportPage('admin/teachers/extra_schedule_report.html', {
+            'schedules': lambda: list(extra_schedules),
+            'stats': stats.compute,
+        }, build)
+
+    def extra_activities_report_page(self, request):
         """Отчет по дополнительным занятиям"""
-        # Получаем все дополнительные занятия
-        activities = ExtraActivity.objects.all().select_related('teacher').prefetch_related(
-            'extraschedule_set').order_by('name')
+        # Готовые строки занятий с преподавателем и расписанием из снимка
+        activities = ActivitySnapshot.objects.order_by('name', 'activity_id')
 
         # Фильтры
         activity_type = request.GET.get('activity_type')
@@ -194,181 +304,273 @@ class TeacherAdmin(admin.ModelAdmin):
             activities = activities.filter(activity_type=activity_type)
 
         if is_active and is_active != 'all':
-            activities = activities.filter(is_active=(is_active == 'yes'))
-
-        # Статистика
-        total_activities = activities.count()
-        active_activities = activities.filter(is_active=True).count()
-        inactive_activities = total_activities - active_activities
-
-        # Группируем по типам занятий
-        type_stats = activities.values('activity_type').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        # Группируем по преподавателям
-        teacher_stats = activities.values(
-            'teacher__full_name',
-            'teacher__post'
-        ).annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        # Подготавливаем данные для отчета
-        activity_data = []
-        for activity in activities:
-            schedules = activity.extraschedule_set.all()
-            schedule_count = schedules.count()
-
-            # Формируем список расписаний
-            schedule_list = []
-            for schedule in schedules:
-                schedule_list.append({
-                    'day': schedule.get_day_of_week_display(),
-                    'time': schedule.get_lesson_number_display(),
-                    'cabinet': schedule.cabinet.number if schedule.cabinet else "—"
-                })
-
-            activity_data.append({
-                'activity': activity,
-                'teacher': activity.teacher,
-                'schedules': schedule_list,
-                'schedule_count': schedule_count,
-                'max_students': activity.max_students,
-                'is_active': activity.is_active,
-            })
-
-        context = {
-            'activity_data': activity_data,
-            'total_activities': total_activities,
-            'active_activities': active_activities,
-            'inactive_activities': inactive_activities,
-            'type_stats': type_stats,
-            'teacher_stats': teacher_stats,
-            'activity_type_filter': activity_type or 'all',
-            'is_active_filter': is_active or 'all',
-            'title': 'Отчет по дополнительным занятиям',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/extra_activities_report.html', context)
-
-    def teachers_classes_report(self, request):
+            # is_active=True Django пишет в SQLite как голое "is_active", а по
+            # нему индекс не используется; IN дает сравнение со значением
+            activities = activities.filter(is_active__in=[is_active == 'yes'])
+
+        if request.GET.get('download'):
+            rows = (
+                (activity.name, activity.get_activity_type_display(), activity.teacher_name,
+                 'Да' if activity.is_active else 'Нет',
+                 ', '.join(f"{day['day']} {day['time']} каб. {day['cabinet']}"
+                           for day in _extra_schedule_list(activity.schedules)),
+                 activity.max_students)
+                for activity in activities.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'extra_activities_report', 'Отчет по дополнительным занятиям',
+                ['Занятие', 'Тип', 'Преподаватель', 'Активно', 'Расписание', 'Мест'], rows,
+            )
+
+        # Статистика одним запросом: счетчики, по типам занятий и по преподавателям
+        stats = ReportStats(activities)
+        stats.count('total_activities')
+        stats.count('active_activities', Q(is_active=True))
+        stats.breakdown('type_stats', 'activity_type')
+        stats.breakdown('teacher_stats', 'teacher_name', 'teacher_post')
+
+        def build(results):
+            stats = results['stats']
+            stats['inactive_activities'] = stats['total_activities'] - stats['active_activities']
+
+            # Подготавливаем данные для отчета
+            activity_data = [
+                {
+                    'activity': activity,
+                    'teacher': {'full_name': activity.teacher_name, 'post': activity.teacher_post},
+                    'schedules': _extra_schedule_list(activity.schedules),
+                    'schedule_count': activity.schedule_count,
+                    'max_students': activity.max_students,
+                    'is_active': activity.is_active,
+                }
+                for activity in results['activities']
+            ]
+
+            return {
+                'activity_data': activity_data,
+                **stats,
+                'activity_type_filter': activity_type or 'all',
+                'is_active_filter': is_active or 'all',
+                'title': 'Отчет по дополнительным занятиям',
+            }
+
+        return ReportPage('admin/teachers/extra_activities_report.html', {
+            'activities': lambda: list(activities),
+            'stats': stats.compute,
+        }, build)
+
+    def teachers_classes_report_page(self, request):
         """Отчет по учителям и классам"""
-        # Получаем всех учителей с классами
-        teachers = Teacher.objects.all().prefetch_related('schoolgroup_set').order_by('full_name')
+        # Готовые строки учителей с классами и кабинетами из снимка
+        teachers = TeacherClassesSnapshot.objects.all()
 
         # Фильтры
         has_classes = request.GET.get('has_classes')
+        # classes_count не бывает отрицательным, а NOT (...) индексом не покрывается
         if has_classes == 'yes':
-            teachers = teachers.filter(schoolgroup__isnull=False).distinct()
+            teachers = teachers.filter(classes_count__gt=0)
         elif has_classes == 'no':
-            teachers = teachers.filter(schoolgroup__isnull=True)
-
-        # Статистика
-        total_teachers = Teacher.objects.count()
-        with_classes = Teacher.objects.filter(schoolgroup__isnull=False).distinct().count()
-        without_classes = total_teachers - with_classes
-
-        # Группируем по должностям
-        post_stats = teachers.values('post').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        # Подготавливаем данные для отчета
-        teacher_data = []
-        for teacher in teachers:
-            classes = teacher.schoolgroup_set.all()
-            cabinets = teacher.cabinet_set.all()
-
-            teacher_data.append({
-                'teacher': teacher,
-                'classes': classes,
-                'classes_count': classes.count(),
-                'cabinet_numbers': ", ".join([cab.number for cab in cabinets]) if cabinets else "—",
-                'cabinets_count': cabinets.count(),
-            })
-
-        context = {
-            'teacher_data': teacher_data,
-            'total_teachers': total_teachers,
-            'with_classes': with_classes,
-            'without_classes': without_classes,
-            'post_stats': post_stats,
-            'has_classes_filter': has_classes,
-            'title': 'Отчет по учителям и классам',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/teachers_classes_report.html', context)
-
-    def prof_retrain_report(self, request):
+            teachers = teachers.filter(classes_count=0)
+
+        if request.GET.get('download'):
+            rows = (
+                (teacher.full_name, teacher.post, teacher.category,
+                 ', '.join(number for number, _ in teacher.classes),
+                 teacher.cabinet_numbers,
+                 'Классный руководитель' if teacher.classes_count else 'Без класса')
+                for teacher in teachers.order_by('full_name', 'teacher_id').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'teachers_classes_report', 'Отчет по учителям и классам',
+                ['Учитель', 'Должность', 'Категория', 'Классы', 'Кабинеты', 'Статус'], rows,
+            )
+
+        def teacher_rows(page):
+            # Подготавливаем данные для одной страницы отчета
+            return [
+                {
+                    'teacher': teacher,
+                    'classes': [{'number': number, 'cabinet': {'number': cabinet}} for number, cabinet in teacher.classes],
+                    'classes_count': teacher.classes_count,
+                    'cabinet_numbers': teacher.cabinet_numbers or "—",
+                    'cabinets_count': teacher.cabinets_count,
+                }
+                for teacher in page.rows
+            ]
+
+        if request.GET.get('after'):
+            page = keyset_page(teachers, ('full_name', 'teacher_id'), request.GET.get('after'))
+            return self.report_rows(request, 'teachers_classes_report', page, teacher_data=teacher_rows(page))
+
+        # Статистика по всем отфильтрованным учителям одним запросом
+        stats = ReportStats(teachers)
+        stats.count('total_teachers')
+        stats.count('with_classes', Q(classes_count__gt=0))
+        stats.breakdown('post_stats', 'post')
+
+        def build(results):
+            stats = results['stats']
+            stats['without_classes'] = stats['total_teachers'] - stats['with_classes']
+            return {
+                'teacher_data': teacher_rows(results['page']),
+                'page': results['page'],
+                **stats,
+                'has_classes_filter': has_classes,
+                'title': 'Отчет по учителям и классам',
+            }
+
+        return ReportPage('admin/teachers/teachers_classes_report.html', {
+            'page': lambda: keyset_page(teachers, ('full_name', 'teacher_id')),
+            'stats': stats.compute,
+        }, build)
+
+    def workload_report_page(self, request):
+        """Отчет о недельной нагрузке учителей"""
+        # Фильтр по нагрузке: недогрузка, норма, перегрузка
+        load_filter = request.GET.get('load')
+        status = load_filter if load_filter in workload.STATUS_NAMES else None
+
+        if request.GET.get('download'):
+            rows = (
+                (row.full_name, row.post, *row.days,
+                 ', '.join(f'{name} ({count})' for name, count in row.subjects),
+                 row.lessons, row.extra, row.total, row.status_name)
+                for row in workload.Workload.load().filtered(status)
+            )
+            return self.export_report(
+                request, 'workload_report', 'Отчет о нагрузке учителей',
+                ['Учитель', 'Должность', *(name for _, name in timetable.DAY_CHOICES), 'Предметы',
+                 'Уроков', 'Доп. занятий', 'Всего', 'Нагрузка'], rows,
+            )
+
+        if request.GET.get('after'):
+            rows = workload.Workload.load().filtered(status)
+            page = keyset_list(rows, ('full_name', 'id'), request.GET.get('after'))
+            return self.report_rows(request, 'workload_report', page, teacher_data=page.rows)
+
+        def build(results):
+            rows = results['workload'].filtered(status)
+            page = keyset_list(rows, ('full_name', 'id'))
+            return {
+                'teacher_data': page.rows,
+                'page': page,
+                **results['workload'].stats(rows),
+                'day_names': [name for _, name in timetable.DAY_CHOICES],
+                'min_lessons': workload.MIN_LESSONS,
+                'max_lessons': workload.MAX_LESSONS,
+                'load_filter': load_filter or 'all',
+                'title': 'Отчет о нагрузке учителей',
+            }
+
+        # Все слоты загружаются одним набором запросов независимо от числа учителей
+        return ReportPage('admin/teachers/workload_report.html', {
+            'workload': workload.Workload.load,
+        }, build)
+
+    def prof_retrain_report_page(self, request):
         """Отчет по переподготовке преподавателей"""
         # Получаем всех преподавателей с переподготовкой
         teachers = Teacher.objects.all().order_by('full_name')
 
         # Фильтры
         has_retrain = request.GET.get('has_retrain')
+        with_retrain = Q(prof_retrain__isnull=False) & ~Q(prof_retrain__exact='')
         if has_retrain == 'yes':
-            teachers = teachers.filter(prof_retrain__isnull=False).exclude(prof_retrain__exact='')
+            teachers = teachers.filter(with_retrain)
         elif has_retrain == 'no':
             teachers = teachers.filter(Q(prof_retrain__isnull=True) | Q(prof_retrain__exact=''))
 
-        # Статистика
-        total_teachers = Teacher.objects.count()
-        with_retrain = Teacher.objects.filter(
-            prof_retrain__isnull=False
-        ).exclude(prof_retrain__exact='').count()
-        without_retrain = total_teachers - with_retrain
-
-        # Группируем по категориям
-        category_stats = teachers.values('category').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        context = {
-            'teachers': teachers,
-            'total_teachers': total_teachers,
-            'with_retrain': with_retrain,
-            'without_retrain': without_retrain,
-            'category_stats': category_stats,
-            'has_retrain_filter': has_retrain,
-            'title': 'Отчет по профессиональной переподготовке преподавателей',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/prof_retrain_report.html', context)
-
-    def subjects_teachers_report(self, request):
+        if request.GET.get('download'):
+            rows = (
+                (teacher.full_name, teacher.post, teacher.category, teacher.prof_retrain,
+                 'Есть' if teacher.prof_retrain else 'Нет')
+                for teacher in teachers.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'prof_retrain_report', 'Отчет по профессиональной переподготовке преподавателей',
+                ['ФИО преподавателя', 'Должность', 'Категория', 'Профессиональная переподготовка', 'Статус'], rows,
+            )
+
+        if request.GET.get('after'):
+            page = keyset_page(teachers, ('full_name', 'id'), request.GET.get('after'))
+            return self.report_rows(request, 'prof_retrain_report', page, teachers=page.rows)
+
+        # Статистика по всем отфильтрованным преподавателям одним запросом
+        stats = ReportStats(teachers)
+        stats.count('total_teachers')
+        stats.count('with_retrain', with_retrain)
+        stats.breakdown('category_stats', 'category')
+
+        def build(results):
+            stats = results['stats']
+            stats['without_retrain'] = stats['total_teachers'] - stats['with_retrain']
+            return {
+                'teachers': results['page'].rows,
+                'page': results['page'],
+                **stats,
+                'has_retrain_filter': has_retrain,
+                'title': 'Отчет по профессиональной переподготовке преподавателей',
+            }
+
+        return ReportPage('admin/teachers/prof_retrain_report.html', {
+            'page': lambda: keyset_page(teachers, ('full_name', 'id')),
+            'stats': stats.compute,
+        }, build)
+
+    def subjects_teachers_report_page(self, request):
         """Отчет по предметам и преподавателям"""
         # Получаем все предметы с преподавателями
         subjects = Subject.objects.all().prefetch_related('teacher_set').order_by('full_name')
 
-        # Статистика
-        total_subjects = subjects.count()
-        subjects_with_teachers = subjects.filter(teacher__isnull=False).distinct().count()
-        subjects_without_teachers = total_subjects - subjects_with_teachers
-
-        # Группируем данные для отчета
-        subject_data = []
-        for subject in subjects:
-            teachers = subject.teacher_set.all()
-            subject_data.append({
-                'subject': subject,
-                'teachers': teachers,
-                'teachers_count': teachers.count()
-            })
-
-        context = {
-            'subject_data': subject_data,
-            'total_subjects': total_subjects,
-            'subjects_with_teachers': subjects_with_teachers,
-            'subjects_without_teachers': subjects_without_teachers,
-            'title': 'Отчет по предметам и преподавателям',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/subjects_teachers_report.html', context)
+        if request.GET.get('download'):
+            rows = (
+                (subject.full_name, subject.short_name,
+                 ', '.join(teacher.full_name for teacher in subject.teacher_set.all()),
+                 len(subject.teacher_set.all()))
+                for subject in subjects.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'subjects_teachers_report', 'Отчет по предметам и преподавателям',
+                ['Предмет', 'Сокращенное название', 'Преподаватели', 'Кол-во преподавателей'], rows,
+            )
+
+        def subject_rows(page):
+            # Группируем данные для одной страницы отчета
+            subject_data = []
+            for subject in page.rows:
+                teachers = subject.teacher_set.all()
+                subject_data.append({
+                    'subject': subject,
+                    'teachers': teachers,
+                    'teachers_count': len(teachers)
+                })
+            return subject_data
+
+        if request.GET.get('after'):
+            page = keyset_page(subjects, ('full_name', 'id'), request.GET.get('after'))
+            return self.report_rows(request, 'subjects_teachers_report', page, subject_data=subject_rows(page))
+
+        # Статистика по всем предметам одним запросом
+        stats = ReportStats(subjects)
+        stats.count('total_subjects')
+        stats.count('subjects_with_teachers', Exists(
+            Teacher.subjects.through.objects.filter(subject=OuterRef('pk'))
+        ))
+
+        def build(results):
+            stats = results['stats']
+            stats['subjects_without_teachers'] = stats['total_subjects'] - stats['subjects_with_teachers']
+            return {
+                'subject_data': subject_rows(results['page']),
+                'page': results['page'],
+                **stats,
+                'title': 'Отчет по предметам и преподавателям',
+            }
+
+        return ReportPage('admin/teachers/subjects_teachers_report.html', {
+            'page': lambda: keyset_page(subjects, ('full_name', 'id')),
+            'stats': stats.compute,
+        }, build)
 
     # Используем кастомный шаблон
     change_list_template = "admin/teachers/teacher_change_list.html"
@@ -383,31 +585,44 @@ class TeacherAdmin(admin.ModelAdmin):
         }),
     )
 
-    def teachers_report(self, request):
+    def teachers_report_page(self, request):
         # Получаем всех преподавателей с оптимизацией запроса
         teachers = Teacher.objects.all().prefetch_related('subjects').order_by('full_name')
 
-        # Статистика по категориям
-        categories_stats = Teacher.objects.values('category').annotate(
-            count=Count('id')
-        ).order_by('-count')
-
-        # Статистика по должностям
-        posts_stats = Teacher.objects.values('post').annotate(
-            count=Count('id')
-        ).order_by('-count')
+        if request.GET.get('download'):
+            rows = (
+                (teacher.full_name, teacher.post, ', '.join(subject.full_name for subject in teacher.subjects.all()),
+                 teacher.category, teacher.education, teacher.experience, teacher.prof_retrain)
+                for teacher in teachers.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+            )
+            return self.export_report(
+                request, 'teachers_report', 'Отчет о преподавательском составе',
+                ['ФИО', 'Должность', 'Предметы', 'Категория', 'Образование', 'Стаж', 'Проф.переподготовка'], rows,
+            )
+
+        if request.GET.get('after'):
+            page = keyset_page(teachers, ('full_name', 'id'), request.GET.get('after'))
+            return self.report_rows(request, 'teachers_report', page, teachers=page.rows)
+
+        # Статистика по категориям и должностям одним запросом
+        stats = ReportStats(teachers)
+        stats.count('total_count')
+        stats.breakdown('categories_stats', 'category')
+        stats.breakdown('posts_stats', 'post')
 
         # Контекст для шаблона
-        context = {
-            'teachers': teachers,
-            'total_count': teachers.count(),
-            'categories_stats': categories_stats,
-            'posts_stats': posts_stats,
-            'title': 'Отчет о преподавательском составе',
-            **self.admin_site.each_context(request)
-        }
-
-        return render(request, 'admin/teachers/report_template.html', context)
+        def build(results):
+            return {
+                'teachers': results['page'].rows,
+                'page': results['page'],
+                **results['stats'],
+                'title': 'Отчет о преподавательском составе',
+            }
+
+        return ReportPage('admin/teachers/report_template.html', {
+            'page': lambda: keyset_page(teachers, ('full_name', 'id')),
+            'stats': stats.compute,
+        }, build)
 
     # Дополнительные методы для админки
     def get_queryset(self, request):
@@ -441,6 +656,7 @@ class CabinetAdmin(admin.ModelAdmin):
     list_display = ['number', 'teacher']
     list_filter = ['teacher']
     search_fields = ['number', 'teacher__full_name']
+    list_select_related = ['teacher']
 
 
 @admin.register(Subject)
@@ -448,10 +664,15 @@ class SubjectAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'short_name', 'teachers_count']
     search_fields = ['full_name', 'short_name']
 
+    def get_queryset(self, request):
+        # Количество учителей считаем в том же запросе, что и список предметов
+        return super().get_queryset(request).annotate(teachers_count=Count('teacher', distinct=True))
+
     def teachers_count(self, obj):
-        return obj.teacher_set.count()
+        return obj.teachers_count
 
     teachers_count.short_description = 'Количество учителей'
+    teachers_count.admin_order_field = 'teachers_count'
 
 
 @admin.register(SchoolGroup)
@@ -459,26 +680,36 @@ class SchoolClassAdmin(admin.ModelAdmin):
     list_display = ['number', 'teacher', 'cabinet']
     list_filter = ['teacher']
     search_fields = ['number', 'teacher__full_name']
+    list_select_related = ['teacher', 'cabinet']
 
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(FullTextSearchMixin, CsvImportMixin, admin.ModelAdmin):
+    importer_class = StudentImporter
     list_display = ['full_name', 'school_class', 'phone']
     list_filter = ['school_class']
     search_fields = ['full_name', 'parent_name', 'phone']
+    search_index = 'search_student'
+    list_select_related = ['school_class']
 
 
 @admin.register(Schedule)
-class ScheduleAdmin(admin.ModelAdmin):
+class ScheduleAdmin(CsvImportMixin, admin.ModelAdmin):
+    form = ScheduleForm
+    importer_class = ScheduleImporter
+    change_list_template = 'admin/schedule_change_list.html'
     list_display = [
         'day_of_week_display',
         'lesson_display',
         'subject',
+        'teacher',
         'school_class',
         'cabinet'
     ]
     list_filter = ['day_of_week', 'lesson_number', 'subject', 'school_class']
-    search_fields = ['subject__full_name', 'school_class__number', 'info']
+    search_fields = ['subject__full_name', 'school_class__number', 'teacher__full_name', 'info']
+    autocomplete_fields = ['teacher']
+    list_select_related = ['subject', 'teacher', 'school_class', 'cabinet']
     list_per_page = 20
 
     def day_of_week_display(self, obj):
@@ -497,32 +728,121 @@ class ScheduleAdmin(admin.ModelAdmin):
             'fields': ('day_of_week', 'lesson_number', 'info')
         }),
         ('Расписание', {
-            'fields': ('subject', 'school_class', 'cabinet')
+            'fields': ('subject', 'teacher', 'school_class', 'cabinet')
         }),
     )
 
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('free-resources/', self.admin_site.admin_view(self.free_resources_view),
+                 name='%s_%s_free_resources' % info),
+        ] + super().get_urls()
+
+    def free_resources_view(self, request):
+        """Свободные кабинеты и учителя в выбранный слот - для поиска замены"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        form = FreeResourcesForm(request.GET or None)
+        form.fields['subject'].widget = forms.Select(
+            choices=[('', 'Любой')] + list(Subject.objects.order_by('full_name').values_list('id', 'full_name')),
+        )
+        cabinets = teachers = None
+        if form.is_valid():
+            index = occupancy.get_index()
+            slot = [form.cleaned_data[name] for name in ('grid', 'day', 'lesson')]
+            cabinets = index.free_cabinets(*slot)
+            teachers = index.free_teachers(*slot, form.cleaned_data['subject'])
+
+        context = {
+            'form': form,
+            'cabinets': cabinets,
+            'teachers': teachers,
+            'opts': self.model._meta,
+            'title': 'Свободные кабинеты и учителя',
+            **self.admin_site.each_context(request),
+        }
+        return render(request, 'admin/free_resources.html', context)
+
+
+@admin.register(StudyPlan)
+class StudyPlanAdmin(admin.ModelAdmin):
+    list_display = ['school_class', 'subject', 'lessons_per_week']
+    list_filter = ['subject']
+    search_fields = ['school_class__number', 'subject__full_name']
+    list_select_related = ['school_class', 'subject']
+    list_per_page = 20
+    actions = ['generate_timetable']
+
+    @admin.action(description='Составить расписание выбранных классов по учебному плану')
+    def generate_timetable(self, request, queryset):
+        if not self.has_change_permission(request) or not request.user.has_perm('main.change_schedule'):
+            raise PermissionDenied
+        class_ids = set(queryset.values_list('school_class_id', flat=True))
+        result = generator.generate(generator.Problem.from_db(class_ids))
+        # Как и команда generate_timetable, расписание с накладками не сохраняем
+        conflicts = result.conflicts()
+        if conflicts:
+            messages.error(request, f'Генератор вернул накладки: {len(conflicts)}, расписание не изменено')
+            return
+        created = generator.apply(result)
+        messages.success(request, f'Расписание составлено за {result.seconds:.1f} с: уроков {created}')
+        if result.unplaced:
+            messages.warning(request, f'Не удалось поставить уроков: {len(result.unplaced)}')
+
 
 # Список дополнительных занятий
 @admin.register(ExtraActivity)
-class ExtraActivityAdmin(admin.ModelAdmin):
-    list_display = ['name', 'activity_type', 'teacher', 'max_students', 'is_active']
+class ExtraActivityAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ['name', 'activity_type', 'teacher', 'max_students', 'seats_taken', 'is_active']
     list_filter = ['activity_type', 'is_active', 'teacher']
     search_fields = ['name', 'description', 'teacher__full_name']
+    search_index = 'search_activity'
+    search_related = [('teacher', 'search_teacher')]
     list_editable = ['is_active']
+    list_select_related = ['teacher']
+    readonly_fields = ['seats_taken']
 
     fieldsets = (
         ('Основная информация', {
             'fields': ('name', 'description', 'activity_type')
         }),
         ('Организация', {
-            'fields': ('teacher', 'max_students', 'is_active')
+            'fields': ('teacher', 'max_students', 'seats_taken', 'is_active')
         }),
     )
 
 
+# Записи на дополнительные занятия: создаются через публичное API записи
+@admin.register(Enrollment)
+class EnrollmentAdmin(admin.ModelAdmin):
+    list_display = ['student', 'activity', 'status', 'created_at']
+    list_filter = ['status', 'activity__activity_type']
+    search_fields = ['student__full_name', 'activity__name']
+    list_select_related = ['student', 'activity']
+    readonly_fields = ['activity', 'student', 'status', 'idempotency_key', 'created_at']
+    list_per_page = 20
+    actions = ['cancel_enrollments']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Отменить выбранные записи')
+    def cancel_enrollments(self, request, queryset):
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        cancelled = 0
+        for item in queryset.exclude(status=Enrollment.CANCELLED):
+            enrollment.cancel(item)
+            cancelled += 1
+        messages.success(request, f'Отменено записей: {cancelled}')
+
+
 # Расписание дополнительных занятий
 @admin.register(ExtraSchedule)
 class ExtraScheduleAdmin(admin.ModelAdmin):
+    form = ExtraScheduleForm
     list_display = [
         'day_of_week_display',
         'lesson_display',
@@ -532,6 +852,7 @@ class ExtraScheduleAdmin(admin.ModelAdmin):
     ]
     list_filter = ['day_of_week', 'lesson_number', 'activity__activity_type']
     search_fields = ['activity__name', 'cabinet__number', 'activity__teacher__full_name']
+    list_select_related = ['activity__teacher', 'cabinet']
 
     def day_of_week_display(self, obj):
         return obj.get_day_of_week_display()
@@ -570,4 +891,5 @@ class TaskAdmin(admin.ModelAdmin):
 class TeacherSubjectAdmin(admin.ModelAdmin):
     list_display = ['teacher', 'subject', 'info']
     list_filter = ['teacher', 'subject']
-    search_fields = ['teacher__full_name', 'subject__full_name', 'info']
\ No newline at end of file
+    search_fields = ['teacher__full_name', 'subject__full_name', 'info']
+    list_select_related = ['teacher', 'subject']
\ No newline at end of file
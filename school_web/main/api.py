@@ -0,0 +1,235 @@
+import json
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.core.exceptions import BadRequest
+from django.http import FileResponse, Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST, require_safe
+
+from . import enrollment, ics, occupancy, stamps
+from .forms import EnrollmentForm, FreeResourcesForm
+from .models import Cabinet, ExtraSchedule, Schedule, SchoolGroup, Student, Teacher
+
+# Публичное JSON API расписания класса, учителя и кабинета только для чтения.
+# Ответ сжат: имена колонок передаются один раз в "fields", строки - массивами.
+# ETag и Last-Modified берутся из версий в main.stamps (только кэш), поэтому
+# клиенты, которые опрашивают расписание, получают 304 без запросов к БД.
+
+# Тело ответа хранится в кэше по ETag, пока версия не изменится
+BODY_TIMEOUT = 24 * 60 * 60
+
+LESSON_FIELDS = ['day', 'lesson', 'start', 'end', 'subject', 'class', 'teacher', 'cabinet', 'info']
+EXTRA_FIELDS = ['day', 'lesson', 'start', 'end', 'activity', 'type', 'teacher', 'cabinet']
+
+# Вид ресурса -> (модель, поле названия, фильтр уроков, фильтр доп. занятий)
+RESOURCES = {
+    'class': (SchoolGroup, 'number', 'school_class_id', None),
+    'teacher': (Teacher, 'full_name', 'teacher_id', 'activity__teacher_id'),
+    'cabinet': (Cabinet, 'number', 'cabinet_id', 'cabinet_id'),
+}
+
+
+def _clock(minutes):
+    return f'{minutes // 60}:{minutes % 60:02d}' if minutes is not None else None
+
+
+def _times(times, number):
+    start, end = times.get(number, (None, None))
+    return [_clock(start), _clock(end)]
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def build_timetable(kind, pk):
+    """Расписание ресурса в виде словаря для JSON; None, если ресурса нет"""
+    model, name_field, lesson_filter, extra_filter = RESOURCES[kind]
+    name = model.objects.filter(pk=pk).values_list(name_field, flat=True).first()
+    if name is None:
+        return None
+
+    lessons = Schedule.objects.filter(**{lesson_filter: pk}).order_by('day_of_week', 'lesson_number', 'id')
+    data = {
+        'kind': kind,
+        'id': pk,
+        'name': name,
+        'lessons': {
+            'fields': LESSON_FIELDS,
+            'rows': [
+                [day, number, *_times(Schedule.LESSON_TIMES, number), *rest]
+                for day, number, *rest in lessons.values_list(
+                    'day_of_week', 'lesson_number', 'subject__full_name', 'school_class__number',
+                    'teacher__full_name', 'cabinet__number', 'info',
+                )
+            ],
+        },
+    }
+    if extra_filter:
+        extra = ExtraSchedule.objects.filter(**{extra_filter: pk}).order_by('day_of_week', 'lesson_number', 'id')
+        data['extra'] = {
+            'fields': EXTRA_FIELDS,
+            'rows': [
+                [day, number, *_times(ExtraSchedule.LESSON_TIMES, number), *rest]
+                for day, number, *rest in extra.values_list(
+                    'day_of_week', 'lesson_number', 'activity__name', 'activity__activity_type',
+                    'activity__teacher__full_name', 'cabinet__number',
+                )
+            ],
+        }
+    return data
+
+
+def _stamp(request, kind, pk):
+    # condition() спрашивает ETag и Last-Modified отдельно: читаем версию из кэша один раз
+    if not hasattr(request, '_timetable_stamp'):
+        request._timetable_stamp = stamps.get(kind, pk)
+    if request._timetable_stamp is None:
+        raise Http404('Нет такого ресурса')
+    return request._timetable_stamp
+
+
+def _etag(request, kind, pk):
+    return _stamp(request, kind, pk).etag
+
+
+def _last_modified(request, kind, pk):
+    return datetime.fromtimestamp(int(_stamp(request, kind, pk).last_modified), tz=timezone.utc)
+
+
+def _feed_etag(request, kind, pk):
+    return ics.feed_stamp(_stamp(request, kind, pk)).etag
+
+
+def _feed_last_modified(request, kind, pk):
+    # Календарь зависит еще и от учебного года: после 1 июля клиенту нужен новый
+    last_modified = ics.feed_stamp(_stamp(request, kind, pk)).last_modified
+    return datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+
+
+def _json_response(body):
+    response = HttpResponse(body, content_type='application/json; charset=utf-8')
+    # Клиент может хранить ответ, но перед использованием обязан его проверить
+    response['Cache-Control'] = 'public, no-cache'
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+@require_safe
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def timetable(request, kind, pk):
+    """Расписание класса, учителя или кабинета"""
+    etag = _stamp(request, kind, pk).etag
+    key = f'timetable:json:{kind}:{pk}:{etag}'
+    body = cache.get(key)
+    if body is None:
+        data = build_timetable(kind, pk)
+        if data is None:
+            raise Http404('Нет такого ресурса')
+        body = dumps(data)
+        cache.set(key, body, BODY_TIMEOUT)
+    return _json_response(body)
+
+
+@require_safe
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def timetable_ics(request, kind, pk):
+    """Подписка на расписание в формате iCalendar: готовый файл с диска"""
+    feed = ics.open_feed(kind, pk, _stamp(request, kind, pk))
+    if feed is None:
+        raise Http404('Нет такого ресурса')
+    response = FileResponse(feed, content_type='text/calendar; charset=utf-8')
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+@require_safe
+@condition(etag_func=lambda request: stamps.get_global().etag)
+def timetable_index(request):
+    """Id и названия классов, учителей и кабинетов для запроса их расписаний"""
+    return _json_response(dumps({
+        kind: {
+            'fields': ['id', 'name'],
+            'rows': [list(row) for row in model.objects.order_by(name_field, 'pk').values_list('pk', name_field)],
+        }
+        for kind, (model, name_field, _, _) in RESOURCES.items()
+    }))
+
+
+def free_resources_data(form):
+    """Свободные кабинеты и учителя для проверенной формы FreeResourcesForm"""
+    index = occupancy.get_index()
+    day, grid, lesson, subject = (form.cleaned_data[name] for name in ('day', 'grid', 'lesson', 'subject'))
+    return {
+        'day': day,
+        'grid': grid,
+        'lesson': lesson,
+        'subject': subject,
+        'cabinets': {'fields': ['id', 'number'], 'rows': [list(row) for row in index.free_cabinets(grid, day, lesson)]},
+        'teachers': {
+            'fields': ['id', 'name'],
+            'rows': [list(row) for row in index.free_teachers(grid, day, lesson, subject)],
+        },
+    }
+
+
+@require_safe
+def free_resources(request):
+    """Свободные кабинеты и учителя (с предметом subject - только те, кто его ведет) в слот day, lesson"""
+    form = FreeResourcesForm(request.GET)
+    if not form.is_valid():
+        raise BadRequest('; '.join(f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()))
+    response = _json_response(dumps(free_resources_data(form)))
+    # Ответ зависит от любого изменения расписания, хранить его нельзя
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def _enrollment_response(data, status):
+    response = _json_response(dumps(data))
+    response.status_code = status
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+# Сессии и cookie не используются: ученика подтверждает телефон, поэтому CSRF
+# здесь не защищает ничего, а сторонние сайты школы должны иметь возможность отправить форму
+@csrf_exempt
+@require_POST
+def enroll_activity(request):
+    """Запись ученика на дополнительное занятие.
+
+    Ключ запроса передается в заголовке Idempotency-Key или поле key: повтор
+    с тем же ключом возвращает ту же запись с заголовком Idempotent-Replayed.
+    201 - новая запись (на место или в лист ожидания), 200 - повтор,
+    404 - нет занятия или ученика с таким телефоном, 409 - ключ уже занят другой записью.
+    """
+    data = request.POST.copy()
+    if 'Idempotency-Key' in request.headers:
+        data['key'] = request.headers['Idempotency-Key']
+    form = EnrollmentForm(data)
+    if not form.is_valid():
+        raise BadRequest('; '.join(f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()))
+    activity_id, student_id, phone, key = (form.cleaned_data[name] for name in ('activity', 'student', 'phone', 'key'))
+    if not Student.objects.filter(pk=student_id, phone=phone).exists():
+        raise Http404('Ученик не найден')
+
+    try:
+        item, replayed = enrollment.enroll(activity_id, student_id, key)
+    except enrollment.ActivityClosed:
+        raise Http404('Запись на занятие закрыта')
+    except enrollment.KeyReused:
+        return _enrollment_response({'error': 'Ключ запроса уже использован для другой записи'}, 409)
+
+    response = _enrollment_response({
+        'id': item.pk,
+        'activity': item.activity_id,
+        'student': item.student_id,
+        'status': item.status,
+        'position': enrollment.waitlist_position(item),
+    }, 200 if replayed else 201)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
+
@@ -0,0 +1,19 @@
+import functools
+import hashlib
+
+from django.db import connection
+
+# Ключи общих кэшей (settings.CACHES) включают имя БД: версии и сохраненные
+# страницы согласованы с данными одной БД. Тесты, load_test и
+# compare_report_latency на временных БД пользуются тем же каталогом кэша,
+# но не видят записи сервера и не портят их.
+
+
+@functools.lru_cache(maxsize=None)
+def _namespace(database_name):
+    return hashlib.md5(str(database_name).encode()).hexdigest()[:8]
+
+
+def make_key(key, key_prefix, version):
+    """KEY_FUNCTION кэшей: как у Django, плюс короткий хэш имени текущей БД"""
+    return f'{key_prefix}:{version}:{_namespace(connection.settings_dict["NAME"])}:{key}'
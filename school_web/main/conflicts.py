@@ -0,0 +1,161 @@
+import heapq
+from collections import namedtuple
+
+from django.db.models import Q
+
+from .models import ExtraSchedule, Schedule
+
+# Поиск накладок в расписании уроков и дополнительных занятий.
+# У Schedule и ExtraSchedule разные сетки звонков, поэтому сравниваются
+# реальные интервалы времени, а не номера уроков.
+
+DAY_NAMES = dict(Schedule._meta.get_field('day_of_week').choices)
+
+RESOURCE_LABELS = {
+    'cabinet': 'Кабинет',
+    'class': 'Класс',
+    'teacher': 'Учитель',
+}
+
+# Занятие в расписании: source - 'schedule' или 'extra', start/end - минуты от полуночи
+Slot = namedtuple('Slot', [
+    'source', 'id', 'day', 'lesson_number', 'start', 'end', 'title',
+    'cabinet_id', 'cabinet', 'class_id', 'school_class', 'teacher_id', 'teacher',
+])
+
+Conflict = namedtuple('Conflict', ['kind', 'resource_id', 'resource', 'day', 'first', 'second'])
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def describe(conflict):
+    """Человекочитаемое описание накладки"""
+    def slot_text(slot):
+        return (f"{slot.title} ({_format_minutes(slot.start)}-{_format_minutes(slot.end)}, "
+                f"{'урок' if slot.source == 'schedule' else 'доп. занятие'} #{slot.id})")
+
+    return (f"{RESOURCE_LABELS[conflict.kind]} {conflict.resource}, {DAY_NAMES.get(conflict.day, conflict.day)}: "
+            f"{slot_text(conflict.first)} и {slot_text(conflict.second)}")
+
+
+def schedule_slots(queryset=None):
+    """Уроки в виде интервалов, одним запросом"""
+    queryset = Schedule.objects.all() if queryset is None else queryset
+    rows = queryset.order_by().values_list(
+        'id', 'day_of_week', 'lesson_number', 'subject__full_name',
+        'cabinet_id', 'cabinet__number', 'school_class_id', 'school_class__number',
+        'teacher_id', 'teacher__full_name',
+    )
+    for pk, day, lesson, subject, cabinet_id, cabinet, class_id, school_class, teacher_id, teacher in rows:
+        if lesson not in Schedule.LESSON_TIMES:
+            continue
+        start, end = Schedule.LESSON_TIMES[lesson]
+        yield Slot('schedule', pk, day, lesson, start, end, f"{subject}, класс {school_class}",
+                   cabinet_id, cabinet, class_id, school_class, teacher_id, teacher)
+
+
+def extra_slots(queryset=None):
+    """Дополнительные занятия в виде интервалов, одним запросом"""
+    queryset = ExtraSchedule.objects.all() if queryset is None else queryset
+    rows = queryset.order_by().values_list(
+        'id', 'day_of_week', 'lesson_number', 'activity__name',
+        'cabinet_id', 'cabinet__number', 'activity__teacher_id', 'activity__teacher__full_name',
+    )
+    for pk, day, lesson, activity, cabinet_id, cabinet, teacher_id, teacher in rows:
+        if lesson not in ExtraSchedule.LESSON_TIMES:
+            continue
+        start, end = ExtraSchedule.LESSON_TIMES[lesson]
+        yield Slot('extra', pk, day, lesson, start, end, activity,
+                   cabinet_id, cabinet, None, None, teacher_id, teacher)
+
+
+def _resources(slot):
+    if slot.cabinet_id is not None:
+        yield 'cabinet', slot.cabinet_id, slot.cabinet
+    if slot.class_id is not None:
+        yield 'class', slot.class_id, slot.school_class
+    if slot.teacher_id is not None:
+        yield 'teacher', slot.teacher_id, slot.teacher
+
+
+def find_conflicts(slots):
+    """Накладки по кабинетам, классам и учителям за один проход.
+
+    Занятия сортируются по (день, начало), для каждого ресурса хранится куча
+    еще не закончившихся занятий по времени окончания. Сложность O(n log n + k),
+    где k - количество найденных накладок.
+    """
+    conflicts = []
+    active = {}
+    current_day = None
+    for slot in sorted(slots, key=lambda s: (s.day, s.start, s.end)):
+        if slot.day != current_day:
+            active.clear()
+            current_day = slot.day
+        for kind, resource_id, resource in _resources(slot):
+            heap = active.setdefault((kind, resource_id), [])
+            while heap and heap[0][0] <= slot.start:
+                heapq.heappop(heap)
+            for _, _, other in heap:
+                conflicts.append(Conflict(kind, resource_id, resource, slot.day, other, slot))
+            heapq.heappush(heap, (slot.end, id(slot), slot))
+    return conflicts
+
+
+def find_all_conflicts(day=None):
+    """Все накладки в расписании уроков и дополнительных занятий"""
+    schedules = Schedule.objects.all()
+    extras = ExtraSchedule.objects.all()
+    if day is not None:
+        schedules = schedules.filter(day_of_week=day)
+        extras = extras.filter(day_of_week=day)
+    return find_conflicts(list(schedule_slots(schedules)) + list(extra_slots(extras)))
+
+
+def conflicts_for(candidate):
+    """Накладки одного урока или доп. занятия (в том числе несохраненного) с остальным расписанием.
+
+    Загружаются только занятия того же дня, использующие те же кабинет, класс или учителя.
+    """
+    if isinstance(candidate, Schedule):
+        source, times = 'schedule', Schedule.LESSON_TIMES
+        title = str(candidate.subject) if candidate.subject_id else ''
+        teacher = candidate.teacher
+        school_class = candidate.school_class if candidate.school_class_id else None
+    else:
+        source, times = 'extra', ExtraSchedule.LESSON_TIMES
+        title = candidate.activity.name if candidate.activity_id else ''
+        teacher = candidate.activity.teacher if candidate.activity_id else None
+        school_class = None
+    if candidate.lesson_number not in times:
+        return []
+
+    cabinet = candidate.cabinet if candidate.cabinet_id else None
+    class_id = school_class.id if school_class else None
+    teacher_id = teacher.id if teacher else None
+    start, end = times[candidate.lesson_number]
+    own = Slot(source, candidate.pk, candidate.day_of_week, candidate.lesson_number, start, end, title,
+               candidate.cabinet_id, cabinet and cabinet.number,
+               class_id, school_class and school_class.number,
+               teacher_id, teacher and teacher.full_name)
+
+    schedule_filter = Q(cabinet_id=candidate.cabinet_id)
+    extra_filter = Q(cabinet_id=candidate.cabinet_id)
+    if class_id is not None:
+        schedule_filter |= Q(school_class_id=class_id)
+    if teacher_id is not None:
+        schedule_filter |= Q(teacher_id=teacher_id)
+        extra_filter |= Q(activity__teacher_id=teacher_id)
+
+    schedules = Schedule.objects.filter(schedule_filter, day_of_week=candidate.day_of_week)
+    extras = ExtraSchedule.objects.filter(extra_filter, day_of_week=candidate.day_of_week)
+    if candidate.pk is not None:
+        if source == 'schedule':
+            schedules = schedules.exclude(pk=candidate.pk)
+        else:
+            extras = extras.exclude(pk=candidate.pk)
+
+    slots = [own] + list(schedule_slots(schedules)) + list(extra_slots(extras))
+    return [c for c in find_conflicts(slots) if c.first is own or c.second is own]
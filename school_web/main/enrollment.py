@@ -0,0 +1,119 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Enrollment, ExtraActivity
+
+# Запись учеников на дополнительные занятия.
+# Место выдается одним условным UPDATE счетчика ExtraActivity.seats_taken
+# ("занять, если занято меньше max_students"): проверка и запись выполняются
+# в БД атомарно, и одновременные запросы не могут выдать больше мест, чем есть,
+# без чтения счетчика и блокировок в Python. Кому место не досталось, попадает
+# в лист ожидания и получает место по очереди, когда оно освободится.
+# Клиент передает ключ запроса: повтор после обрыва связи возвращает ту же
+# запись, а не создает вторую.
+
+
+class EnrollmentError(Exception):
+    pass
+
+
+class ActivityClosed(EnrollmentError):
+    """Занятия нет или запись на него закрыта"""
+
+
+class KeyReused(EnrollmentError):
+    """Ключ запроса уже использован для другой записи"""
+
+
+def take_seat(activity_id):
+    """Занимает место, если оно есть; True - место досталось"""
+    return bool(
+        ExtraActivity.objects.filter(pk=activity_id, is_active=True, seats_taken__lt=F('max_students'))
+        .update(seats_taken=F('seats_taken') + 1)
+    )
+
+
+def release_seat(activity_id):
+    ExtraActivity.objects.filter(pk=activity_id, seats_taken__gt=0).update(seats_taken=F('seats_taken') - 1)
+
+
+def _existing(activity_id, student_id, key):
+    """Запись, которую уже создал запрос с этим ключом или другой запрос того же ученика"""
+    enrollment = Enrollment.objects.filter(idempotency_key=key).first()
+    if enrollment is not None:
+        if (enrollment.activity_id, enrollment.student_id) != (activity_id, student_id):
+            raise KeyReused(key)
+        return enrollment
+    return (
+        Enrollment.objects.filter(activity_id=activity_id, student_id=student_id)
+        .exclude(status=Enrollment.CANCELLED).first()
+    )
+
+
+def enroll(activity_id, student_id, key):
+    """Записывает ученика на занятие: (запись, повтор ли это уже выполненного запроса)"""
+    # Повтор проверяется до транзакции: блокировка записи нужна только на UPDATE и INSERT
+    enrollment = _existing(activity_id, student_id, key)
+    if enrollment is not None:
+        return enrollment, True
+    try:
+        with transaction.atomic():
+            if take_seat(activity_id):
+                status = Enrollment.ENROLLED
+            elif ExtraActivity.objects.filter(pk=activity_id, is_active=True).exists():
+                status = Enrollment.WAITLIST
+            else:
+                raise ActivityClosed(activity_id)
+            enrollment = Enrollment.objects.create(
+                activity_id=activity_id, student_id=student_id, status=status, idempotency_key=key,
+            )
+            return enrollment, False
+    except IntegrityError:
+        # Одновременный запрос с тем же ключом или того же ученика успел раньше;
+        # занятое этим запросом место откатилось вместе с транзакцией
+        enrollment = _existing(activity_id, student_id, key)
+        if enrollment is None:
+            raise
+        return enrollment, True
+
+
+def waitlist_position(enrollment):
+    """Место в листе ожидания, начиная с 1; None, если запись не в листе ожидания"""
+    if enrollment.status != Enrollment.WAITLIST:
+        return None
+    return Enrollment.objects.filter(
+        activity_id=enrollment.activity_id, status=Enrollment.WAITLIST, id__lte=enrollment.id,
+    ).count()
+
+
+def promote(activity_id):
+    """Отдает свободные места листу ожидания по порядку записи; возвращает число переведенных"""
+    promoted = 0
+    with transaction.atomic():
+        waiting = Enrollment.objects.filter(activity_id=activity_id, status=Enrollment.WAITLIST).order_by('id')
+        for enrollment_id in waiting.values_list('id', flat=True):
+            if not take_seat(activity_id):
+                break
+            # Запись могли отменить после выборки: тогда место возвращается
+            if Enrollment.objects.filter(pk=enrollment_id, status=Enrollment.WAITLIST).update(
+                status=Enrollment.ENROLLED,
+            ):
+                promoted += 1
+            else:
+                release_seat(activity_id)
+    return promoted
+
+
+def cancel(enrollment):
+    """Отменяет запись; освободившееся место переходит к первому в листе ожидания"""
+    with transaction.atomic():
+        if Enrollment.objects.filter(pk=enrollment.pk, status=Enrollment.ENROLLED).update(
+            status=Enrollment.CANCELLED,
+        ):
+            release_seat(enrollment.activity_id)
+            promote(enrollment.activity_id)
+        else:
+            Enrollment.objects.filter(pk=enrollment.pk, status=Enrollment.WAITLIST).update(
+                status=Enrollment.CANCELLED,
+            )
+    enrollment.status = Enrollment.CANCELLED
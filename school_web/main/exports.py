@@ -0,0 +1,131 @@
+import csv
+import io
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+# Выгрузка отчетов в CSV, XLSX и PDF.
+# CSV отдается потоком, XLSX и PDF требуют необязательных пакетов openpyxl и reportlab.
+
+EXPORT_FORMATS = ('csv', 'xlsx', 'pdf')
+EXPORT_CHUNK_SIZE = 2000
+
+# Шрифты с кириллицей, которые ищем для PDF, если REPORT_PDF_FONT не задан
+PDF_FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/Library/Fonts/Arial Unicode.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+]
+
+
+class ExportUnavailable(Exception):
+    """Формат выгрузки недоступен: не установлен пакет или не найден шрифт"""
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _filename(name, fmt):
+    return f"{name}_{timezone.localdate():%Y-%m-%d}.{fmt}"
+
+
+def _cell(value):
+    return '' if value is None else value
+
+
+def csv_response(name, header, rows):
+    writer = csv.writer(_Echo(), delimiter=';')
+
+    def stream():
+        # BOM нужен, чтобы Excel открыл файл в UTF-8
+        yield '\ufeff'
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow([_cell(value) for value in row])
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{_filename(name, "csv")}"'
+    return response
+
+
+def xlsx_response(name, title, header, rows):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportUnavailable('Для выгрузки в XLSX установите пакет openpyxl')
+
+    # write_only пишет строки сразу в поток и не держит ячейки в памяти
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.append(header)
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    response = HttpResponse(
+        buffer.getvalue(),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{_filename(name, "xlsx")}"'
+    return response
+
+
+def _pdf_font():
+    configured = getattr(settings, 'REPORT_PDF_FONT', None)
+    for candidate in ([configured] if configured else PDF_FONT_CANDIDATES):
+        if Path(candidate).exists():
+            return candidate
+    raise ExportUnavailable('Для выгрузки в PDF укажите шрифт с кириллицей в настройке REPORT_PDF_FONT')
+
+
+def pdf_response(name, title, header, rows):
+    try:
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate
+    except ImportError:
+        raise ExportUnavailable('Для выгрузки в PDF установите пакет reportlab')
+
+    if 'ReportFont' not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont('ReportFont', _pdf_font()))
+
+    styles = getSampleStyleSheet()
+    styles['Title'].fontName = 'ReportFont'
+    data = [list(header)] + [[str(_cell(value)) for value in row] for row in rows]
+    table = LongTable(data, repeatRows=1)
+    table.setStyle([
+        ('FONTNAME', (0, 0), (-1, -1), 'ReportFont'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+    buffer = io.BytesIO()
+    document = SimpleDocTemplate(buffer, pagesize=landscape(A4), title=title)
+    document.build([Paragraph(title, styles['Title']), table])
+    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{_filename(name, "pdf")}"'
+    return response
+
+
+def export_response(fmt, name, title, header, rows):
+    """Ответ с выгрузкой отчета; rows - итератор строк, лучше из .iterator(chunk_size=...)"""
+    if fmt == 'csv':
+        return csv_response(name, header, rows)
+    if fmt == 'xlsx':
+        return xlsx_response(name, title, header, rows)
+    if fmt == 'pdf':
+        return pdf_response(name, title, header, rows)
+    raise ExportUnavailable(f'Неизвестный формат выгрузки: {fmt}')
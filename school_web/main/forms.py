@@ -1,4 +1,8 @@
-from .models import Task
+from .models import Task, Schedule, ExtraSchedule
+from .conflicts import conflicts_for, describe
+from .occupancy import DAYS, GRIDS
+from django.core.exceptions import ValidationError
+from django import forms
 from django.forms import ModelForm, TextInput, Textarea
 
 
@@ -15,4 +19,73 @@ class TaskForm(ModelForm):
                 'class': 'form-control',
                 'placeholder': "Введите описание"
             }),
-        }
\ No newline at end of file
+        }
+
+class ConflictCheckMixin:
+    """Проверка накладок в расписании при сохранении через админку"""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        candidate = self._meta.model(pk=self.instance.pk, **{
+            name: cleaned_data.get(name) for name in self._meta.fields if name in cleaned_data
+        })
+        if isinstance(candidate, Schedule) and candidate.teacher_id is None and candidate.subject_id:
+            candidate.teacher_id = candidate.suggest_teacher_id()
+
+        conflicts = conflicts_for(candidate)
+        if conflicts:
+            raise ValidationError([describe(conflict) for conflict in conflicts])
+        return cleaned_data
+
+
+class ScheduleForm(ConflictCheckMixin, ModelForm):
+    class Meta:
+        model = Schedule
+        fields = ['day_of_week', 'lesson_number', 'info', 'subject', 'teacher', 'school_class', 'cabinet']
+
+
+class ExtraScheduleForm(ConflictCheckMixin, ModelForm):
+    class Meta:
+        model = ExtraSchedule
+        fields = ['day_of_week', 'lesson_number', 'cabinet', 'activity']
+
+
+class CsvImportForm(forms.Form):
+    file = forms.FileField(label='CSV-файл', help_text='Кодировка UTF-8, первая строка - названия колонок')
+    delimiter = forms.ChoiceField(label='Разделитель', choices=[(';', 'Точка с запятой'), (',', 'Запятая')])
+    dry_run = forms.BooleanField(label='Только проверить', required=False, initial=True)
+
+
+class FreeResourcesForm(forms.Form):
+    """Слот, для которого ищутся свободные кабинеты и учителя"""
+    day = forms.TypedChoiceField(label='День недели', coerce=int,
+                                 choices=Schedule._meta.get_field('day_of_week').choices)
+    grid = forms.ChoiceField(label='Звонки', required=False,
+                             choices=[('schedule', 'Уроки'), ('extra', 'Доп. занятия')])
+    lesson = forms.IntegerField(label='Номер урока', min_value=1)
+    # Число, а не ModelChoiceField: проверка не должна стоить запроса к БД
+    subject = forms.IntegerField(label='Предмет', required=False, min_value=1)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        cleaned_data['grid'] = cleaned_data.get('grid') or 'schedule'
+        lesson = cleaned_data.get('lesson')
+        if lesson is not None and lesson not in dict(GRIDS[cleaned_data['grid']].LESSON_CHOICES):
+            self.add_error('lesson', 'Нет такого урока в расписании звонков')
+        return cleaned_data
+
+
+class EnrollmentForm(forms.Form):
+    """Запись на дополнительное занятие; ученика подтверждает телефон из его карточки"""
+    activity = forms.IntegerField(label='Занятие', min_value=1)
+    student = forms.IntegerField(label='Ученик', min_value=1)
+    phone = forms.CharField(label='Телефон', max_length=20)
+    key = forms.CharField(label='Ключ запроса', max_length=64)
+
+    def clean_phone(self):
+        # В карточке ученика телефон хранится только цифрами
+        return ''.join(char for char in self.cleaned_data['phone'] if char.isdigit())
+
@@ -0,0 +1,401 @@
+import math
+import random
+import time
+
+from django.db import transaction
+
+from . import workload
+from .models import Cabinet, ExtraSchedule, Schedule, SchoolGroup, StudyPlan, TeacherSubject
+from .signals import bulk_change
+from .timetable import DAY_CHOICES, LESSON_NUMBERS
+
+# Генератор расписания уроков по учебному плану (StudyPlan).
+# Занятость класса, учителя и кабинета за неделю - битовая маска на
+# 6 дней x 9 уроков: бит (день, урок) установлен, если слот занят, поэтому
+# свободные для урока слоты - одна операция ~(класс | учитель).
+# Сначала каждому предмету класса назначается учитель из TeacherSubject
+# (классный руководитель в приоритете, затем наименее загруженный),
+# затем уроки расставляются жадно, от самых ограниченных. Урок, которому
+# не нашлось слота, занимает слот с наименьшим числом мешающих уроков, а
+# их снимает и возвращает в очередь (локальный поиск с вытеснением).
+
+DAYS = [day for day, _ in DAY_CHOICES]
+LESSONS_PER_DAY = len(LESSON_NUMBERS)
+SLOTS = len(DAYS) * LESSONS_PER_DAY
+ALL_SLOTS = (1 << SLOTS) - 1
+DAY_MASKS = [((1 << LESSONS_PER_DAY) - 1) << (i * LESSONS_PER_DAY) for i in range(len(DAYS))]
+
+# Сколько раз можно снять уже поставленные уроки, на один урок плана
+REPAIR_STEPS_PER_LESSON = 30
+
+
+def slot_bit(day, lesson_number):
+    return (DAYS.index(day) * LESSONS_PER_DAY + LESSON_NUMBERS.index(lesson_number))
+
+
+def slot_of(bit):
+    """Бит -> (день недели, номер урока)"""
+    return DAYS[bit // LESSONS_PER_DAY], LESSON_NUMBERS[bit % LESSONS_PER_DAY]
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _extra_masks():
+    """Уроки, которые пересекаются по времени с каждым номером доп. занятия (у них свои звонки)"""
+    masks = {}
+    for number, (start, end) in ExtraSchedule.LESSON_TIMES.items():
+        masks[number] = sum(
+            1 << i for i, lesson_number in enumerate(LESSON_NUMBERS)
+            if lesson_number in Schedule.LESSON_TIMES
+            and Schedule.LESSON_TIMES[lesson_number][0] < end and start < Schedule.LESSON_TIMES[lesson_number][1]
+        )
+    return masks
+
+
+class Problem:
+    """Входные данные генератора без обращений к БД.
+
+    requirements - тройки (класс, предмет, уроков в неделю);
+    qualified - предмет -> учителя, которые могут его вести;
+    home_cabinets - класс -> кабинет класса, cabinets - все кабинеты;
+    teacher_busy и cabinet_busy - маски слотов, занятых тем, что генератор
+    не меняет (доп. занятия, уроки других классов).
+    """
+
+    def __init__(self, requirements, qualified, cabinets, home_cabinets=None, homeroom=None,
+                 teacher_busy=None, cabinet_busy=None, max_teacher_lessons=None):
+        self.requirements = [(c, s, n) for c, s, n in requirements if n > 0]
+        self.qualified = qualified
+        self.cabinets = list(cabinets)
+        self.home_cabinets = home_cabinets or {}
+        self.homeroom = homeroom or {}
+        self.teacher_busy = teacher_busy or {}
+        self.cabinet_busy = cabinet_busy or {}
+        self.max_teacher_lessons = max_teacher_lessons or workload.MAX_LESSONS
+
+    @classmethod
+    def from_db(cls, class_ids=None):
+        """Задача для классов class_ids (всех классов с учебным планом, если не указаны)"""
+        plan = StudyPlan.objects.order_by('school_class_id', 'subject_id')
+        if class_ids is not None:
+            plan = plan.filter(school_class_id__in=class_ids)
+        requirements = list(plan.values_list('school_class_id', 'subject_id', 'lessons_per_week'))
+        classes = {class_id for class_id, _, _ in requirements}
+
+        qualified = {}
+        for teacher_id, subject_id in TeacherSubject.objects.order_by('teacher_id').values_list('teacher_id', 'subject_id'):
+            qualified.setdefault(subject_id, []).append(teacher_id)
+        groups = SchoolGroup.objects.filter(id__in=classes).values_list('id', 'teacher_id', 'cabinet_id')
+
+        # Уроки остальных классов и доп. занятия генератор не трогает
+        teacher_busy, cabinet_busy = {}, {}
+        for teacher_id, cabinet_id, day, lesson_number in Schedule.objects.exclude(
+            school_class_id__in=classes,
+        ).values_list('teacher_id', 'cabinet_id', 'day_of_week', 'lesson_number').iterator():
+            if day in DAYS and lesson_number in LESSON_NUMBERS:
+                bit = 1 << slot_bit(day, lesson_number)
+                if teacher_id is not None:
+                    teacher_busy[teacher_id] = teacher_busy.get(teacher_id, 0) | bit
+                cabinet_busy[cabinet_id] = cabinet_busy.get(cabinet_id, 0) | bit
+        extra_masks = _extra_masks()
+        for teacher_id, cabinet_id, day, lesson_number in ExtraSchedule.objects.filter(
+            activity__is_active=True,
+        ).values_list('activity__teacher_id', 'cabinet_id', 'day_of_week', 'lesson_number'):
+            if day in DAYS and extra_masks.get(lesson_number):
+                mask = extra_masks[lesson_number] << (DAYS.index(day) * LESSONS_PER_DAY)
+                teacher_busy[teacher_id] = teacher_busy.get(teacher_id, 0) | mask
+                cabinet_busy[cabinet_id] = cabinet_busy.get(cabinet_id, 0) | mask
+
+        return cls(
+            requirements, qualified, Cabinet.objects.order_by('id').values_list('id', flat=True),
+            home_cabinets={class_id: cabinet_id for class_id, _, cabinet_id in groups},
+            homeroom={class_id: teacher_id for class_id, teacher_id, _ in groups},
+            teacher_busy=teacher_busy, cabinet_busy=cabinet_busy,
+        )
+
+    @property
+    def class_ids(self):
+        return sorted({class_id for class_id, _, _ in self.requirements})
+
+
+class Lesson:
+    """Урок, который нужно поставить; bit и cabinet_id заполняет генератор"""
+    __slots__ = ('index', 'class_id', 'subject_id', 'teacher_id', 'bit', 'cabinet_id')
+
+    def __init__(self, index, class_id, subject_id, teacher_id):
+        self.index = index
+        self.class_id = class_id
+        self.subject_id = subject_id
+        self.teacher_id = teacher_id
+        self.bit = None
+        self.cabinet_id = None
+
+    @property
+    def slot(self):
+        return slot_of(self.bit)
+
+
+class Result:
+    def __init__(self, problem, lessons, seconds, repairs):
+        self.problem = problem
+        self.lessons = lessons
+        self.seconds = seconds
+        self.repairs = repairs
+
+    @property
+    def placed(self):
+        return [lesson for lesson in self.lessons if lesson.bit is not None]
+
+    @property
+    def unplaced(self):
+        return [lesson for lesson in self.lessons if lesson.bit is None]
+
+    def conflicts(self):
+        """Пары уроков, которые делят класс, учителя или кабинет в одном слоте (для проверки)"""
+        seen = {}
+        found = []
+        for lesson in self.placed:
+            keys = [('class', lesson.class_id), ('cabinet', lesson.cabinet_id)]
+            if lesson.teacher_id is not None:
+                keys.append(('teacher', lesson.teacher_id))
+            for kind, resource in keys:
+                other = seen.setdefault((kind, resource, lesson.bit), lesson)
+                if other is not lesson:
+                    found.append((kind, other, lesson))
+            if lesson.cabinet_id is not None and self.problem.cabinet_busy.get(lesson.cabinet_id, 0) >> lesson.bit & 1:
+                found.append(('cabinet', None, lesson))
+            if lesson.teacher_id is not None and self.problem.teacher_busy.get(lesson.teacher_id, 0) >> lesson.bit & 1:
+                found.append(('teacher', None, lesson))
+        return found
+
+
+class Generator:
+    def __init__(self, problem, seed=0):
+        self.problem = problem
+        self.random = random.Random(seed)
+
+    # Учителя
+
+    def assign_teachers(self):
+        """Учитель для каждого предмета класса: все уроки предмета в классе ведет один учитель"""
+        problem = self.problem
+        load = {teacher_id: bin(mask).count('1') for teacher_id, mask in problem.teacher_busy.items()}
+        assigned = {}
+        # Сначала предметы, которые могут вести немногие учителя, и с большим числом уроков
+        for class_id, subject_id, count in sorted(
+            problem.requirements, key=lambda r: (len(problem.qualified.get(r[1], ())), -r[2], r[0], r[1]),
+        ):
+            candidates = problem.qualified.get(subject_id, [])
+            if not candidates:
+                assigned[class_id, subject_id] = None
+                continue
+            homeroom = problem.homeroom.get(class_id)
+            if homeroom in candidates and load.get(homeroom, 0) + count <= problem.max_teacher_lessons:
+                teacher_id = homeroom
+            else:
+                teacher_id = min(candidates, key=lambda t: (
+                    load.get(t, 0) + count > problem.max_teacher_lessons, load.get(t, 0), t,
+                ))
+            load[teacher_id] = load.get(teacher_id, 0) + count
+            assigned[class_id, subject_id] = teacher_id
+        return assigned
+
+    # Расстановка
+
+    def run(self):
+        started = time.perf_counter()
+        problem = self.problem
+        assigned = self.assign_teachers()
+        lessons = []
+        for class_id, subject_id, count in problem.requirements:
+            for _ in range(count):
+                lessons.append(Lesson(len(lessons), class_id, subject_id, assigned[class_id, subject_id]))
+
+        self.class_mask = {}
+        self.teacher_mask = dict(problem.teacher_busy)
+        # Кто занимает слот: (вид ресурса, ресурс, бит) -> урок
+        self.occupant = {}
+        # Свободные кабинеты каждого слота
+        self.free_cabinets = [
+            {cabinet_id for cabinet_id in problem.cabinets if not problem.cabinet_busy.get(cabinet_id, 0) >> bit & 1}
+            for bit in range(SLOTS)
+        ]
+        # Сколько раз в день у класса уже стоит предмет
+        self.subject_days = {}
+
+        teacher_load = {}
+        for lesson in lessons:
+            teacher_load[lesson.teacher_id] = teacher_load.get(lesson.teacher_id, 0) + 1
+        class_load = {}
+        for lesson in lessons:
+            class_load[lesson.class_id] = class_load.get(lesson.class_id, 0) + 1
+        # Самые ограниченные уроки - первыми: их учителя и классы заняты сильнее всех
+        queue = sorted(lessons, key=lambda l: (
+            -(teacher_load[l.teacher_id] if l.teacher_id is not None else 0), -class_load[l.class_id], l.index,
+        ))
+        queue.reverse()
+
+        repairs = 0
+        max_repairs = REPAIR_STEPS_PER_LESSON * len(lessons)
+        # Сколько раз урок снимали: часто снимаемые уроки трогаем реже, чтобы не ходить по кругу
+        ejected = {}
+        while queue:
+            lesson = queue.pop()
+            bit = self.best_slot(lesson)
+            if bit is not None:
+                self.place(lesson, bit)
+                continue
+            if repairs >= max_repairs:
+                continue
+            repairs += 1
+            bit, victims = self.least_conflicting_slot(lesson, ejected)
+            if bit is None:
+                continue
+            for victim in victims:
+                self.remove(victim)
+                ejected[victim.index] = ejected.get(victim.index, 0) + 1
+                queue.append(victim)
+            self.place(lesson, bit)
+
+        return Result(problem, lessons, time.perf_counter() - started, repairs)
+
+    def free_slots(self, lesson):
+        busy = self.class_mask.get(lesson.class_id, 0)
+        if lesson.teacher_id is not None:
+            busy |= self.teacher_mask.get(lesson.teacher_id, 0)
+        return ALL_SLOTS & ~busy
+
+    def best_slot(self, lesson):
+        best, best_score = None, None
+        class_mask = self.class_mask.get(lesson.class_id, 0)
+        home = self.problem.home_cabinets.get(lesson.class_id)
+        for bit in _bits(self.free_slots(lesson)):
+            free_cabinets = self.free_cabinets[bit]
+            if not free_cabinets:
+                continue
+            day_i, lesson_i = divmod(bit, LESSONS_PER_DAY)
+            day_mask = class_mask & DAY_MASKS[day_i]
+            score = (
+                # Тот же предмет второй раз за день
+                8 * self.subject_days.get((lesson.class_id, lesson.subject_id, day_i), 0)
+                # Равномерно по дням и с утра, без окон
+                + bin(day_mask).count('1')
+                + lesson_i
+                + (0 if home in free_cabinets else 2)
+            )
+            if best_score is None or score < best_score:
+                best, best_score = bit, score
+        return best
+
+    def least_conflicting_slot(self, lesson, ejected):
+        """Слот, где меньше всего мешающих уроков, и эти уроки"""
+        best, best_victims, best_cost = None, None, None
+        for bit in range(SLOTS):
+            if lesson.teacher_id is not None and self.problem.teacher_busy.get(lesson.teacher_id, 0) >> bit & 1:
+                continue
+            victims = set()
+            occupant = self.occupant.get(('class', lesson.class_id, bit))
+            if occupant is not None:
+                victims.add(occupant)
+            if lesson.teacher_id is not None:
+                occupant = self.occupant.get(('teacher', lesson.teacher_id, bit))
+                if occupant is not None:
+                    victims.add(occupant)
+            if not self.free_cabinets[bit] and not any(v.cabinet_id is not None for v in victims):
+                home = self.problem.home_cabinets.get(lesson.class_id)
+                occupant = self.occupant.get(('cabinet', home, bit))
+                if occupant is None:
+                    continue
+                victims.add(occupant)
+            cost = sum(1 + 3 * ejected.get(v.index, 0) for v in victims) + self.random.random()
+            if best_cost is None or cost < best_cost:
+                best, best_victims, best_cost = bit, victims, cost
+        return best, best_victims or ()
+
+    def place(self, lesson, bit):
+        mask = 1 << bit
+        lesson.bit = bit
+        self.class_mask[lesson.class_id] = self.class_mask.get(lesson.class_id, 0) | mask
+        self.occupant['class', lesson.class_id, bit] = lesson
+        if lesson.teacher_id is not None:
+            self.teacher_mask[lesson.teacher_id] = self.teacher_mask.get(lesson.teacher_id, 0) | mask
+            self.occupant['teacher', lesson.teacher_id, bit] = lesson
+        free_cabinets = self.free_cabinets[bit]
+        home = self.problem.home_cabinets.get(lesson.class_id)
+        lesson.cabinet_id = home if home in free_cabinets else min(free_cabinets)
+        free_cabinets.discard(lesson.cabinet_id)
+        self.occupant['cabinet', lesson.cabinet_id, bit] = lesson
+        key = (lesson.class_id, lesson.subject_id, bit // LESSONS_PER_DAY)
+        self.subject_days[key] = self.subject_days.get(key, 0) + 1
+
+    def remove(self, lesson):
+        bit, mask = lesson.bit, ~(1 << lesson.bit)
+        self.class_mask[lesson.class_id] &= mask
+        del self.occupant['class', lesson.class_id, bit]
+        if lesson.teacher_id is not None:
+            self.teacher_mask[lesson.teacher_id] &= mask
+            del self.occupant['teacher', lesson.teacher_id, bit]
+        self.free_cabinets[bit].add(lesson.cabinet_id)
+        del self.occupant['cabinet', lesson.cabinet_id, bit]
+        self.subject_days[lesson.class_id, lesson.subject_id, bit // LESSONS_PER_DAY] -= 1
+        lesson.bit = lesson.cabinet_id = None
+
+
+def generate(problem, seed=0):
+    return Generator(problem, seed).run()
+
+
+def apply(result):
+    """Заменяет уроки классов задачи сгенерированными; возвращает число созданных уроков"""
+    class_ids = result.problem.class_ids
+    # Снимки и кэши обновляются одним разом, а не по каждому удаленному уроку
+    with transaction.atomic(), bulk_change('lessons'):
+        Schedule.objects.filter(school_class_id__in=class_ids).delete()
+        created = Schedule.objects.bulk_create([
+            Schedule(
+                school_class_id=lesson.class_id, subject_id=lesson.subject_id, teacher_id=lesson.teacher_id,
+                cabinet_id=lesson.cabinet_id, day_of_week=lesson.slot[0], lesson_number=lesson.slot[1],
+            )
+            for lesson in result.placed
+        ], batch_size=2000)
+    return len(created)
+
+
+# Синтетические школы для бенчмарка: только входные данные, без БД
+
+# Недельный план одного класса: уроков по каждому из предметов
+BENCHMARK_PLAN = [5, 4, 4, 3, 3, 3, 2, 2, 2, 2, 1, 1, 1]
+# Тесный план: жадной расстановке не хватает слотов, работает локальный поиск
+TIGHT_PLAN = [6, 5, 5, 5, 4, 4, 4, 3, 3, 3, 3, 2, 2, 1, 1]
+
+# Профиль бенчмарка -> план класса
+BENCHMARK_PROFILES = {'standard': BENCHMARK_PLAN, 'tight': TIGHT_PLAN}
+
+
+def synthetic_problem(classes, seed=0, plan=BENCHMARK_PLAN, subjects_per_teacher=2, fill=0.8):
+    """Школа из classes классов с одинаковым планом; учителей столько, чтобы они были загружены на fill"""
+    rnd = random.Random(seed)
+    subjects = list(range(1, len(plan) + 1))
+    requirements = [(class_id, subject_id, count)
+                    for class_id in range(1, classes + 1) for subject_id, count in zip(subjects, plan)]
+
+    qualified = {}
+    teacher_id = 0
+    for subject_id, count in zip(subjects, plan):
+        # Учителя предмета с запасом, часть из них ведет еще один предмет
+        needed = math.ceil(classes * count / (workload.MAX_LESSONS * fill))
+        for _ in range(needed):
+            teacher_id += 1
+            qualified.setdefault(subject_id, []).append(teacher_id)
+            for other in rnd.sample(subjects, k=subjects_per_teacher - 1):
+                if other != subject_id:
+                    qualified.setdefault(other, []).append(teacher_id)
+
+    cabinets = range(1, classes + classes // 3 + 2)
+    return Problem(requirements, qualified, cabinets,
+                   home_cabinets={class_id: class_id for class_id in range(1, classes + 1)})
@@ -0,0 +1,229 @@
+import datetime
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from . import stamps
+from .models import Cabinet, ExtraSchedule, Schedule, SchoolGroup, Teacher
+
+# Подписки iCalendar (.ics) на расписание класса, учителя и кабинета.
+# Каждый урок - еженедельное событие (RRULE) на учебный год со временем
+# из LESSON_CHOICES модели. Файлы рендерятся заранее и лежат на диске
+# в ICS_FEED_DIR с версией ресурса из main.stamps в имени: пока версия
+# не изменилась, календарь получает готовые байты без запросов к БД.
+# Версии общие для всех процессов, поэтому имя файла у сервера и команды
+# render_ics_feeds одно. Прежние версии удаляются, только когда им больше
+# ICS_FEED_MAX_AGE секунд: другой процесс может как раз их отдавать.
+
+# Вид ресурса -> (модель, фильтр уроков, фильтр доп. занятий)
+FEEDS = {
+    'class': (SchoolGroup, 'school_class_id', None),
+    'teacher': (Teacher, 'teacher_id', 'activity__teacher_id'),
+    'cabinet': (Cabinet, 'cabinet_id', 'cabinet_id'),
+}
+
+PRODID = '-//МБОУ СОШ №32//Расписание//RU'
+
+MAX_AGE = getattr(settings, 'ICS_FEED_MAX_AGE', 10 * 60)
+
+
+def feed_dir():
+    return Path(getattr(settings, 'ICS_FEED_DIR', None) or Path(settings.BASE_DIR) / 'feeds')
+
+
+def school_year(today=None):
+    """Первый и последний день учебного года, в который попадает дата"""
+    today = today or datetime.date.today()
+    year = today.year if today.month >= 7 else today.year - 1
+    return datetime.date(year, 9, 1), datetime.date(year + 1, 5, 31)
+
+
+def escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Строки длиннее 75 байт переносятся по RFC 5545, не разрывая символы UTF-8"""
+    parts = []
+    while len(line.encode()) > 75:
+        cut = 75
+        while len(line[:cut].encode()) > 75:
+            cut -= 1
+        parts.append(line[:cut])
+        line = ' ' + line[cut:]
+    parts.append(line)
+    return '\r\n'.join(parts)
+
+
+def _first_date(start, day_of_week):
+    return start + datetime.timedelta(days=(day_of_week - start.isoweekday()) % 7)
+
+
+def _event(uid, day, minutes, summary, location, description, year, stamp):
+    start, end = minutes
+    date = _first_date(year[0], day)
+    dtstart = datetime.datetime.combine(date, datetime.time(start // 60, start % 60))
+    dtend = datetime.datetime.combine(date, datetime.time(end // 60, end % 60))
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{stamp}',
+        # Время без часового пояса ("плавающее"): урок в 8:30 по местному времени школы
+        f'DTSTART:{dtstart:%Y%m%dT%H%M%S}',
+        f'DTEND:{dtend:%Y%m%dT%H%M%S}',
+        f'RRULE:FREQ=WEEKLY;UNTIL={year[1]:%Y%m%d}T235959',
+        f'SUMMARY:{escape(summary)}',
+    ]
+    if location:
+        lines.append(f'LOCATION:{escape(location)}')
+    if description:
+        lines.append(f'DESCRIPTION:{escape(description)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def render(kind, pk, last_modified, today=None):
+    """Текст календаря ресурса; None, если ресурса нет"""
+    model, lesson_filter, extra_filter = FEEDS[kind]
+    resource = model.objects.filter(pk=pk).first()
+    if resource is None:
+        return None
+    year = school_year(today)
+    stamp = f'{datetime.datetime.fromtimestamp(int(last_modified), tz=datetime.timezone.utc):%Y%m%dT%H%M%SZ}'
+    host = getattr(settings, 'ICS_UID_DOMAIN', 'school32')
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(f"Расписание: {resource}")}',
+    ]
+    lessons = Schedule.objects.filter(**{lesson_filter: pk}).order_by('day_of_week', 'lesson_number', 'id')
+    for lesson_id, day, number, subject, class_number, teacher, cabinet, info in lessons.values_list(
+        'id', 'day_of_week', 'lesson_number', 'subject__full_name', 'school_class__number',
+        'teacher__full_name', 'cabinet__number', 'info',
+    ):
+        if number not in Schedule.LESSON_TIMES:
+            continue
+        description = ', '.join(part for part in [f'Класс {class_number}', teacher, info] if part)
+        lines += _event(f'schedule-{lesson_id}@{host}', day, Schedule.LESSON_TIMES[number],
+                        subject if kind == 'class' else f'{subject} ({class_number})',
+                        f'Кабинет {cabinet}', description, year, stamp)
+    if extra_filter:
+        extra = ExtraSchedule.objects.filter(**{extra_filter: pk}).order_by('day_of_week', 'lesson_number', 'id')
+        for extra_id, day, number, activity, teacher, cabinet in extra.values_list(
+            'id', 'day_of_week', 'lesson_number', 'activity__name', 'activity__teacher__full_name', 'cabinet__number',
+        ):
+            if number not in ExtraSchedule.LESSON_TIMES:
+                continue
+            lines += _event(f'extra-{extra_id}@{host}', day, ExtraSchedule.LESSON_TIMES[number],
+                            activity, f'Кабинет {cabinet}', teacher, year, stamp)
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(fold(line) for line in lines) + '\r\n').encode()
+
+
+def feed_stamp(stamp, today=None):
+    """Версия календаря: версия ресурса и учебный год. С 1 июля календарь строится
+    на следующий учебный год, поэтому с этого момента меняются ETag и Last-Modified"""
+    year = school_year(today)[0].year
+    rollover = datetime.datetime(year, 7, 1, tzinfo=datetime.timezone.utc).timestamp()
+    return stamps.Stamp(f'{year}-{stamp.etag}', max(stamp.last_modified, rollover))
+
+
+def feed_path(kind, pk, stamp=None, today=None):
+    """Путь к файлу календаря для текущей версии ресурса и учебного года"""
+    stamp = stamp or stamps.get(kind, pk)
+    return feed_dir() / kind / f'{pk}-{feed_stamp(stamp, today).etag}.ics'
+
+
+def open_feed(kind, pk, stamp=None, today=None):
+    """Календарь ресурса для ответа: открытый файл с диска или байты в памяти; None, если ресурса нет"""
+    stamp = stamp or stamps.get(kind, pk)
+    if stamp is None:
+        return None
+    path = feed_path(kind, pk, stamp, today)
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    content = render(kind, pk, feed_stamp(stamp, today).last_modified, today)
+    if content is None:
+        return None
+    write_feed(path, content)
+    # Не открываем файл заново: его уже могли заменить или удалить
+    return io.BytesIO(content)
+
+
+def write_feed(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Запись во временный файл и переименование: читатель не увидит файл наполовину
+    handle, temp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as target:
+            target.write(content)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    prefix = path.name.split('-', 1)[0] + '-'
+    _remove_outdated(path.parent.glob(f'{prefix}*.ics'), time.time() - MAX_AGE, keep=path)
+
+
+def _remove_outdated(paths, deadline, keep=None):
+    """Удаляет версии календаря одного ресурса, записанные раньше deadline, кроме keep (по умолчанию новейшей)"""
+    written = {}
+    for path in paths:
+        try:
+            written[path] = path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+    keep = keep or max(written, key=written.get, default=None)
+    removed = 0
+    for path, mtime in written.items():
+        if path == keep or mtime >= deadline:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            # Файл уже удалил другой процесс или (в Windows) файл сейчас открыт
+            continue
+        removed += 1
+    return removed
+
+
+def prune(max_age=None):
+    """Удаляет прежние версии календарей старше max_age секунд; возвращает число удаленных файлов"""
+    deadline = time.time() - (MAX_AGE if max_age is None else max_age)
+    removed = 0
+    for kind in FEEDS:
+        versions = {}
+        for path in (feed_dir() / kind).glob('*.ics'):
+            versions.setdefault(path.name.split('-', 1)[0], []).append(path)
+        for paths in versions.values():
+            removed += _remove_outdated(paths, deadline)
+    return removed
+
+
+def render_all(today=None):
+    """Рендерит календари всех ресурсов, которых еще нет на диске; возвращает число новых файлов"""
+    rendered = 0
+    for kind, (model, _, _) in FEEDS.items():
+        for pk in model.objects.values_list('pk', flat=True).iterator():
+            stamp = stamps.get(kind, pk)
+            if stamp is None:
+                continue
+            path = feed_path(kind, pk, stamp, today)
+            if path.is_file():
+                continue
+            content = render(kind, pk, feed_stamp(stamp, today).last_modified, today)
+            if content is not None:
+                write_feed(path, content)
+                rendered += 1
+    return rendered
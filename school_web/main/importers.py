@@ -0,0 +1,321 @@
+import csv
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+
+from .models import Cabinet, Schedule, SchoolGroup, Student, Subject, Teacher, TeacherSubject
+from .signals import refresh_after_bulk_change
+
+# Загрузка учеников, учителей и расписания из CSV.
+# Файл читается построчно, связи (класс, кабинет, предмет, учитель) ищутся
+# в словарях, загруженных один раз, запись идет пачками bulk_create/bulk_update
+# в одной транзакции. При любой ошибке в строках не сохраняется ничего.
+
+IMPORT_BATCH_SIZE = 2000
+
+
+class RowError(Exception):
+    """Ошибка в строке CSV"""
+
+
+class ImportResult:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        # Пары (номер строки файла, сообщение)
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def saved(self):
+        return self.ok and not self.dry_run
+
+
+def _lookup(pairs):
+    """Словарь значение -> id; неоднозначные значения помечаются None"""
+    result = {}
+    for value, pk in pairs:
+        key = str(value).strip().lower()
+        result[key] = None if key in result and result[key] != pk else pk
+    return result
+
+
+class CsvImporter:
+    """Базовый загрузчик: колонки CSV называются как поля модели"""
+
+    model = None
+    # Простые поля модели, которые берутся из одноименных колонок
+    fields = ()
+    # Колонки, без которых файл не принимается
+    required = ()
+    # Внешние ключи, которые заполняет build_relations
+    relations = ()
+    # Прочие колонки, которые разбирает загрузчик
+    extra_columns = ()
+    # Поля, по которым строка сопоставляется с уже существующей записью
+    key = ()
+    # Снимки отчетов (main.snapshots), в которых есть поля модели
+    snapshot_tables = ()
+
+    def __init__(self, delimiter=';', batch_size=IMPORT_BATCH_SIZE):
+        self.delimiter = delimiter
+        self.batch_size = batch_size
+        self.header = []
+
+    # Подготовка
+
+    def load_maps(self):
+        """Загружает словари для поиска связей"""
+
+    def existing_keys(self):
+        return {
+            tuple(row[:-1]): row[-1]
+            for row in self.model.objects.values_list(*self.key_attnames(), 'pk').iterator(chunk_size=self.batch_size)
+        }
+
+    def key_attnames(self):
+        return [self.model._meta.get_field(name).attname for name in self.key]
+
+    def update_fields(self):
+        # Существующим записям меняем только колонки, которые есть в файле
+        return [name for name in self.fields + self.relations if name in self.header]
+
+    # Разбор строки
+
+    def clean_field(self, name, raw):
+        field = self.model._meta.get_field(name)
+        value = (raw or '').strip()
+        if value == '':
+            if field.null:
+                return None
+            if field.has_default():
+                return field.get_default()
+            if field.blank:
+                return ''
+            raise RowError(f'{name}: обязательное поле')
+
+        if field.choices:
+            # Значение можно указать и кодом, и названием: "1" или "Понедельник"
+            labels = {str(label).lower(): code for code, label in field.flatchoices}
+            value = labels.get(value.lower(), value)
+        elif isinstance(field, models.DateField):
+            # Кроме ISO принимаем привычный формат ДД.ММ.ГГГГ
+            parts = value.split('.')
+            if len(parts) == 3 and all(part.isdigit() for part in parts):
+                try:
+                    value = datetime.date(int(parts[2]), int(parts[1]), int(parts[0]))
+                except ValueError:
+                    raise RowError(f'{name}: неверная дата "{value}"')
+        try:
+            return field.clean(value, None)
+        except ValidationError as error:
+            raise RowError(f'{name}: {" ".join(error.messages)}')
+
+    def resolve(self, name, lookup, raw, required=True):
+        value = (raw or '').strip()
+        if not value:
+            if required:
+                raise RowError(f'{name}: обязательное поле')
+            return None
+        key = value.lower()
+        if key not in lookup:
+            raise RowError(f'{name}: не найдено "{value}"')
+        if lookup[key] is None:
+            raise RowError(f'{name}: несколько записей "{value}", уточните значение')
+        return lookup[key]
+
+    def build(self, row):
+        obj = self.model(**{name: self.clean_field(name, row.get(name)) for name in self.fields})
+        self.build_relations(obj, row)
+        return obj
+
+    def build_relations(self, obj, row):
+        """Заполняет внешние ключи obj по колонкам строки"""
+
+    # Запись
+
+    def save_batch(self, to_create, to_update, result):
+        if to_create:
+            self.model.objects.bulk_create(to_create, batch_size=self.batch_size)
+            result.created += len(to_create)
+        if to_update:
+            self.update_rows(to_update)
+            result.updated += len(to_update)
+        self.after_batch(to_create + to_update)
+        to_create.clear()
+        to_update.clear()
+
+    def update_rows(self, objs):
+        """UPDATE по первичному ключу одним подготовленным запросом через executemany.
+
+        bulk_update строит выражения CASE WHEN в Python, это около 3 мс на строку:
+        обновление 40 тысяч учеников заняло бы минуту вместо секунды.
+        """
+        fields = [self.model._meta.get_field(name) for name in self.update_fields()]
+        if not fields:
+            return
+        quote = connection.ops.quote_name
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            quote(self.model._meta.db_table),
+            ', '.join(f'{quote(field.column)} = %s' for field in fields),
+            quote(self.model._meta.pk.column),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+                for obj in objs
+            ])
+
+    def after_batch(self, objs):
+        """Дополнительная запись после сохранения пачки (например, связи M2M)"""
+
+    def run(self, stream, dry_run=False):
+        """Загружает CSV из текстового потока; при dry_run все изменения откатываются"""
+        result = ImportResult(dry_run)
+        reader = csv.DictReader(stream, delimiter=self.delimiter)
+        try:
+            header = [name.strip() for name in reader.fieldnames or []]
+        except UnicodeDecodeError:
+            result.errors.append((1, 'Файл должен быть в кодировке UTF-8'))
+            return result
+        reader.fieldnames = self.header = header
+        missing = [name for name in self.required if name not in header]
+        if missing:
+            result.errors.append((1, f'Нет обязательных колонок: {", ".join(missing)}'))
+            return result
+
+        self.load_maps()
+        existing = self.existing_keys()
+        seen = {}
+        to_create, to_update = [], []
+        with transaction.atomic():
+            line = 1
+            try:
+                for row in reader:
+                    line = reader.line_num
+                    try:
+                        obj = self.build(row)
+                    except RowError as error:
+                        result.errors.append((line, str(error)))
+                        continue
+
+                    key = tuple(getattr(obj, attname) for attname in self.key_attnames())
+                    if key in seen:
+                        result.errors.append((line, f'Повторяет строку {seen[key]}'))
+                        continue
+                    seen[key] = line
+
+                    if key in existing:
+                        obj.pk = existing[key]
+                        to_update.append(obj)
+                    else:
+                        to_create.append(obj)
+                    if len(to_create) + len(to_update) >= self.batch_size:
+                        self.save_batch(to_create, to_update, result)
+            except UnicodeDecodeError:
+                result.errors.append((line + 1, 'Файл должен быть в кодировке UTF-8'))
+            except csv.Error as error:
+                result.errors.append((line + 1, f'Ошибка формата CSV: {error}'))
+
+            self.save_batch(to_create, to_update, result)
+            if not result.saved:
+                transaction.set_rollback(True)
+
+        if result.saved:
+            # bulk_create и bulk_update не отправляют сигналы
+            refresh_after_bulk_change(*self.snapshot_tables)
+        return result
+
+
+class StudentImporter(CsvImporter):
+    model = Student
+    fields = ('full_name', 'parent_name', 'birth_date', 'snills', 'address', 'phone')
+    required = ('full_name', 'phone', 'school_class')
+    relations = ('school_class',)
+    key = ('full_name', 'school_class')
+
+    def load_maps(self):
+        self.classes = _lookup(SchoolGroup.objects.values_list('number', 'id'))
+
+    def build_relations(self, obj, row):
+        obj.school_class_id = self.resolve('school_class', self.classes, row.get('school_class'))
+
+
+class TeacherImporter(CsvImporter):
+    """Учителя; колонка subjects - предметы через запятую, они только добавляются к уже назначенным"""
+
+    model = Teacher
+    fields = ('full_name', 'post', 'category', 'education', 'experience', 'prof_retrain')
+    extra_columns = ('subjects',)
+    required = ('full_name', 'post')
+    key = ('full_name',)
+    snapshot_tables = ('teachers', 'activities', 'lessons')
+
+    def load_maps(self):
+        # Предмет можно указать полным или сокращенным названием
+        self.subjects = _lookup(
+            list(Subject.objects.values_list('full_name', 'id'))
+            + list(Subject.objects.exclude(short_name=None).values_list('short_name', 'id'))
+        )
+
+    def build_relations(self, obj, row):
+        names = [name for name in (row.get('subjects') or '').split(',') if name.strip()]
+        obj._import_subject_ids = [self.resolve('subjects', self.subjects, name) for name in names]
+
+    def after_batch(self, objs):
+        links = {(obj.pk, subject_id) for obj in objs for subject_id in obj._import_subject_ids}
+        if not links:
+            return
+        # Связи хранятся и в Teacher.subjects, и в TeacherSubject: заполняем обе таблицы
+        through = Teacher.subjects.through
+        through.objects.bulk_create(
+            [through(teacher_id=t, subject_id=s) for t, s in links],
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+        TeacherSubject.objects.bulk_create(
+            [TeacherSubject(teacher_id=t, subject_id=s) for t, s in links],
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+
+
+class ScheduleImporter(CsvImporter):
+    """Уроки; если учитель не указан, он подбирается так же, как в Schedule.save()"""
+
+    model = Schedule
+    fields = ('day_of_week', 'lesson_number', 'info')
+    required = ('day_of_week', 'lesson_number', 'school_class', 'subject', 'cabinet')
+    relations = ('school_class', 'subject', 'cabinet', 'teacher')
+    key = ('school_class', 'day_of_week', 'lesson_number')
+    snapshot_tables = ('lessons',)
+
+    def load_maps(self):
+        self.classes = _lookup(SchoolGroup.objects.values_list('number', 'id'))
+        self.homeroom = dict(SchoolGroup.objects.values_list('id', 'teacher_id'))
+        self.subjects = _lookup(Subject.objects.values_list('full_name', 'id'))
+        self.cabinets = _lookup(Cabinet.objects.values_list('number', 'id'))
+        self.teachers = _lookup(Teacher.objects.values_list('full_name', 'id'))
+        self.teachers_by_subject = {}
+        for subject_id, teacher_id in TeacherSubject.objects.order_by('id').values_list('subject_id', 'teacher_id'):
+            self.teachers_by_subject.setdefault(subject_id, []).append(teacher_id)
+
+    def build_relations(self, obj, row):
+        obj.school_class_id = self.resolve('school_class', self.classes, row.get('school_class'))
+        obj.subject_id = self.resolve('subject', self.subjects, row.get('subject'))
+        obj.cabinet_id = self.resolve('cabinet', self.cabinets, row.get('cabinet'))
+        obj.teacher_id = self.resolve('teacher', self.teachers, row.get('teacher'), required=False)
+        if obj.teacher_id is None:
+            teacher_ids = self.teachers_by_subject.get(obj.subject_id, [])
+            homeroom_id = self.homeroom.get(obj.school_class_id)
+            obj.teacher_id = homeroom_id if homeroom_id in teacher_ids else (teacher_ids[0] if teacher_ids else None)
+
+
+IMPORTERS = {
+    'students': StudentImporter,
+    'teachers': TeacherImporter,
+    'schedule': ScheduleImporter,
+}
@@ -0,0 +1,208 @@
+import datetime
+import json
+import math
+import threading
+import time
+
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from .admin import TeacherAdmin
+
+# Нагрузочный тест публичных страниц и отчетов TeacherAdmin в одном процессе.
+# Каждая страница нагружается отдельно: N потоков со своими тестовыми
+# клиентами и соединениями с БД одновременно выполняют заданное число
+# запросов. По каждой странице считаются перцентили задержки, пропускная
+# способность и среднее число SQL-запросов на запрос. Результаты сохраняются
+# в JSON, чтобы сравнивать с ними следующие версии (команда load_test).
+
+BASELINE_VERSION = 1
+
+# Размер синтетической школы при scale=1 - как у populate_school по умолчанию
+DATASET = {
+    'teachers': 2000,
+    'classes': 300,
+    'students': 40000,
+    'schedules': 20000,
+    'activities': 200,
+    'extra_schedules': 600,
+    'enrollments': 2000,
+}
+
+
+def dataset(scale, seed):
+    """Параметры populate_school для школы размера scale"""
+    return {**{name: max(1, round(size * scale)) for name, size in DATASET.items()}, 'seed': seed}
+
+
+class Target:
+    """Нагружаемая страница; staff - нужен вход в админку"""
+
+    def __init__(self, name, url, method='get', data=None, staff=False, expected=200):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data or {}
+        self.staff = staff
+        self.expected = expected
+
+
+def targets():
+    return [
+        Target('index', reverse('home')),
+        Target('about', reverse('about')),
+        Target('create', reverse('create')),
+        # Отправка формы пишет в БД: проверяет и очередь на запись
+        Target('create_post', reverse('create'), method='post',
+               data={'title': 'Нагрузка', 'task': 'Задача нагрузочного теста'}, expected=302),
+    ] + [Target(name, reverse(f'admin:{name}'), staff=True) for name in TeacherAdmin.REPORTS]
+
+
+def percentile(values, q):
+    """Перцентиль по ближайшему рангу; values отсортированы"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_target(target, user, workers, requests):
+    """Нагружает одну страницу и возвращает ее метрики"""
+    lock = threading.Lock()
+    queue = iter(range(requests))
+    latencies, queries, exceptions = [], [], []
+    errors = 0
+    # Отсчет начинается, когда все потоки вошли и прогрели соединения
+    started = []
+    barrier = threading.Barrier(workers + 1, action=lambda: started.append(time.perf_counter()))
+
+    def worker():
+        nonlocal errors
+        measured, counted, failed = [], [], 0
+        try:
+            client = Client()
+            if target.staff:
+                client.force_login(user)
+            getattr(client, target.method)(target.url, target.data)
+            barrier.wait()
+            counter = _QueryCounter()
+            with connection.execute_wrapper(counter):
+                while True:
+                    with lock:
+                        if next(queue, None) is None:
+                            break
+                    before = counter.count
+                    request_started = time.perf_counter()
+                    response = getattr(client, target.method)(target.url, target.data)
+                    measured.append(time.perf_counter() - request_started)
+                    counted.append(counter.count - before)
+                    failed += response.status_code != target.expected
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as error:
+            # Остальные потоки не ждут у барьера того, кто уже не придет
+            barrier.abort()
+            exceptions.append(error)
+        finally:
+            connection.close()
+        with lock:
+            latencies.extend(measured)
+            queries.extend(counted)
+            errors += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    for thread in threads:
+        thread.join()
+    if exceptions:
+        raise exceptions[0]
+
+    elapsed = time.perf_counter() - started[0]
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'queries': sum(queries) / len(queries) if queries else 0.0,
+    }
+
+
+def run(selected, user, workers, requests, progress=None):
+    """Метрики страниц selected (имена из targets()) по очереди"""
+    results = {}
+    for target in targets():
+        if target.name in selected:
+            results[target.name] = run_target(target, user, workers, requests)
+            if progress:
+                progress(target.name, results[target.name])
+    return results
+
+
+def baseline(results, **settings):
+    """Документ для сохранения: метрики и условия прогона"""
+    return {
+        'version': BASELINE_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        **settings,
+        'results': results,
+    }
+
+
+def save(document, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(document, file, ensure_ascii=False, indent=2)
+        file.write('\n')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        document = json.load(file)
+    if document.get('version') != BASELINE_VERSION:
+        raise ValueError(f'{path}: неизвестная версия файла {document.get("version")}')
+    return document
+
+
+def change(old, new):
+    """Изменение в процентах; None, если сравнивать не с чем"""
+    return (new - old) / old * 100 if old else None
+
+
+def diff(results, previous, threshold=None):
+    """Строки сравнения (страница, p95 было/стало/%, запросов было/стало) и список регрессий.
+
+    Регрессия - ошибки на странице, рост p95 больше чем на threshold
+    процентов (если задан) или больше SQL-запросов на запрос, чем в прошлый раз.
+    """
+    rows, regressions = [], []
+    for name, current in results.items():
+        old = previous.get(name)
+        if old is None:
+            continue
+        # Быстрая страница с ошибками - не улучшение: ошибка в ответе вместо отчета
+        if current.get('errors', 0):
+            regressions.append(f'{name}: ошибок {old.get("errors", 0)} -> {current["errors"]}')
+        p95_change = change(old['p95'], current['p95'])
+        rows.append((name, old['p95'], current['p95'], p95_change, old['queries'], current['queries']))
+        if threshold is not None and p95_change is not None and p95_change > threshold:
+            regressions.append(f'{name}: p95 {old["p95"]:.1f} -> {current["p95"]:.1f} мс (+{p95_change:.0f}%)')
+        # Дробная часть - от редких запросов вроде сохранения сессии
+        if current['queries'] > old['queries'] + 0.5:
+            regressions.append(f'{name}: SQL-запросов {old["queries"]:.1f} -> {current["queries"]:.1f}')
+    return rows, regressions
@@ -0,0 +1,164 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+# Настройки SQLite по умолчанию, с которыми сравнивается профиль из settings.SQLITE_PRAGMAS
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+}
+DEFAULT_TIMEOUT = 5.0
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения SQLite при параллельной записи '
+            'с профилем производительности из настроек и без него')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='Строк в тестовой таблице')
+        parser.add_argument('--readers', type=int, default=4, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=2, help='Потоков записи')
+        parser.add_argument('--duration', type=float, default=5.0, help='Длительность каждого прогона в секундах')
+        parser.add_argument('--profile', choices=['both', 'on', 'off'], default='both',
+                            help='Какие прогоны выполнить')
+        parser.add_argument('--show', action='store_true', help='Показать PRAGMA текущего соединения Django и выйти')
+
+    def handle(self, *args, **options):
+        if options['show']:
+            self.show_pragmas()
+            return
+
+        modes = {'off': ('Без профиля', DEFAULT_PRAGMAS, DEFAULT_TIMEOUT, 'DEFERRED'),
+                 'on': ('С профилем', settings.SQLITE_PRAGMAS,
+                        settings.SQLITE_PRAGMAS['busy_timeout'] / 1000, 'IMMEDIATE')}
+        selected = ['off', 'on'] if options['profile'] == 'both' else [options['profile']]
+
+        results = {}
+        for mode in selected:
+            label, pragmas, timeout, begin = modes[mode]
+            with tempfile.TemporaryDirectory() as directory:
+                results[mode] = run_benchmark(
+                    Path(directory) / 'bench.sqlite3', pragmas, timeout, begin,
+                    options['rows'], options['readers'], options['writers'], options['duration'],
+                )
+            self.report(label, results[mode])
+
+        if len(results) == 2 and results['off']['reads_per_second']:
+            ratio = results['on']['reads_per_second'] / results['off']['reads_per_second']
+            self.stdout.write(self.style.SUCCESS(f'Чтение с профилем быстрее в {ratio:.1f} раза'))
+
+    def report(self, label, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f"  чтений/с: {result['reads_per_second']:>10.0f}   "
+                          f"записей/с: {result['writes_per_second']:>8.0f}")
+        self.stdout.write(f"  задержка чтения p50: {result['read_p50'] * 1000:.2f} мс   "
+                          f"p95: {result['read_p95'] * 1000:.2f} мс")
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f"  ошибок 'database is locked': {result['errors']}"))
+
+    def show_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('Соединение по умолчанию не SQLite')
+            return
+        with connection.cursor() as cursor:
+            for name in ['journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size', 'temp_store']:
+                cursor.execute(f'PRAGMA {name}')
+                self.stdout.write(f'{name:<14} {cursor.fetchone()[0]}')
+
+
+def _connect(path, pragmas, timeout):
+    db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name}={value}')
+    return db
+
+
+def _prepare(path, pragmas, timeout, rows):
+    db = _connect(path, pragmas, timeout)
+    db.execute('CREATE TABLE bench (id INTEGER PRIMARY KEY, grp INTEGER NOT NULL, value INTEGER NOT NULL, info TEXT)')
+    db.execute('CREATE INDEX bench_grp ON bench (grp)')
+    db.execute('BEGIN')
+    db.executemany(
+        'INSERT INTO bench (grp, value, info) VALUES (?, ?, ?)',
+        ((i % 100, i % 997, f'строка {i}') for i in range(rows)),
+    )
+    db.execute('COMMIT')
+    db.close()
+
+
+def run_benchmark(path, pragmas, timeout, begin, rows, readers, writers, duration):
+    """Параллельные чтения и записи в течение duration секунд, результат - пропускная способность"""
+    _prepare(path, pragmas, timeout, rows)
+    stop = threading.Event()
+    lock = threading.Lock()
+    totals = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+
+    def reader(seed):
+        rnd = random.Random(seed)
+        db = _connect(path, pragmas, timeout)
+        reads, latencies, errors = 0, [], 0
+        while not stop.is_set():
+            low = rnd.randrange(100)
+            started = time.perf_counter()
+            try:
+                db.execute('SELECT COUNT(*), SUM(value) FROM bench WHERE grp BETWEEN ? AND ?',
+                           (low, low + 10)).fetchone()
+            except sqlite3.OperationalError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            reads += 1
+        db.close()
+        with lock:
+            totals['reads'] += reads
+            totals['errors'] += errors
+            totals['latencies'] += latencies
+
+    def writer(seed):
+        rnd = random.Random(seed)
+        db = _connect(path, pragmas, timeout)
+        writes, errors = 0, 0
+        while not stop.is_set():
+            try:
+                db.execute(f'BEGIN {begin}')
+                for _ in range(5):
+                    db.execute('UPDATE bench SET value = value + 1, info = ? WHERE id = ?',
+                               (f'изменено {writes}', rnd.randrange(1, rows + 1)))
+                db.execute('COMMIT')
+                writes += 1
+            except sqlite3.OperationalError:
+                errors += 1
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+        db.close()
+        with lock:
+            totals['writes'] += writes
+            totals['errors'] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(totals['latencies']) or [0.0]
+    return {
+        'reads_per_second': totals['reads'] / elapsed,
+        'writes_per_second': totals['writes'] / elapsed,
+        'errors': totals['errors'],
+        'read_p50': statistics.median(latencies),
+        'read_p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
@@ -0,0 +1,46 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import generator
+
+
+class Command(BaseCommand):
+    help = ('Замеряет генератор расписания на синтетических школах растущего размера '
+            '(без БД) и проверяет, что расписания без накладок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 300], help='Классов в школе')
+        parser.add_argument('--repeat', type=int, default=3, help='Прогонов каждого размера с разными зернами')
+        parser.add_argument('--profiles', nargs='+', choices=list(generator.BENCHMARK_PROFILES),
+                            default=list(generator.BENCHMARK_PROFILES),
+                            help='Учебные планы классов: standard - обычный, tight - тесный, с вытеснениями')
+        parser.add_argument('--fill', type=float, default=0.9,
+                            help='Загрузка учителей от нормы (больше - теснее расписание)')
+        parser.add_argument('--limit', type=float, default=60.0, help='Допустимое время прогона, с')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'Профиль':<10}{'классов':>8}{'уроков':>9}{'учителей':>10}{'медиана':>11}{'макс.':>9}"
+                          f"{'вытеснений':>12}{'не поставлено':>15}")
+        failed = []
+        for profile in options['profiles']:
+            plan = generator.BENCHMARK_PROFILES[profile]
+            for size in options['sizes']:
+                times, repairs, unplaced = [], [], []
+                for seed in range(options['repeat']):
+                    problem = generator.synthetic_problem(size, seed=seed, plan=plan, fill=options['fill'])
+                    result = generator.generate(problem, seed=seed)
+                    if result.conflicts():
+                        failed.append(f'{profile}, {size} классов, зерно {seed}: накладки')
+                    if result.seconds > options['limit']:
+                        failed.append(f'{profile}, {size} классов, зерно {seed}: {result.seconds:.1f} с')
+                    times.append(result.seconds)
+                    repairs.append(result.repairs)
+                    unplaced.append(len(result.unplaced))
+                teachers = len({t for ids in problem.qualified.values() for t in ids})
+                self.stdout.write(
+                    f'{profile:<10}{size:>8}{len(result.lessons):>9}{teachers:>10}{statistics.median(times):>9.2f} с'
+                    f'{max(times):>7.2f} с{max(repairs):>12}{max(unplaced):>15}'
+                )
+        if failed:
+            raise CommandError('; '.join(failed))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main.conflicts import describe, find_all_conflicts
+
+
+class Command(BaseCommand):
+    help = 'Ищет накладки в расписании: кабинеты, классы и учителя, занятые дважды в одно время'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--day', type=int, choices=range(1, 7), help='Проверить только один день недели')
+        parser.add_argument('--kind', choices=['cabinet', 'class', 'teacher'], help='Только один вид накладок')
+        parser.add_argument('--fail', action='store_true', help='Завершиться с ошибкой, если найдены накладки')
+
+    def handle(self, *args, **options):
+        conflicts = find_all_conflicts(day=options['day'])
+        if options['kind']:
+            conflicts = [c for c in conflicts if c.kind == options['kind']]
+
+        for conflict in conflicts:
+            self.stdout.write(describe(conflict))
+
+        if not conflicts:
+            self.stdout.write(self.style.SUCCESS('Накладок в расписании не найдено'))
+        elif options['fail']:
+            raise CommandError(f'Найдено накладок: {len(conflicts)}')
+        else:
+            self.stdout.write(self.style.WARNING(f'Найдено накладок: {len(conflicts)}'))
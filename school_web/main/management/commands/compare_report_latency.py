@@ -0,0 +1,93 @@
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from main import report_cache
+from main.admin import TeacherAdmin
+from main.synthetic import populate_school
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку обычных и асинхронных (с одновременными запросами) отчетов TeacherAdmin. '
+            'Кэш страниц отчетов сбрасывается перед каждым запросом')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Запросов к каждому варианту отчета')
+        parser.add_argument('--report', choices=TeacherAdmin.REPORTS, help='Только один отчет')
+        parser.add_argument('--user', help='Имя сотрудника для входа в админку (по умолчанию первый суперпользователь)')
+        parser.add_argument('--synthetic', action='store_true',
+                            help='Временная файловая БД с синтетической школой вместо БД из настроек')
+        parser.add_argument('--teachers', type=int, default=2000, help='Учителей в синтетической школе')
+        parser.add_argument('--students', type=int, default=40000, help='Учеников в синтетической школе')
+
+    def handle(self, *args, **options):
+        if not options['synthetic']:
+            self.compare(self.get_user(options['user']), options)
+            return
+
+        # Тестовая БД в файле: параллельные соединения читают ее так же, как рабочую
+        with tempfile.TemporaryDirectory() as directory:
+            old_name = connection.settings_dict['NAME']
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(directory) / 'latency.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                populate_school(teachers=options['teachers'], students=options['students'])
+                user = get_user_model().objects.create_superuser('latency', 'latency@example.com', 'latency')
+                self.compare(user, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def get_user(self, username):
+        users = get_user_model().objects.filter(is_active=True, is_staff=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Не найден сотрудник для входа в админку, укажите --user')
+        return user
+
+    # Тестовые клиенты отправляют Host: testserver
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def compare(self, user, options):
+        # Оба варианта запрашиваются через ASGI, как в развертывании с asgi.py:
+        # обычное представление Django выполняет целиком в одном потоке
+        client = AsyncClient()
+        client.force_login(user)
+
+        reports = [options['report']] if options['report'] else TeacherAdmin.REPORTS
+        self.stdout.write(f"{'Отчет':<26}{'обычный p50':>13}{'p95':>9}{'async p50':>12}{'p95':>9}{'ускорение':>11}")
+        for name in reports:
+            sync_times, async_times = async_to_sync(self.measure)(client, name, options['iterations'])
+            sync_p50, async_p50 = statistics.median(sync_times), statistics.median(async_times)
+            self.stdout.write(
+                f'{name:<26}{sync_p50 * 1000:>10.1f} мс{_p95(sync_times) * 1000:>9.1f}'
+                f'{async_p50 * 1000:>9.1f} мс{_p95(async_times) * 1000:>9.1f}{sync_p50 / async_p50:>10.2f}x'
+            )
+
+    async def measure(self, client, name, iterations):
+        """Запросы к обоим вариантам по очереди в одном цикле событий, как в работающем сервере"""
+        urls = [reverse(f'admin:{name}'), reverse(f'admin:{name}_async')]
+        times = ([], [])
+        # Первые запросы прогревают сетку расписания и соединения потоков
+        for iteration in range(iterations + 1):
+            for url, measured in zip(urls, times):
+                report_cache.invalidate(name)
+                started = time.perf_counter()
+                response = await client.get(url)
+                elapsed = time.perf_counter() - started
+                if response.status_code != 200:
+                    raise CommandError(f'{url}: ответ {response.status_code}')
+                if iteration:
+                    measured.append(elapsed)
+        return times
+
+
+def _p95(times):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(len(times) * 0.95))]
@@ -0,0 +1,98 @@
+import re
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from main import timetable
+from main.models import SchoolGroup, Subject, Teacher
+
+# Отчеты и типичные значения фильтров, с которыми их открывают
+REPORT_FILTERS = {
+    'teachers_report': [{}],
+    'subjects_teachers_report': [{}],
+    'prof_retrain_report': [{'has_retrain': 'yes'}, {'has_retrain': 'no'}],
+    'teachers_classes_report': [{'has_classes': 'yes'}, {'has_classes': 'no'}],
+    'extra_activities_report': [{'activity_type': 'sport'}, {'is_active': 'yes'}],
+    'schedule_report': [{'day': '1'}, {'class': '{class_id}'}, {'subject': '{subject_id}'}],
+    'extra_schedule_report': [{'day': '1'}, {'activity_type': 'sport'}],
+    'workload_report': [{}, {'load': 'over'}],
+}
+
+# Строка плана 'SCAN Teacher' без 'USING INDEX' - полный просмотр таблицы
+FULL_SCAN = re.compile(r'^SCAN (?!subquery)(\S+)$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+class Command(BaseCommand):
+    help = ('Выполняет отчеты TeacherAdmin, снимает EXPLAIN QUERY PLAN для каждого их запроса '
+            'и отмечает полные просмотры таблиц')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--report', choices=sorted(REPORT_FILTERS), help='Проверить только один отчет')
+        parser.add_argument('--show-plans', action='store_true', help='Печатать планы всех запросов')
+        parser.add_argument('--fail', action='store_true', help='Завершиться с ошибкой при полном просмотре таблицы')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается только для SQLite')
+
+        model_admin = admin.site._registry[Teacher]
+        factory = RequestFactory()
+        user = get_user_model()(username='explain', is_staff=True, is_superuser=True, is_active=True)
+        ids = {
+            'class_id': SchoolGroup.objects.values_list('id', flat=True).first() or 1,
+            'subject_id': Subject.objects.values_list('id', flat=True).first() or 1,
+        }
+
+        problems = 0
+        reports = [options['report']] if options['report'] else list(REPORT_FILTERS)
+        for name in reports:
+            for params in REPORT_FILTERS[name]:
+                params = {key: value.format(**ids) for key, value in params.items()}
+                request = factory.get('/', params)
+                request.user = user
+                # Сетку расписания сбрасываем, чтобы увидеть запросы ее загрузки
+                timetable.invalidate()
+                with CaptureQueriesContext(connection) as captured:
+                    model_admin.render_report(request, getattr(model_admin, f'{name}_page')(request))
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{name} {params or ""}'))
+                problems += self.explain_queries(captured.captured_queries, options['show_plans'])
+
+        if problems:
+            message = f'Запросов с полным просмотром таблицы: {problems}'
+            if options['fail']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Все отфильтрованные запросы используют индексы'))
+
+    def explain_queries(self, queries, show_plans):
+        problems = 0
+        seen = set()
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT') or sql in seen:
+                    continue
+                seen.add(sql)
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+
+                # Полный просмотр без WHERE - это чтение всей таблицы по замыслу отчета
+                scans = [line for line in plan if FULL_SCAN.match(line.strip())] if ' WHERE ' in sql else []
+                sorts = [line for line in plan if TEMP_SORT in line]
+                if scans:
+                    problems += 1
+                    self.stdout.write(self.style.ERROR(f'  Полный просмотр: {"; ".join(scans)}'))
+                    self.stdout.write(f'    {sql[:300]}')
+                elif sorts and show_plans:
+                    self.stdout.write(self.style.WARNING(f'  Сортировка без индекса: {"; ".join(sorts)}'))
+                if show_plans:
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+        return problems
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import generator
+from main.models import SchoolGroup
+
+
+class Command(BaseCommand):
+    help = ('Составляет расписание уроков по учебному плану и заменяет им текущие уроки классов. '
+            'Уроки остальных классов и доп. занятия учитываются как занятое время')
+
+    def add_arguments(self, parser):
+        parser.add_argument('classes', nargs='*', help='Номера классов (по умолчанию все классы с учебным планом)')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно случайного выбора при равных вариантах')
+        parser.add_argument('--dry-run', action='store_true', help='Только составить и проверить, не сохраняя')
+
+    def handle(self, *args, **options):
+        class_ids = None
+        if options['classes']:
+            found = dict(SchoolGroup.objects.filter(number__in=options['classes']).values_list('number', 'id'))
+            missing = set(options['classes']) - set(found)
+            if missing:
+                raise CommandError(f'Классы не найдены: {", ".join(sorted(missing))}')
+            class_ids = set(found.values())
+
+        problem = generator.Problem.from_db(class_ids)
+        if not problem.requirements:
+            raise CommandError('Учебный план для классов не заполнен')
+        result = generator.generate(problem, seed=options['seed'])
+        conflicts = result.conflicts()
+        if conflicts:
+            raise CommandError(f'Генератор вернул накладки: {len(conflicts)}')
+
+        self.stdout.write(
+            f'Классов: {len(problem.class_ids)}, уроков поставлено: {len(result.placed)} из {len(result.lessons)}, '
+            f'вытеснений: {result.repairs}, {result.seconds:.2f} с'
+        )
+        if result.unplaced:
+            self.stdout.write(self.style.WARNING(f'Не удалось поставить уроков: {len(result.unplaced)}'))
+        if options['dry_run']:
+            return
+        created = generator.apply(result)
+        self.stdout.write(self.style.SUCCESS(f'Сохранено уроков: {created}'))
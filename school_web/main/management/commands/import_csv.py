@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.importers import IMPORT_BATCH_SIZE, IMPORTERS
+
+# Сколько ошибок печатать, остальные только считаются
+MAX_PRINTED_ERRORS = 50
+
+
+class Command(BaseCommand):
+    help = 'Загружает учеников, учителей или расписание из CSV-файла (колонки называются как поля модели)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help='Что загружать')
+        parser.add_argument('path', help='Путь к CSV-файлу в кодировке UTF-8')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не сохранять')
+        parser.add_argument('--delimiter', default=';', help='Разделитель колонок (по умолчанию ";")')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['kind']](delimiter=options['delimiter'], batch_size=options['batch_size'])
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = importer.run(stream, dry_run=options['dry_run'])
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть файл: {error}')
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors[:MAX_PRINTED_ERRORS]:
+            self.stdout.write(self.style.ERROR(f'Строка {line}: {message}'))
+        if len(result.errors) > MAX_PRINTED_ERRORS:
+            self.stdout.write(self.style.ERROR(f'... и еще {len(result.errors) - MAX_PRINTED_ERRORS} ошибок'))
+
+        summary = f'новых: {result.created}, обновлено: {result.updated} за {elapsed:.1f} с'
+        if not result.ok:
+            raise CommandError(f'Файл не загружен, ошибок: {len(result.errors)}')
+        if result.dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Проверка пройдена, будет {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Загружено: {summary}'))
@@ -0,0 +1,124 @@
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from main import loadtest
+from main.synthetic import populate_school
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест публичных страниц и отчетов TeacherAdmin: N потоков с тестовыми клиентами, '
+            'перцентили задержки, пропускная способность и SQL-запросы на запрос. '
+            'По умолчанию - на временной БД с синтетической школой')
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', metavar='page',
+                            help='Страницы (по умолчанию все): ' + ', '.join(t.name for t in loadtest.targets()))
+        parser.add_argument('--workers', type=int, default=8, help='Одновременных потоков')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов к каждой странице')
+        parser.add_argument('--scale', type=float, default=0.1,
+                            help='Размер синтетической школы относительно populate_school по умолчанию')
+        parser.add_argument('--seed', type=int, default=32, help='Зерно синтетической школы')
+        parser.add_argument('--current', action='store_true',
+                            help='БД из настроек вместо синтетической (отправка формы create пишет в нее)')
+        parser.add_argument('--user', help='Сотрудник для входа в админку с --current (по умолчанию первый суперпользователь)')
+        parser.add_argument('--cold', action='store_true', help='Без кэша страниц отчетов')
+        parser.add_argument('--save', metavar='FILE', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', metavar='FILE', help='Сравнить с сохраненными результатами')
+        parser.add_argument('--threshold', type=float,
+                            help='С --compare: ошибка, если p95 вырос больше чем на столько процентов')
+
+    def handle(self, *args, **options):
+        # choices с nargs='*' в argparse не пропускают пустой список, проверяем сами
+        names = [target.name for target in loadtest.targets()]
+        unknown = set(options['pages']) - set(names)
+        if unknown:
+            raise CommandError(f'Неизвестные страницы: {", ".join(sorted(unknown))}. Есть: {", ".join(names)}')
+        if options['workers'] < 1 or options['requests'] < 1:
+            raise CommandError('--workers и --requests должны быть больше нуля')
+        previous = None
+        if options['compare']:
+            try:
+                previous = loadtest.load(options['compare'])
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Не удалось прочитать {options["compare"]}: {error}')
+
+        if options['current']:
+            conditions = {'dataset': None}
+            results = self.measure(self.get_user(options['user']), options)
+        else:
+            conditions = {'dataset': loadtest.dataset(options['scale'], options['seed'])}
+            results = self.measure_synthetic(conditions['dataset'], options)
+        conditions.update(workers=options['workers'], requests=options['requests'], cold=options['cold'])
+        document = loadtest.baseline(results, **conditions)
+
+        if options['save']:
+            loadtest.save(document, options['save'])
+            self.stdout.write(f'Результаты сохранены в {options["save"]}')
+        if previous is not None:
+            self.compare(document, previous, options['threshold'])
+        failed = [name for name, result in results.items() if result['errors']]
+        if failed:
+            raise CommandError('Ответы с ошибкой: ' + ', '.join(failed))
+
+    def measure_synthetic(self, dataset, options):
+        # БД в файле: потоки открывают к ней свои соединения, как процессы сервера
+        with tempfile.TemporaryDirectory() as directory:
+            old_name = connection.settings_dict['NAME']
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(directory) / 'load.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                self.stdout.write('Синтетическая школа: ' + ', '.join(f'{k}={v}' for k, v in dataset.items()))
+                populate_school(**dataset)
+                user = get_user_model().objects.create_superuser('loadtest', 'loadtest@example.com', 'loadtest')
+                return self.measure(user, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def get_user(self, username):
+        users = get_user_model().objects.filter(is_active=True, is_staff=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Не найден сотрудник для входа в админку, укажите --user')
+        return user
+
+    def measure(self, user, options):
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if options['cold']:
+            overrides['CACHES'] = {
+                **settings.CACHES, 'reports': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            }
+        # Тестовые клиенты отправляют Host: testserver
+        with override_settings(**overrides):
+            self.stdout.write(f"{'Страница':<26}{'запросов':>9}{'ошибок':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+                              f"{'запр./с':>9}{'SQL':>7}")
+            return loadtest.run(
+                options['pages'] or [target.name for target in loadtest.targets()],
+                user, options['workers'], options['requests'], progress=self.write_result,
+            )
+
+    def write_result(self, name, result):
+        line = (f"{name:<26}{result['requests']:>9}{result['errors']:>8}{result['p50']:>6.1f} мс"
+                f"{result['p95']:>6.1f} мс{result['p99']:>6.1f} мс{result['throughput']:>9.1f}{result['queries']:>7.1f}")
+        self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+    def compare(self, document, previous, threshold):
+        for key in ('dataset', 'workers', 'requests', 'cold'):
+            if document[key] != previous.get(key):
+                self.stdout.write(self.style.WARNING(
+                    f'Условия прогона отличаются ({key}: было {previous.get(key)}, стало {document[key]}), '
+                    'сравнение приблизительное'
+                ))
+        rows, regressions = loadtest.diff(document['results'], previous['results'], threshold)
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с результатами от {previous["created"]}'))
+        self.stdout.write(f"{'Страница':<26}{'p95 было':>12}{'стало':>12}{'изменение':>11}{'SQL было':>10}{'стало':>7}")
+        for name, old_p95, p95, p95_change, old_queries, queries in rows:
+            change = f'{p95_change:+.0f}%' if p95_change is not None else '-'
+            self.stdout.write(f'{name:<26}{old_p95:>9.1f} мс{p95:>9.1f} мс{change:>11}{old_queries:>10.1f}{queries:>7.1f}')
+        if regressions:
+            raise CommandError('Регрессии: ' + '; '.join(regressions))
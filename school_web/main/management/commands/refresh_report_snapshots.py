@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main import report_cache, snapshots, timetable
+
+
+class Command(BaseCommand):
+    help = ('Полностью пересобирает снимки отчетов (учителя и классы, дополнительные занятия, уроки). '
+            'Нужна после изменений в обход сигналов: загрузки фикстур, SQL вручную')
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshots', nargs='*',
+                            help=f'Какие снимки пересобрать: {", ".join(snapshots.REFRESH)} (по умолчанию все)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        names = options['snapshots'] or list(snapshots.REFRESH)
+        unknown = set(names) - set(snapshots.REFRESH)
+        if unknown:
+            raise CommandError(f'Неизвестные снимки: {", ".join(sorted(unknown))}')
+        snapshots.rebuild(*names)
+        timetable.invalidate()
+        report_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимки пересобраны: {", ".join(names)} за {time.perf_counter() - started:.1f} с'
+        ))
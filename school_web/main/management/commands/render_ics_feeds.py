@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import ics
+
+
+class Command(BaseCommand):
+    help = ('Заранее рендерит календари .ics всех классов, учителей и кабинетов, '
+            'у которых изменилось расписание, и удаляет устаревшие версии')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=ics.MAX_AGE,
+                            help='Удалять прежние версии старше стольких секунд')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rendered = ics.render_all()
+        removed = ics.prune(options['max_age'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Новых календарей: {rendered}, удалено устаревших: {removed} '
+            f'за {time.perf_counter() - started:.1f} с, каталог {ics.feed_dir()}'
+        ))
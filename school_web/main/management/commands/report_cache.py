@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from main import report_cache
+
+
+class Command(BaseCommand):
+    help = 'Показывает счетчики попаданий и промахов кэша отчетов, при необходимости сбрасывает кэш'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help='Сбросить сохраненные страницы всех отчетов')
+        parser.add_argument('--reset-stats', action='store_true', help='Обнулить счетчики')
+
+    def handle(self, *args, **options):
+        for name, counters in report_cache.stats().items():
+            total = counters['hits'] + counters['misses']
+            ratio = counters['hits'] / total * 100 if total else 0
+            self.stdout.write(f"{name:<28} попаданий: {counters['hits']:>6}  "
+                              f"промахов: {counters['misses']:>6}  ({ratio:.0f}%)")
+
+        if options['clear']:
+            report_cache.invalidate()
+            self.stdout.write(self.style.SUCCESS('Кэш отчетов сброшен'))
+        if options['reset_stats']:
+            report_cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_schedule_teachers(apps, schema_editor):
+    """Назначает учителя существующим урокам через связь Учитель-Предмет"""
+    Schedule = apps.get_model('main', 'Schedule')
+    SchoolGroup = apps.get_model('main', 'SchoolGroup')
+    TeacherSubject = apps.get_model('main', 'TeacherSubject')
+
+    teachers_by_subject = {}
+    for subject_id, teacher_id in TeacherSubject.objects.order_by('id').values_list('subject_id', 'teacher_id'):
+        teachers_by_subject.setdefault(subject_id, []).append(teacher_id)
+    homeroom = dict(SchoolGroup.objects.values_list('id', 'teacher_id'))
+
+    changed = []
+    for schedule in Schedule.objects.filter(teacher__isnull=True).only('id', 'subject_id', 'school_class_id'):
+        candidates = teachers_by_subject.get(schedule.subject_id)
+        if not candidates:
+            continue
+        homeroom_id = homeroom.get(schedule.school_class_id)
+        schedule.teacher_id = homeroom_id if homeroom_id in candidates else candidates[0]
+        changed.append(schedule)
+    Schedule.objects.bulk_update(changed, ['teacher'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_remove_schedule_end_time_remove_schedule_start_time_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='teacher',
+            field=models.ForeignKey(blank=True, db_column='ID_Teacher', null=True, on_delete=django.db.models.deletion.SET_NULL, to='main.teacher', verbose_name='Учитель'),
+        ),
+        migrations.RunPython(fill_schedule_teachers, migrations.RunPython.noop),
+    ]
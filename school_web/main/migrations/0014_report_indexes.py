@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_schedule_teacher'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='extraactivity',
+            index=models.Index(fields=['activity_type', 'is_active'], name='activity_type_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extraschedule',
+            index=models.Index(fields=['day_of_week', 'lesson_number'], name='extra_day_lesson_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extraschedule',
+            index=models.Index(fields=['activity', 'day_of_week'], name='extra_activity_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='extraschedule',
+            index=models.Index(fields=['cabinet', 'day_of_week'], name='extra_cabinet_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['day_of_week', 'lesson_number'], name='schedule_day_lesson_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['school_class', 'day_of_week', 'lesson_number'], name='schedule_class_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['subject', 'day_of_week', 'lesson_number'], name='schedule_subject_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['cabinet', 'day_of_week'], name='schedule_cabinet_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['teacher', 'day_of_week'], name='schedule_teacher_day_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Полнотекстовые индексы SQLite FTS5 для поиска в админке (main.search).
+# Индексы заполняются и обновляются триггерами, поэтому учитывают и bulk_create,
+# и UPDATE из загрузки CSV. Токенизатор unicode61 приводит кириллицу к нижнему
+# регистру, а "ё" он не считает "е" - ее заменяем сами при записи в индекс.
+
+# Таблица индекса -> (таблица модели, первичный ключ, колонки)
+INDEXES = {
+    'search_student': ('Student', 'ID_Student', ['FIO_Student', 'FIO_Parent', 'Phone']),
+    'search_teacher': ('Teacher', 'ID_Teacher', ['FIO', 'Post', 'Education']),
+    'search_activity': ('ExtraActivity', 'ID_ExtraActivity', ['Name', 'Description']),
+}
+
+
+def _normalized(prefix, column):
+    return f"replace(replace(coalesce({prefix}\"{column}\", ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_sql(index, table, pk, columns):
+    names = ', '.join(f'"{column}"' for column in columns)
+    values = ', '.join(_normalized('new.', column) for column in columns)
+    return [
+        f'CREATE VIRTUAL TABLE "{index}" USING fts5({names}, '
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f'INSERT INTO "{index}" (rowid, {names}) '
+        f'SELECT "{pk}", {", ".join(_normalized("", column) for column in columns)} FROM "{table}"',
+        f'CREATE TRIGGER "{index}_insert" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{index}" (rowid, {names}) VALUES (new."{pk}", {values}); END',
+        f'CREATE TRIGGER "{index}_update" AFTER UPDATE ON "{table}" BEGIN '
+        f'DELETE FROM "{index}" WHERE rowid = old."{pk}"; '
+        f'INSERT INTO "{index}" (rowid, {names}) VALUES (new."{pk}", {values}); END',
+        f'CREATE TRIGGER "{index}_delete" AFTER DELETE ON "{table}" BEGIN '
+        f'DELETE FROM "{index}" WHERE rowid = old."{pk}"; END',
+    ]
+
+
+def drop_sql(index):
+    return [f'DROP TRIGGER IF EXISTS "{index}_{event}"' for event in ('insert', 'update', 'delete')] + [
+        f'DROP TABLE IF EXISTS "{index}"'
+    ]
+
+
+def create_indexes(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других СУБД админка ищет обычным LIKE
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, (table, pk, columns) in INDEXES.items():
+        for sql in create_sql(index, table, pk, columns):
+            schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index in INDEXES:
+        for sql in drop_sql(index):
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
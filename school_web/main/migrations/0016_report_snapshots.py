@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+from main import snapshots
+
+
+def fill_snapshots(apps, schema_editor):
+    snapshots.rebuild(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivitySnapshot',
+            fields=[
+                ('activity_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('activity_type', models.CharField(choices=[('sport', 'Спортивное'), ('art', 'Творческое'), ('science', 'Научное'), ('language', 'Языковое'), ('other', 'Другое')], max_length=20)),
+                ('teacher_id', models.IntegerField()),
+                ('teacher_name', models.CharField(max_length=35)),
+                ('teacher_post', models.CharField(max_length=20)),
+                ('max_students', models.PositiveSmallIntegerField()),
+                ('is_active', models.BooleanField()),
+                ('schedules', models.JSONField(default=list)),
+                ('schedule_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'Snapshot_Activity',
+                'indexes': [models.Index(fields=['name', 'activity_id'], name='snapshot_activity_name_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LessonSnapshot',
+            fields=[
+                ('lesson_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('day_of_week', models.PositiveSmallIntegerField()),
+                ('lesson_number', models.PositiveSmallIntegerField()),
+                ('school_class_id', models.IntegerField()),
+                ('class_number', models.CharField(max_length=20)),
+                ('subject_id', models.IntegerField()),
+                ('subject_name', models.CharField(max_length=100)),
+                ('teacher_id', models.IntegerField(null=True)),
+                ('teacher_name', models.CharField(max_length=35, null=True)),
+                ('cabinet_id', models.IntegerField()),
+                ('cabinet_number', models.CharField(max_length=20)),
+                ('info', models.CharField(max_length=100, null=True)),
+            ],
+            options={
+                'db_table': 'Snapshot_Lesson',
+                'indexes': [models.Index(fields=['day_of_week', 'lesson_number', 'school_class_id'], name='snapshot_lesson_slot_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TeacherClassesSnapshot',
+            fields=[
+                ('teacher_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('full_name', models.CharField(max_length=35)),
+                ('post', models.CharField(max_length=20)),
+                ('category', models.CharField(blank=True, max_length=15, null=True)),
+                ('classes', models.JSONField(default=list)),
+                ('classes_count', models.PositiveIntegerField(default=0)),
+                ('cabinet_numbers', models.TextField(blank=True, default='')),
+                ('cabinets_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'Snapshot_TeacherClasses',
+                'indexes': [models.Index(fields=['full_name', 'teacher_id'], name='snapshot_teacher_name_idx')],
+            },
+        ),
+        migrations.RunPython(fill_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_report_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons_per_week', models.PositiveSmallIntegerField(db_column='Lessons_Per_Week', verbose_name='Уроков в неделю')),
+                ('school_class', models.ForeignKey(db_column='ID_Class', on_delete=django.db.models.deletion.CASCADE, to='main.schoolgroup', verbose_name='Класс')),
+                ('subject', models.ForeignKey(db_column='ID_Subject', on_delete=django.db.models.deletion.CASCADE, to='main.subject', verbose_name='Предмет')),
+            ],
+            options={
+                'verbose_name': 'Учебный план',
+                'verbose_name_plural': 'Учебный план',
+                'db_table': 'Study_Plan',
+                'unique_together': {('school_class', 'subject')},
+            },
+        ),
+    ]
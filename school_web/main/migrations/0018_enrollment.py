@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:30
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+search_index = importlib.import_module('main.migrations.0015_search_index')
+
+
+def restore_search_triggers(apps, schema_editor):
+    # Добавляя и удаляя NOT NULL колонку, SQLite пересоздает таблицу ExtraActivity,
+    # и триггеры полнотекстового индекса удаляются вместе со старой таблицей.
+    # Строки индекса остаются верными: ключи записей не меняются
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    index = 'search_activity'
+    table, pk, columns = search_index.INDEXES[index]
+    for sql in search_index.drop_sql(index)[:-1] + search_index.create_sql(index, table, pk, columns)[2:]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_study_plan'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.AddField(
+            model_name='extraactivity',
+            name='seats_taken',
+            field=models.PositiveSmallIntegerField(db_column='Seats_Taken', default=0, verbose_name='Занято мест'),
+        ),
+        migrations.CreateModel(
+            name='Enrollment',
+            fields=[
+                ('id', models.AutoField(db_column='ID_Enrollment', primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('enrolled', 'Записан'), ('waitlist', 'Лист ожидания'), ('cancelled', 'Отменена')], db_column='Status', max_length=10, verbose_name='Статус')),
+                ('idempotency_key', models.CharField(db_column='Idempotency_Key', max_length=64, unique=True, verbose_name='Ключ запроса')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_column='Created_At', verbose_name='Создана')),
+                ('activity', models.ForeignKey(db_column='ID_ExtraActivity', on_delete=django.db.models.deletion.CASCADE, to='main.extraactivity', verbose_name='Занятие')),
+                ('student', models.ForeignKey(db_column='ID_Student', on_delete=django.db.models.deletion.CASCADE, to='main.student', verbose_name='Ученик')),
+            ],
+            options={
+                'verbose_name': 'Запись на занятие',
+                'verbose_name_plural': 'Записи на занятия',
+                'db_table': 'Enrollment',
+                'indexes': [models.Index(fields=['activity', 'status', 'id'], name='enrollment_queue_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('activity', 'student'), name='enrollment_active_unique')],
+            },
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
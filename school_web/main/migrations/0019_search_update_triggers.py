@@ -0,0 +1,50 @@
+import importlib
+
+from django.db import migrations
+
+search_index = importlib.import_module('main.migrations.0015_search_index')
+
+# Триггеры обновления индексов поиска из 0015 срабатывают на любой UPDATE.
+# Пересоздаем их как AFTER UPDATE OF <индексируемые колонки>: счетчики вроде
+# ExtraActivity.seats_taken меняются часто и не должны переписывать строку
+# индекса под блокировкой записи. Откат возвращает триггеры из 0015.
+
+
+def update_trigger_sql(index, table, pk, columns):
+    names = ', '.join(f'"{column}"' for column in columns)
+    values = ', '.join(search_index._normalized('new.', column) for column in columns)
+    return (
+        f'CREATE TRIGGER "{index}_update" AFTER UPDATE OF {names} ON "{table}" BEGIN '
+        f'DELETE FROM "{index}" WHERE rowid = old."{pk}"; '
+        f'INSERT INTO "{index}" (rowid, {names}) VALUES (new."{pk}", {values}); END'
+    )
+
+
+def _replace_update_triggers(schema_editor, trigger_sql):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for index, (table, pk, columns) in search_index.INDEXES.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{index}_update"')
+        schema_editor.execute(trigger_sql(index, table, pk, columns))
+
+
+def column_update_triggers(apps, schema_editor):
+    _replace_update_triggers(schema_editor, update_trigger_sql)
+
+
+def any_update_triggers(apps, schema_editor):
+    # Триггер обновления - четвертая команда create_sql из 0015
+    _replace_update_triggers(
+        schema_editor, lambda index, table, pk, columns: search_index.create_sql(index, table, pk, columns)[3],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_enrollment'),
+    ]
+
+    operations = [
+        migrations.RunPython(column_update_triggers, any_update_triggers),
+    ]
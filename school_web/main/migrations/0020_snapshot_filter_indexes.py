@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_search_update_triggers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitysnapshot',
+            index=models.Index(fields=['activity_type', 'is_active'], name='snapshot_activity_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitysnapshot',
+            index=models.Index(fields=['is_active'], name='snapshot_activity_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teacherclassessnapshot',
+            index=models.Index(fields=['classes_count'], name='snapshot_teacher_classes_idx'),
+        ),
+    ]
@@ -1,5 +1,18 @@
+import re
+
 from django.db import models
 
+
+# Время начала и окончания урока из подписи вида '1 урок (8:30-9:10)', в минутах от полуночи
+def lesson_time_ranges(choices):
+    ranges = {}
+    for number, label in choices:
+        match = re.search(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})', label)
+        if match:
+            start_h, start_m, end_h, end_m = map(int, match.groups())
+            ranges[number] = (start_h * 60 + start_m, end_h * 60 + end_m)
+    return ranges
+
 # Проверка работы бд
 class Task(models.Model):
     title = models.CharField('Название', max_length=50)
@@ -143,6 +156,15 @@ class Schedule(models.Model):
         on_delete=models.CASCADE,
         db_column='ID_Class'
     )
+    # Учитель, который ведет предмет именно в этом классе
+    teacher = models.ForeignKey(
+        Teacher,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Учитель',
+        db_column='ID_Teacher'
+    )
 
 
     LESSON_CHOICES = [
@@ -156,6 +178,7 @@ class Schedule(models.Model):
         (8, '8 урок (14:40-15:20)'),
         (9, '9 урок (15:30-16:10)'),
     ]
+    LESSON_TIMES = lesson_time_ranges(LESSON_CHOICES)
 
     day_of_week = models.PositiveSmallIntegerField(
         choices=[(1, 'Понедельник'), (2, 'Вторник'), (3, 'Среда'),
@@ -168,6 +191,22 @@ class Schedule(models.Model):
         verbose_name='Номер урока'
     )
 
+    # Подбор учителя через связь Учитель-Предмет: приоритет у классного руководителя
+    def suggest_teacher_id(self):
+        teacher_ids = list(
+            TeacherSubject.objects.filter(subject_id=self.subject_id)
+            .order_by('id').values_list('teacher_id', flat=True)
+        )
+        if not teacher_ids:
+            return None
+        homeroom_id = SchoolGroup.objects.filter(pk=self.school_class_id).values_list('teacher_id', flat=True).first()
+        return homeroom_id if homeroom_id in teacher_ids else teacher_ids[0]
+
+    def save(self, *args, **kwargs):
+        if self.teacher_id is None and self.subject_id:
+            self.teacher_id = self.suggest_teacher_id()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.get_day_of_week_display()} - {self.get_lesson_number_display()} - {self.subject}"
 
@@ -176,6 +215,14 @@ class Schedule(models.Model):
         verbose_name = 'Расписание'
         verbose_name_plural = 'Расписание'
         ordering = ['day_of_week', 'lesson_number']
+        # Индексы под фильтры и сортировку отчета по расписанию и проверку накладок
+        indexes = [
+            models.Index(fields=['day_of_week', 'lesson_number'], name='schedule_day_lesson_idx'),
+            models.Index(fields=['school_class', 'day_of_week', 'lesson_number'], name='schedule_class_day_idx'),
+            models.Index(fields=['subject', 'day_of_week', 'lesson_number'], name='schedule_subject_day_idx'),
+            models.Index(fields=['cabinet', 'day_of_week'], name='schedule_cabinet_day_idx'),
+            models.Index(fields=['teacher', 'day_of_week'], name='schedule_teacher_day_idx'),
+        ]
 
 # Связующая таблица Учитель-Предмет (Many-to-Many)
 class TeacherSubject(models.Model):
@@ -201,6 +248,33 @@ class TeacherSubject(models.Model):
         unique_together = ['subject', 'teacher']
 
 
+# Учебный план: сколько уроков предмета в неделю нужно классу.
+# По нему генератор (main.generator) составляет расписание.
+class StudyPlan(models.Model):
+    school_class = models.ForeignKey(
+        SchoolGroup,
+        on_delete=models.CASCADE,
+        verbose_name='Класс',
+        db_column='ID_Class'
+    )
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        verbose_name='Предмет',
+        db_column='ID_Subject'
+    )
+    lessons_per_week = models.PositiveSmallIntegerField(verbose_name='Уроков в неделю', db_column='Lessons_Per_Week')
+
+    def __str__(self):
+        return f"{self.school_class} - {self.subject}: {self.lessons_per_week}"
+
+    class Meta:
+        db_table = 'Study_Plan'
+        verbose_name = 'Учебный план'
+        verbose_name_plural = 'Учебный план'
+        unique_together = ['school_class', 'subject']
+
+
 # Дополнительные занятия
 
 class ExtraActivity(models.Model):
@@ -239,13 +313,29 @@ class ExtraActivity(models.Model):
 
     is_active = models.BooleanField(default=True, verbose_name='Активно', db_column='Is_Active')
 
+    # Занятые места: меняет только main.enrollment условным UPDATE
+    seats_taken = models.PositiveSmallIntegerField(default=0, verbose_name='Занято мест', db_column='Seats_Taken')
+
     def __str__(self):
         return f"{self.name} ({self.get_activity_type_display()})"
 
+    def save(self, *args, **kwargs):
+        # Сохранение из админки не должно затирать счетчик, который успел
+        # измениться после загрузки формы
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'seats_taken'
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         db_table = 'ExtraActivity'
         verbose_name = 'Дополнительное занятие'
         verbose_name_plural = 'Дополнительные занятия'
+        indexes = [
+            models.Index(fields=['activity_type', 'is_active'], name='activity_type_active_idx'),
+        ]
 
 # Расписание дополнительных занятий
 class ExtraSchedule(models.Model):
@@ -277,6 +367,7 @@ class ExtraSchedule(models.Model):
         (10, 'После уроков (16:15-17:00)'),
         (11, 'После уроков (17:10-17:55)'),
     ]
+    LESSON_TIMES = lesson_time_ranges(LESSON_CHOICES)
 
     lesson_number = models.PositiveSmallIntegerField(
         choices=LESSON_CHOICES,
@@ -298,4 +389,124 @@ class ExtraSchedule(models.Model):
         db_table = 'ExtraSchedule'
         verbose_name = 'Расписание доп. занятий'
         verbose_name_plural = 'Расписание доп. занятий'
-        ordering = ['day_of_week', 'lesson_number']
\ No newline at end of file
+        ordering = ['day_of_week', 'lesson_number']
+        indexes = [
+            models.Index(fields=['day_of_week', 'lesson_number'], name='extra_day_lesson_idx'),
+            models.Index(fields=['activity', 'day_of_week'], name='extra_activity_day_idx'),
+            models.Index(fields=['cabinet', 'day_of_week'], name='extra_cabinet_day_idx'),
+        ]
+
+# Запись ученика на дополнительное занятие. Места выдает main.enrollment:
+# сверх max_students ученик попадает в лист ожидания
+class Enrollment(models.Model):
+    ENROLLED, WAITLIST, CANCELLED = 'enrolled', 'waitlist', 'cancelled'
+    STATUS_CHOICES = [
+        (ENROLLED, 'Записан'),
+        (WAITLIST, 'Лист ожидания'),
+        (CANCELLED, 'Отменена'),
+    ]
+
+    id = models.AutoField(primary_key=True, db_column='ID_Enrollment')
+    activity = models.ForeignKey(
+        ExtraActivity,
+        on_delete=models.CASCADE,
+        verbose_name='Занятие',
+        db_column='ID_ExtraActivity'
+    )
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        verbose_name='Ученик',
+        db_column='ID_Student'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, verbose_name='Статус', db_column='Status')
+    # Ключ запроса от клиента: повтор с тем же ключом возвращает ту же запись
+    idempotency_key = models.CharField(max_length=64, unique=True, verbose_name='Ключ запроса',
+                                       db_column='Idempotency_Key')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана', db_column='Created_At')
+
+    def __str__(self):
+        return f"{self.student} - {self.activity.name}: {self.get_status_display()}"
+
+    class Meta:
+        db_table = 'Enrollment'
+        verbose_name = 'Запись на занятие'
+        verbose_name_plural = 'Записи на занятия'
+        constraints = [
+            # Отмененные записи не мешают записаться снова
+            models.UniqueConstraint(fields=['activity', 'student'], condition=~models.Q(status='cancelled'),
+                                    name='enrollment_active_unique'),
+        ]
+        indexes = [
+            # Лист ожидания занятия по порядку записи
+            models.Index(fields=['activity', 'status', 'id'], name='enrollment_queue_idx'),
+        ]
+
+# Снимки отчетов: готовые строки отчетов без JOIN и агрегации.
+# Заполняются и обновляются в main.snapshots, напрямую не редактируются.
+
+class TeacherClassesSnapshot(models.Model):
+    """Строка отчета по учителям и классам"""
+    teacher_id = models.IntegerField(primary_key=True)
+    full_name = models.CharField(max_length=35)
+    post = models.CharField(max_length=20)
+    category = models.CharField(max_length=15, null=True, blank=True)
+    # Пары [номер класса, номер кабинета класса]
+    classes = models.JSONField(default=list)
+    classes_count = models.PositiveIntegerField(default=0)
+    # Номера закрепленных кабинетов через запятую
+    cabinet_numbers = models.TextField(blank=True, default='')
+    cabinets_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'Snapshot_TeacherClasses'
+        indexes = [
+            models.Index(fields=['full_name', 'teacher_id'], name='snapshot_teacher_name_idx'),
+            models.Index(fields=['classes_count'], name='snapshot_teacher_classes_idx'),
+        ]
+
+
+class ActivitySnapshot(models.Model):
+    """Строка отчета по дополнительным занятиям"""
+    activity_id = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True, null=True)
+    activity_type = models.CharField(max_length=20, choices=ExtraActivity.ACTIVITY_TYPES)
+    teacher_id = models.IntegerField()
+    teacher_name = models.CharField(max_length=35)
+    teacher_post = models.CharField(max_length=20)
+    max_students = models.PositiveSmallIntegerField()
+    is_active = models.BooleanField()
+    # Тройки [день недели, номер занятия, номер кабинета] по порядку
+    schedules = models.JSONField(default=list)
+    schedule_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'Snapshot_Activity'
+        indexes = [
+            models.Index(fields=['name', 'activity_id'], name='snapshot_activity_name_idx'),
+            models.Index(fields=['activity_type', 'is_active'], name='snapshot_activity_type_idx'),
+            models.Index(fields=['is_active'], name='snapshot_activity_active_idx'),
+        ]
+
+
+class LessonSnapshot(models.Model):
+    """Урок расписания с названиями вместо ключей"""
+    lesson_id = models.IntegerField(primary_key=True)
+    day_of_week = models.PositiveSmallIntegerField()
+    lesson_number = models.PositiveSmallIntegerField()
+    school_class_id = models.IntegerField()
+    class_number = models.CharField(max_length=20)
+    subject_id = models.IntegerField()
+    subject_name = models.CharField(max_length=100)
+    teacher_id = models.IntegerField(null=True)
+    teacher_name = models.CharField(max_length=35, null=True)
+    cabinet_id = models.IntegerField()
+    cabinet_number = models.CharField(max_length=20)
+    info = models.CharField(max_length=100, null=True)
+
+    class Meta:
+        db_table = 'Snapshot_Lesson'
+        indexes = [
+            models.Index(fields=['day_of_week', 'lesson_number', 'school_class_id'], name='snapshot_lesson_slot_idx'),
+        ]
@@ -0,0 +1,203 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Cabinet, ExtraSchedule, Schedule, Teacher, TeacherSubject
+from .timetable import DAY_CHOICES
+
+# Индекс занятости кабинетов и учителей для поиска свободных на замену.
+# Занятость ресурса за неделю - одно число: на каждый день 20 бит, 9 уроков
+# по звонкам Schedule и 11 занятий по звонкам ExtraSchedule. Урок или доп.
+# занятие занимает все слоты обеих сеток, с которыми пересекается по времени,
+# поэтому "свободен ли кабинет на 3 уроке в среду" - проверка одного бита,
+# без NOT IN по двум таблицам расписания.
+# Индекс хранится в памяти процесса, как сетка расписания (main.timetable),
+# а его версия - в общем кэше (settings.CACHES). После фиксации транзакции
+# сигналы пересчитывают в этом процессе маски только затронутых учителей
+# и кабинетов и меняют версию; остальные процессы видят новую версию
+# и загружают индекс заново.
+
+VERSION_KEY = 'occupancy_index_version'
+
+KINDS = ('teacher', 'cabinet')
+DAYS = [day for day, _ in DAY_CHOICES]
+
+# Сетка звонков -> модель с LESSON_CHOICES и LESSON_TIMES
+GRIDS = {'schedule': Schedule, 'extra': ExtraSchedule}
+
+# Сетка -> номер занятия -> номер бита внутри дня
+POSITIONS = {}
+DAY_WIDTH = 0
+for _grid, _model in GRIDS.items():
+    POSITIONS[_grid] = {number: DAY_WIDTH + i for i, (number, _) in enumerate(_model.LESSON_CHOICES)}
+    DAY_WIDTH += len(_model.LESSON_CHOICES)
+
+
+def _occupied_positions():
+    """Сетка -> номер занятия -> биты дня, которые занятие занимает в обеих сетках"""
+    result = {}
+    for grid, model in GRIDS.items():
+        result[grid] = {}
+        for number, (start, end) in model.LESSON_TIMES.items():
+            mask = 0
+            for other, other_model in GRIDS.items():
+                for other_number, (other_start, other_end) in other_model.LESSON_TIMES.items():
+                    if other_start < end and start < other_end:
+                        mask |= 1 << POSITIONS[other][other_number]
+            result[grid][number] = mask
+    return result
+
+
+OCCUPIES = _occupied_positions()
+
+
+def slot_bit(grid, day, number):
+    """Номер бита слота или None, если такого дня или занятия нет"""
+    if day not in DAYS or number not in POSITIONS[grid]:
+        return None
+    return DAYS.index(day) * DAY_WIDTH + POSITIONS[grid][number]
+
+
+def _occupied(grid, day, number):
+    if day not in DAYS or number not in OCCUPIES[grid]:
+        return 0
+    return OCCUPIES[grid][number] << (DAYS.index(day) * DAY_WIDTH)
+
+
+def _masks(schedules, extras):
+    """Маски занятости по строкам (учитель, кабинет, день, номер) уроков и доп. занятий"""
+    masks = {}
+    for grid, rows in (('schedule', schedules), ('extra', extras)):
+        for teacher_id, cabinet_id, day, number in rows:
+            mask = _occupied(grid, day, number)
+            if teacher_id is not None:
+                masks['teacher', teacher_id] = masks.get(('teacher', teacher_id), 0) | mask
+            masks['cabinet', cabinet_id] = masks.get(('cabinet', cabinet_id), 0) | mask
+    return masks
+
+
+def _schedule_rows(condition=Q()):
+    return Schedule.objects.filter(condition).order_by().values_list(
+        'teacher_id', 'cabinet_id', 'day_of_week', 'lesson_number',
+    )
+
+
+def _extra_rows(condition=Q()):
+    # Неактивные занятия времени не занимают
+    return ExtraSchedule.objects.filter(condition, activity__is_active=True).order_by().values_list(
+        'activity__teacher_id', 'cabinet_id', 'day_of_week', 'lesson_number',
+    )
+
+
+class OccupancyIndex:
+    """Занятость и названия всех кабинетов и учителей, квалификация учителей по предметам"""
+
+    def __init__(self, cabinets, teachers, qualified, masks):
+        # Словари id -> название в порядке вывода
+        self.cabinets = cabinets
+        self.teachers = teachers
+        # Предмет -> учителя, которые могут его вести
+        self.qualified = qualified
+        self.masks = masks
+
+    @classmethod
+    def load(cls):
+        qualified = {}
+        for subject_id, teacher_id in TeacherSubject.objects.order_by().values_list('subject_id', 'teacher_id'):
+            qualified.setdefault(subject_id, set()).add(teacher_id)
+        return cls(
+            dict(Cabinet.objects.order_by('number', 'id').values_list('id', 'number')),
+            dict(Teacher.objects.order_by('full_name', 'id').values_list('id', 'full_name')),
+            qualified,
+            _masks(_schedule_rows(), _extra_rows()),
+        )
+
+    @staticmethod
+    def current_masks(resources):
+        """Маски ресурсов (вид, id) по текущему состоянию БД: два запроса на любой набор ресурсов"""
+        teachers = {pk for kind, pk in resources if kind == 'teacher'}
+        cabinets = {pk for kind, pk in resources if kind == 'cabinet'}
+        masks = _masks(
+            _schedule_rows(Q(teacher_id__in=teachers) | Q(cabinet_id__in=cabinets)),
+            _extra_rows(Q(activity__teacher_id__in=teachers) | Q(cabinet_id__in=cabinets)),
+        )
+        # В выборку попадают и чужие учителя и кабинеты тех же уроков, но их маски неполные
+        return {resource: masks.get(resource, 0) for resource in resources}
+
+    def update(self, masks):
+        for resource, mask in masks.items():
+            if mask:
+                self.masks[resource] = mask
+            else:
+                self.masks.pop(resource, None)
+
+    def is_free(self, kind, pk, bit):
+        return not self.masks.get((kind, pk), 0) >> bit & 1
+
+    def free_cabinets(self, grid, day, number):
+        """Свободные кабинеты: пары (id, номер)"""
+        bit = slot_bit(grid, day, number)
+        if bit is None:
+            return []
+        return [(pk, name) for pk, name in self.cabinets.items() if self.is_free('cabinet', pk, bit)]
+
+    def free_teachers(self, grid, day, number, subject_id=None):
+        """Свободные учителя (id, ФИО), если указан предмет - только те, кто может его вести"""
+        bit = slot_bit(grid, day, number)
+        if bit is None:
+            return []
+        qualified = self.qualified.get(subject_id, set()) if subject_id is not None else None
+        return [
+            (pk, name) for pk, name in self.teachers.items()
+            if (qualified is None or pk in qualified) and self.is_free('teacher', pk, bit)
+        ]
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_index():
+    """Актуальный индекс: загружается заново, только если его изменил другой процесс"""
+    global _index, _index_version
+    version = _version()
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = OccupancyIndex.load()
+            _index_version = version
+        return _index
+
+
+def touch(resources):
+    """Пересчитывает маски изменившихся учителей и кабинетов в индексе этого процесса"""
+    global _index_version
+    resources = {(kind, pk) for kind, pk in resources if kind in KINDS and pk is not None}
+    if not resources:
+        return
+    with _lock:
+        current = _index is not None and _index_version == _version()
+        if current:
+            _index.update(OccupancyIndex.current_masks(resources))
+        version = uuid.uuid4().hex
+        cache.set(VERSION_KEY, version, timeout=None)
+        if current:
+            _index_version = version
+
+
+def invalidate():
+    """Полная перезагрузка: изменились справочники (кабинеты, ФИО, квалификация, доп. занятия)"""
+    global _index
+    with _lock:
+        _index = None
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
@@ -0,0 +1,111 @@
+import base64
+import bisect
+import json
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+# Постраничный вывод отчетов по ключу (keyset/seek pagination).
+# Следующая страница выбирается условием "после последней показанной строки"
+# по колонкам сортировки, поэтому стоимость страницы не зависит от ее номера,
+# в отличие от OFFSET. Курсор - последние значения колонок и число показанных строк.
+
+PAGE_SIZE = getattr(settings, 'REPORT_PAGE_SIZE', 100)
+
+# Типы значений колонок сортировки в курсоре (кроме None)
+CURSOR_TYPES = (str, int, float, bool)
+
+
+def encode_cursor(values, position):
+    raw = json.dumps([list(values), position], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, width):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values, position = json.loads(raw)
+    except (ValueError, TypeError):
+        raise BadRequest('Некорректный курсор страницы')
+    if not isinstance(values, list) or len(values) != width or not isinstance(position, int):
+        raise BadRequest('Некорректный курсор страницы')
+    # Значения уходят в фильтры ORM: списки и словари дали бы ошибку 500 или условие __in
+    if not all(value is None or isinstance(value, CURSOR_TYPES) for value in values):
+        raise BadRequest('Некорректный курсор страницы')
+    return values, position
+
+
+def _after(ordering, values):
+    """Условие (a, b, c) > (x, y, z) для сортировки по возрастанию"""
+    condition = Q()
+    for i in reversed(range(len(ordering))):
+        step = Q(**{f'{ordering[i]}__gt': values[i]})
+        condition = step if i == len(ordering) - 1 else step | (Q(**{ordering[i]: values[i]}) & condition)
+    return condition
+
+
+class KeysetPage:
+    """Страница отчета: строки, номер первой строки и курсор следующей страницы"""
+
+    def __init__(self, rows, start, next_cursor):
+        self.rows = rows
+        self.start = start
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_page(queryset, ordering, after=None, size=None):
+    """Страница queryset после курсора after.
+
+    ordering - колонки сортировки по возрастанию, последней должна идти
+    уникальная колонка (обычно id), иначе строки с одинаковыми значениями потеряются.
+    Колонки не должны содержать NULL.
+    """
+    size = size or PAGE_SIZE
+    start = 0
+    queryset = queryset.order_by(*ordering)
+    if after:
+        values, start = decode_cursor(after, len(ordering))
+        queryset = queryset.filter(_after(ordering, values))
+
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = list(queryset[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor([_value(last, field) for field in ordering], start + size)
+    return KeysetPage(rows, start, next_cursor)
+
+
+def keyset_list(rows, ordering, after=None, size=None):
+    """Страница списка, уже отсортированного по ordering, с тем же курсором, что у keyset_page.
+
+    Для отчетов, строки которых считаются в памяти, а не выбираются запросом.
+    """
+    size = size or PAGE_SIZE
+    start = 0
+    first = 0
+    if after:
+        values, start = decode_cursor(after, len(ordering))
+        key = lambda row: [_value(row, field) for field in ordering]
+        try:
+            first = bisect.bisect_right(rows, values, key=key)
+        except TypeError:
+            raise BadRequest('Некорректный курсор страницы')
+
+    page = rows[first:first + size]
+    next_cursor = None
+    if first + size < len(rows):
+        next_cursor = encode_cursor([_value(page[-1], field) for field in ordering], start + size)
+    return KeysetPage(page, start, next_cursor)
+
+
+def _value(obj, field):
+    for part in field.split('__'):
+        obj = getattr(obj, part)
+    return obj
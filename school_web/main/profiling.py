@@ -0,0 +1,156 @@
+import contextlib
+import contextvars
+import json
+import logging
+import re
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils import timezone
+
+# Профилирование запросов: число SQL-запросов, их суммарное время, время рендеринга
+# шаблонов и повторяющиеся запросы (N+1). Итог отдается в заголовке Server-Timing,
+# медленные запросы дописываются в JSONL-журнал с ротацией.
+# При REQUEST_PROFILING = False middleware исключается из цепочки (MiddlewareNotUsed),
+# поэтому выключенное профилирование ничего не стоит.
+
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# Сколько самых долгих и повторяющихся запросов записывать в журнал
+LOG_TOP_QUERIES = 10
+SQL_MAX_LENGTH = 2000
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def fingerprint(sql):
+    """SQL без значений: одинаковые запросы с разными параметрами совпадают"""
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('(...)', sql)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        # Отпечаток -> [число, суммарное время, пример SQL]
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: оборачивает каждый запрос к БД
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            entry = self.statements.setdefault(fingerprint(sql), [0, 0.0, sql])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    @property
+    def duplicates(self):
+        return sorted(
+            ((count, total, sql) for count, total, sql in self.statements.values() if count > 1),
+            reverse=True,
+        )
+
+    def server_timing(self, total):
+        duplicated = sum(count - 1 for count, _, _ in self.statements.values())
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'dup;desc="{duplicated} duplicated"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+    def log_entry(self, request, response, total):
+        def trim(sql):
+            return sql if len(sql) <= SQL_MAX_LENGTH else sql[:SQL_MAX_LENGTH] + '...'
+
+        slowest = sorted(self.statements.values(), key=lambda entry: entry[1], reverse=True)
+        return {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 1),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'duplicates': [
+                {'count': count, 'ms': round(elapsed * 1000, 1), 'sql': trim(sql)}
+                for count, elapsed, sql in self.duplicates[:LOG_TOP_QUERIES]
+            ],
+            'slowest': [
+                {'count': count, 'ms': round(elapsed * 1000, 1), 'sql': trim(sql)}
+                for count, elapsed, sql in slowest[:LOG_TOP_QUERIES]
+            ],
+        }
+
+
+_template_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    profile = _current.get()
+    if profile is None:
+        return _template_render(self, context, request)
+    # Вложенный render_to_string внутри шаблона не считаем дважды
+    profile.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _template_render(self, context, request)
+    finally:
+        profile.template_depth -= 1
+        if not profile.template_depth:
+            profile.template_time += time.perf_counter() - started
+
+
+class RequestProfilingMiddleware:
+    """Server-Timing для каждого запроса и журнал медленных запросов"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SLOW_REQUEST_MS', 500) / 1000
+        self.log = None
+        path = getattr(settings, 'SLOW_REQUEST_LOG', None)
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.log = RotatingFileHandler(
+                path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True,
+            )
+        # Время шаблонов считается, только пока идет профилируемый запрос
+        Template.render = _timed_render
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - profile.started
+        response['Server-Timing'] = profile.server_timing(total)
+        if self.log is not None and total >= self.slow_seconds:
+            line = json.dumps(profile.log_entry(request, response, total), ensure_ascii=False)
+            self.log.handle(logging.makeLogRecord({'msg': line, 'levelno': logging.WARNING}))
+        return response
@@ -0,0 +1,157 @@
+import functools
+import hashlib
+import uuid
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .models import Cabinet, ExtraActivity, ExtraSchedule, Schedule, SchoolGroup, Subject, Teacher
+
+# Кэш готовых страниц отчетов TeacherAdmin.
+# Ключ - имя отчета, поколение отчета и нормализованные фильтры из GET.
+# Поколение меняется сигналами моделей, которые читает отчет, после фиксации
+# транзакции, поэтому сброс точечный. Кэш 'reports' общий для процессов
+# сервера и команд manage.py (settings.CACHES): сброс из импорта, генератора
+# расписания или команды report_cache виден серверу.
+
+CACHE_ALIAS = 'reports'
+
+FILTER_PARAMS = (
+    'day', 'class', 'subject', 'activity_type', 'is_active', 'has_classes', 'has_retrain', 'load',
+    # Курсор страницы для подгрузки строк
+    'after',
+)
+
+# Таблицы, которые читает каждый отчет
+REPORT_DEPENDENCIES = {
+    'teachers_report': [Teacher, Subject, Teacher.subjects.through],
+    'subjects_teachers_report': [Subject, Teacher, Teacher.subjects.through],
+    'prof_retrain_report': [Teacher],
+    'teachers_classes_report': [Teacher, SchoolGroup, Cabinet],
+    'extra_activities_report': [ExtraActivity, ExtraSchedule, Teacher, Cabinet],
+    'schedule_report': [Schedule, SchoolGroup, Subject, Teacher, Cabinet],
+    'extra_schedule_report': [ExtraSchedule, ExtraActivity, Teacher, Cabinet],
+    'workload_report': [Teacher, Subject, Schedule, ExtraSchedule, ExtraActivity],
+}
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation(name):
+    cache = _cache()
+    generation = cache.get(f'report:generation:{name}')
+    if generation is None:
+        cache.add(f'report:generation:{name}', uuid.uuid4().hex, timeout=None)
+        generation = cache.get(f'report:generation:{name}')
+    return generation
+
+
+def _count(name, counter):
+    cache = _cache()
+    key = f'report:{counter}:{name}'
+    # add + incr вместо get/set, чтобы не терять счет при параллельных запросах
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def cache_key(name, request):
+    """Ключ кэша отчета или None, если запрос кэшировать нельзя"""
+    if request.method != 'GET' or set(request.GET) - set(FILTER_PARAMS):
+        return None
+    filters = sorted(
+        (param, request.GET[param]) for param in FILTER_PARAMS
+        if request.GET.get(param) not in (None, '', 'all')
+    )
+    digest = hashlib.md5(repr(filters).encode()).hexdigest()
+    return f'report:page:{name}:{_generation(name)}:{digest}'
+
+
+def _lookup(name, request):
+    """Ключ кэша и сохраненная страница (или None)"""
+    key = cache_key(name, request)
+    # Страницы с сообщениями (например, об ошибке выгрузки) не кэшируем
+    if key is None or len(get_messages(request)):
+        return None, None
+
+    cached = _cache().get(key)
+    if cached is None:
+        _count(name, 'misses')
+        return key, None
+    _count(name, 'hits')
+    content, content_type = cached
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Report-Cache'] = 'HIT'
+    return key, response
+
+
+def _store(key, response):
+    if response.status_code == 200 and not response.streaming:
+        _cache().set(key, (response.content, response['Content-Type']))
+    response['X-Report-Cache'] = 'MISS'
+
+
+def cached_report(name):
+    """Декоратор представления отчета: отдает сохраненную страницу до изменения данных"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            # Сессия (для сообщений) и бэкенд кэша синхронные
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key, response = await sync_to_async(_lookup)(name, request)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                if key is not None:
+                    await sync_to_async(_store)(key, response)
+                return response
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, response = _lookup(name, request)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if key is not None:
+                _store(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*names):
+    """Сбрасывает кэш указанных отчетов (по умолчанию всех)"""
+    cache = _cache()
+    for name in names or REPORT_DEPENDENCIES:
+        cache.set(f'report:generation:{name}', uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_for_model(model):
+    names = [name for name, models in REPORT_DEPENDENCIES.items() if model in models]
+    if names:
+        invalidate(*names)
+
+
+def stats():
+    """Счетчики попаданий и промахов по каждому отчету"""
+    cache = _cache()
+    return {
+        name: {
+            'hits': cache.get(f'report:hits:{name}', 0),
+            'misses': cache.get(f'report:misses:{name}', 0),
+        }
+        for name in REPORT_DEPENDENCIES
+    }
+
+
+def reset_stats():
+    _cache().delete_many(
+        [f'report:{counter}:{name}' for name in REPORT_DEPENDENCIES for counter in ('hits', 'misses')]
+    )
@@ -0,0 +1,79 @@
+from django.db.models import CharField, Count, F, Value
+
+# Статистика отчетов за один SQL-запрос.
+# Каждый счетчик и каждая группировка - отдельный SELECT с GROUP BY,
+# все они объединяются через UNION ALL (аналог GROUPING SETS, которых нет в SQLite).
+
+
+class ReportStats:
+    """Набор счетчиков и группировок по одному queryset.
+
+    stats = ReportStats(activities)
+    stats.count('total_activities')
+    stats.count('active_activities', Q(is_active=True))
+    stats.breakdown('type_stats', 'activity_type')
+    result = stats.compute()
+
+    Условия счетчиков не должны добавлять JOIN по связям "один ко многим",
+    иначе строки размножатся: для таких условий используйте Exists().
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset.order_by().prefetch_related(None)
+        self.counters = []
+        self.breakdowns = []
+
+    def count(self, name, condition=None):
+        self.counters.append((name, condition))
+        return self
+
+    def breakdown(self, name, *fields, order='-count'):
+        """Группировка по полям; order - '-count' или одно из полей"""
+        self.breakdowns.append((name, fields, order))
+        return self
+
+    def _width(self):
+        return max([len(fields) for _, fields, _ in self.breakdowns] or [0])
+
+    def _part(self, name, fields, condition=None):
+        keys = {
+            f'_k{i}': F(fields[i]) if i < len(fields) else Value(None, output_field=CharField())
+            for i in range(self._width())
+        }
+        return self.queryset.values(_set=Value(name), **keys).annotate(_count=Count('pk', filter=condition))
+
+    def query(self):
+        parts = [self._part(name, (), condition) for name, condition in self.counters]
+        parts += [self._part(name, fields) for name, fields, _ in self.breakdowns]
+        if not parts:
+            return None
+        return parts[0].union(*parts[1:], all=True)
+
+    def compute(self):
+        result = {name: 0 for name, _ in self.counters}
+        result.update({name: [] for name, _, _ in self.breakdowns})
+        query = self.query()
+        if query is None:
+            return result
+
+        breakdown_fields = {name: fields for name, fields, _ in self.breakdowns}
+        for row in query:
+            name = row['_set']
+            if name in breakdown_fields:
+                item = {field: row[f'_k{i}'] for i, field in enumerate(breakdown_fields[name])}
+                item['count'] = row['_count']
+                result[name].append(item)
+            else:
+                result[name] = row['_count']
+
+        for name, fields, order in self.breakdowns:
+            if order == '-count':
+                result[name].sort(key=lambda item: (-item['count'], _sort_key(item[fields[0]])))
+            else:
+                result[name].sort(key=lambda item: _sort_key(item[order]))
+        return result
+
+
+def _sort_key(value):
+    # None в конце списка, остальные значения по возрастанию
+    return (value is None, value if value is not None else 0)
@@ -0,0 +1,71 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+# Поиск в админке по полнотекстовым индексам SQLite FTS5 (миграция 0015).
+# Вместо LIKE '%слово%' по нескольким колонкам, который читает всю таблицу,
+# каждое слово запроса ищется в индексе как префикс: "иван 8999" найдет
+# "Иванов Иван" с телефоном 89991234567. Слова запроса объединяются через И.
+
+_WORDS = re.compile(r'\w+')
+
+_available = {}
+
+
+def normalize(text):
+    # Так же, как триггеры индекса: "ё" и "е" не различаем
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def match_query(search_term):
+    """Выражение MATCH для FTS5 или None, если в запросе нет слов"""
+    words = _WORDS.findall(normalize(search_term))
+    if not words:
+        return None
+    # Кавычки защищают от синтаксиса FTS5 (AND, NEAR, "-" и т.п.) в словах запроса
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def is_available(index):
+    """Есть ли индекс в текущей БД (на других СУБД миграция его не создает)"""
+    if connection.vendor != 'sqlite':
+        return False
+    key = (connection.settings_dict['NAME'], index)
+    if key not in _available:
+        _available[key] = index in connection.introspection.table_names()
+    return _available[key]
+
+
+def matching(index, search_term):
+    """Подзапрос с первичными ключами найденных записей, для pk__in=..."""
+    query = match_query(search_term)
+    if query is None:
+        return None
+    return RawSQL(f'SELECT rowid FROM "{index}" WHERE "{index}" MATCH %s', [query])
+
+
+class FullTextSearchMixin:
+    """Поиск в списке админки по индексу search_index вместо LIKE по search_fields.
+
+    search_fields остаются: по ним Django показывает строку поиска, и они
+    используются, если индекса нет. search_related - внешние ключи на модели
+    с собственным индексом: запись находится и по словам из связанной записи.
+    """
+
+    search_index = None
+    # Пары (поле внешнего ключа, индекс связанной модели)
+    search_related = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not is_available(self.search_index):
+            return super().get_search_results(request, queryset, search_term)
+        condition = matching(self.search_index, search_term)
+        if condition is None:
+            return queryset, False
+
+        queryset_filter = queryset.filter(pk__in=condition)
+        for field, index in self.search_related:
+            if is_available(index):
+                queryset_filter = queryset_filter | queryset.filter(**{f'{field}__in': matching(index, search_term)})
+        return queryset_filter, False
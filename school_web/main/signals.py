@@ -0,0 +1,202 @@
+import contextlib
+import functools
+import threading
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import enrollment, occupancy, report_cache, snapshots, stamps, timetable
+from .models import (
+    Cabinet, Enrollment, ExtraActivity, ExtraSchedule, Schedule, SchoolGroup, Subject, Teacher, TeacherSubject,
+)
+
+SNAPSHOT_SOURCES = (Teacher, SchoolGroup, Cabinet, Subject, ExtraActivity, ExtraSchedule, Schedule)
+
+
+def _reset_caches():
+    timetable.invalidate()
+    report_cache.invalidate()
+    stamps.touch_all()
+    occupancy.invalidate()
+
+
+_bulk = threading.local()
+
+
+def per_row(handler):
+    """Обработчик сигнала для изменений по одной записи; внутри bulk_change пропускается"""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        if not getattr(_bulk, 'active', False):
+            return handler(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.contextmanager
+def bulk_change(*snapshot_names):
+    """Массовое изменение через delete() и save(): вместо обработки каждой записи
+    в конце один раз выполняется refresh_after_bulk_change"""
+    active = getattr(_bulk, 'active', False)
+    _bulk.active = True
+    try:
+        yield
+    finally:
+        _bulk.active = active
+    refresh_after_bulk_change(*snapshot_names)
+
+
+def refresh_after_bulk_change(*snapshot_names):
+    """Работа сигналов для изменений без них (bulk_create, bulk_update, update):
+    пересборка снимков snapshot_names и, после фиксации, сброс сетки расписания,
+    кэша отчетов, версий расписаний и индекса занятости"""
+    if snapshot_names:
+        snapshots.rebuild(*snapshot_names)
+    transaction.on_commit(_reset_caches)
+
+
+# Снимки отчетов пересчитываются первыми, до сброса сетки и кэша отчетов,
+# чтобы следующий запрос уже прочитал новые строки. Пересчитываются строки,
+# которые зависели от записи до изменения (учителя прежнего класса и т.п.)
+# и после него.
+@per_row
+def remember_snapshot_rows(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._stored_snapshot_rows = snapshots.affected(sender, instance.pk)
+
+
+@per_row
+def refresh_snapshot_rows(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rows = getattr(instance, '_stored_snapshot_rows', snapshots.Affected())
+    if kwargs['signal'] is post_save:
+        rows = rows | snapshots.affected(sender, instance.pk)
+    rows.refresh()
+
+
+for model in SNAPSHOT_SOURCES:
+    for signal, handler in ((pre_save, remember_snapshot_rows), (pre_delete, remember_snapshot_rows),
+                            (post_save, refresh_snapshot_rows), (post_delete, refresh_snapshot_rows)):
+        signal.connect(handler, sender=model, dispatch_uid=f'snapshot_{handler.__name__}_{model._meta.label}')
+
+
+# Сетка расписания хранит имена предметов, учителей, классов и кабинетов,
+# поэтому сбрасываем ее при изменении любой из этих таблиц. Сброс - после
+# фиксации транзакции: иначе другой процесс мог бы увидеть новую версию
+# раньше данных и остаться с сеткой без изменений
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=SchoolGroup)
+@receiver(post_delete, sender=SchoolGroup)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Cabinet)
+@receiver(post_delete, sender=Cabinet)
+@per_row
+def invalidate_timetable_grid(sender, **kwargs):
+    transaction.on_commit(timetable.invalidate)
+
+
+# Версии расписаний для JSON API: урок меняет версии своего класса, учителя
+# и кабинета, причем и прежних, если урок перенесли. Новые версии - после
+# фиксации транзакции, чтобы под ними не сохранились тела ответов без изменений
+@receiver(pre_save, sender=Schedule)
+@receiver(pre_save, sender=ExtraSchedule)
+@per_row
+def remember_timetable_resources(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._stored_timetable_resources = stamps.stored_resources_of(sender, instance.pk)
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=ExtraSchedule)
+@receiver(post_delete, sender=ExtraSchedule)
+@per_row
+def touch_timetable_resources(sender, instance, **kwargs):
+    resources = stamps.resources_of(instance) | getattr(instance, '_stored_timetable_resources', set())
+    transaction.on_commit(functools.partial(stamps.touch, resources))
+
+
+# Индекс свободных кабинетов и учителей: пересчитываются маски тех же
+# учителей и кабинетов, чьи версии расписания сменились. После фиксации:
+# маски читаются из БД, и другие процессы загружают индекс по новой версии
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=ExtraSchedule)
+@receiver(post_delete, sender=ExtraSchedule)
+@per_row
+def update_occupancy(sender, instance, **kwargs):
+    resources = stamps.resources_of(instance) | getattr(instance, '_stored_timetable_resources', set())
+    transaction.on_commit(functools.partial(occupancy.touch, resources))
+
+
+# Номера кабинетов, ФИО, квалификация и активность доп. занятий есть в индексе целиком
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Cabinet)
+@receiver(post_delete, sender=Cabinet)
+@receiver(post_save, sender=TeacherSubject)
+@receiver(post_delete, sender=TeacherSubject)
+@receiver(post_save, sender=ExtraActivity)
+@receiver(post_delete, sender=ExtraActivity)
+@per_row
+def invalidate_occupancy(sender, **kwargs):
+    transaction.on_commit(occupancy.invalidate)
+
+
+# Места занятия: после увеличения max_students или включения занятия
+# свободные места получает лист ожидания
+@receiver(post_save, sender=ExtraActivity)
+def promote_waitlist(sender, instance, created, **kwargs):
+    if not created:
+        enrollment.promote(instance.pk)
+
+
+# Удаленная запись (в том числе каскадом вместе с учеником) освобождает место
+@receiver(post_delete, sender=Enrollment)
+def release_enrollment_seat(sender, instance, **kwargs):
+    if instance.status == Enrollment.ENROLLED:
+        enrollment.release_seat(instance.activity_id)
+        enrollment.promote(instance.activity_id)
+
+
+# Названия классов, предметов, ФИО и занятия есть в расписаниях многих ресурсов
+@receiver(post_save, sender=SchoolGroup)
+@receiver(post_delete, sender=SchoolGroup)
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Cabinet)
+@receiver(post_delete, sender=Cabinet)
+@receiver(post_save, sender=ExtraActivity)
+@receiver(post_delete, sender=ExtraActivity)
+@per_row
+def touch_all_timetables(sender, **kwargs):
+    transaction.on_commit(stamps.touch_all)
+
+
+# Кэш отчетов сбрасываем только для отчетов, которые читают измененную таблицу,
+# и, как сетку, после фиксации: иначе запрос из другого процесса сохранил бы
+# страницу без изменений под новым поколением
+@per_row
+def invalidate_report_cache(sender, **kwargs):
+    transaction.on_commit(functools.partial(report_cache.invalidate_for_model, sender))
+
+
+@per_row
+def invalidate_report_cache_m2m(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(functools.partial(report_cache.invalidate_for_model, sender))
+
+
+for model in {model for models in report_cache.REPORT_DEPENDENCIES.values() for model in models}:
+    if model._meta.auto_created:
+        m2m_changed.connect(invalidate_report_cache_m2m, sender=model, dispatch_uid=f'report_cache_m2m_{model._meta.label}')
+    else:
+        post_save.connect(invalidate_report_cache, sender=model, dispatch_uid=f'report_cache_save_{model._meta.label}')
+        post_delete.connect(invalidate_report_cache, sender=model, dispatch_uid=f'report_cache_delete_{model._meta.label}')
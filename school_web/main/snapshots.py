@@ -0,0 +1,187 @@
+from django.apps import apps as global_apps
+from django.db import transaction
+
+from .models import Cabinet, ExtraActivity, ExtraSchedule, Schedule, SchoolGroup, Subject, Teacher
+
+# Снимки отчетов: готовые строки отчетов по учителям и классам, по
+# дополнительным занятиям и уроки расписания с названиями вместо ключей.
+# Отчеты читают одну плоскую таблицу без JOIN, prefetch и группировки.
+# Сигналы (main.signals) пересчитывают только строки затронутых учителей,
+# занятий и уроков; bulk-операции и команда refresh_report_snapshots
+# пересобирают снимки целиком.
+# apps - реестр моделей: миграция передает исторический, чтобы заполнить
+# таблицы теми же функциями.
+
+BATCH_SIZE = 500
+
+# Снимок -> функция пересчета, заполняются ниже
+REFRESH = {}
+
+
+def _model(apps, name):
+    return apps.get_model('main', name)
+
+
+def _replace(snapshot, ids, rows):
+    """Заменяет строки снимка с ключами ids (все строки, если ids is None)"""
+    with transaction.atomic():
+        stale = snapshot.objects.all()
+        if ids is not None:
+            stale = stale.filter(pk__in=ids)
+        stale.delete()
+        snapshot.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def _filtered(queryset, field, ids):
+    return queryset if ids is None else queryset.filter(**{f'{field}__in': ids})
+
+
+def refresh_teachers(ids=None, apps=global_apps):
+    """Строки отчета по учителям и классам для учителей ids"""
+    if ids is not None and not ids:
+        return
+    Teacher = _model(apps, 'Teacher')
+    classes = {}
+    for teacher_id, number, cabinet_number in _filtered(
+        _model(apps, 'SchoolGroup').objects.order_by('id'), 'teacher_id', ids,
+    ).values_list('teacher_id', 'number', 'cabinet__number'):
+        classes.setdefault(teacher_id, []).append([number, cabinet_number])
+    cabinets = {}
+    for teacher_id, number in _filtered(
+        _model(apps, 'Cabinet').objects.order_by('id'), 'teacher_id', ids,
+    ).values_list('teacher_id', 'number'):
+        cabinets.setdefault(teacher_id, []).append(number)
+
+    snapshot = _model(apps, 'TeacherClassesSnapshot')
+    rows = []
+    for teacher_id, full_name, post, category in _filtered(Teacher.objects.order_by(), 'id', ids).values_list(
+        'id', 'full_name', 'post', 'category',
+    ):
+        teacher_classes = classes.get(teacher_id, [])
+        teacher_cabinets = cabinets.get(teacher_id, [])
+        rows.append(snapshot(
+            teacher_id=teacher_id, full_name=full_name, post=post, category=category,
+            classes=teacher_classes, classes_count=len(teacher_classes),
+            cabinet_numbers=', '.join(teacher_cabinets), cabinets_count=len(teacher_cabinets),
+        ))
+    _replace(snapshot, ids, rows)
+
+
+def refresh_activities(ids=None, apps=global_apps):
+    """Строки отчета по дополнительным занятиям для занятий ids"""
+    if ids is not None and not ids:
+        return
+    schedules = {}
+    for activity_id, day, lesson_number, cabinet_number in _filtered(
+        _model(apps, 'ExtraSchedule').objects.order_by('day_of_week', 'lesson_number', 'id'), 'activity_id', ids,
+    ).values_list('activity_id', 'day_of_week', 'lesson_number', 'cabinet__number'):
+        schedules.setdefault(activity_id, []).append([day, lesson_number, cabinet_number])
+
+    snapshot = _model(apps, 'ActivitySnapshot')
+    rows = []
+    for values in _filtered(_model(apps, 'ExtraActivity').objects.order_by(), 'id', ids).values(
+        'id', 'name', 'description', 'activity_type', 'teacher_id', 'teacher__full_name', 'teacher__post',
+        'max_students', 'is_active',
+    ):
+        activity_schedules = schedules.get(values['id'], [])
+        rows.append(snapshot(
+            activity_id=values['id'], name=values['name'], description=values['description'],
+            activity_type=values['activity_type'], teacher_id=values['teacher_id'],
+            teacher_name=values['teacher__full_name'], teacher_post=values['teacher__post'],
+            max_students=values['max_students'], is_active=values['is_active'],
+            schedules=activity_schedules, schedule_count=len(activity_schedules),
+        ))
+    _replace(snapshot, ids, rows)
+
+
+def refresh_lessons(ids=None, apps=global_apps):
+    """Уроки расписания ids с названиями класса, предмета, учителя и кабинета"""
+    if ids is not None and not ids:
+        return
+    snapshot = _model(apps, 'LessonSnapshot')
+    rows = [
+        snapshot(
+            lesson_id=lesson_id, day_of_week=day, lesson_number=lesson_number,
+            school_class_id=class_id, class_number=class_number,
+            subject_id=subject_id, subject_name=subject_name,
+            teacher_id=teacher_id, teacher_name=teacher_name,
+            cabinet_id=cabinet_id, cabinet_number=cabinet_number, info=info,
+        )
+        for (lesson_id, day, lesson_number, class_id, class_number, subject_id, subject_name,
+             teacher_id, teacher_name, cabinet_id, cabinet_number, info)
+        in _filtered(_model(apps, 'Schedule').objects.order_by(), 'id', ids).values_list(
+            'id', 'day_of_week', 'lesson_number', 'school_class_id', 'school_class__number',
+            'subject_id', 'subject__full_name', 'teacher_id', 'teacher__full_name',
+            'cabinet_id', 'cabinet__number', 'info',
+        )
+    ]
+    _replace(snapshot, ids, rows)
+
+
+REFRESH.update(teachers=refresh_teachers, activities=refresh_activities, lessons=refresh_lessons)
+
+
+def rebuild(*names, apps=global_apps):
+    """Полная пересборка снимков names (всех, если не указаны)"""
+    for name in names or REFRESH:
+        REFRESH[name](apps=apps)
+
+
+class Affected:
+    """Ключи строк снимков, которые зависят от записи"""
+
+    def __init__(self, teachers=(), activities=(), lessons=()):
+        self.teachers = set(teachers)
+        self.activities = set(activities)
+        self.lessons = set(lessons)
+
+    def __or__(self, other):
+        return Affected(self.teachers | other.teachers, self.activities | other.activities,
+                        self.lessons | other.lessons)
+
+    def __bool__(self):
+        return bool(self.teachers or self.activities or self.lessons)
+
+    def refresh(self):
+        refresh_teachers(self.teachers)
+        refresh_activities(self.activities)
+        refresh_lessons(self.lessons)
+
+
+def _ids(queryset, field='id'):
+    return queryset.values_list(field, flat=True)
+
+
+def affected(model, pk):
+    """Строки снимков, которые зависят от записи model с ключом pk в текущем состоянии БД"""
+    if pk is None:
+        return Affected()
+    if model is Teacher:
+        return Affected(
+            [pk],
+            _ids(ExtraActivity.objects.filter(teacher_id=pk)),
+            _ids(Schedule.objects.filter(teacher_id=pk)),
+        )
+    if model is SchoolGroup:
+        return Affected(
+            _ids(SchoolGroup.objects.filter(pk=pk), 'teacher_id'),
+            lessons=_ids(Schedule.objects.filter(school_class_id=pk)),
+        )
+    if model is Cabinet:
+        # Номер кабинета есть у владельца, у руководителей классов в этом
+        # кабинете, в расписании занятий и в уроках
+        return Affected(
+            set(_ids(Cabinet.objects.filter(pk=pk), 'teacher_id'))
+            | set(_ids(SchoolGroup.objects.filter(cabinet_id=pk), 'teacher_id')),
+            _ids(ExtraSchedule.objects.filter(cabinet_id=pk), 'activity_id'),
+            _ids(Schedule.objects.filter(cabinet_id=pk)),
+        )
+    if model is Subject:
+        return Affected(lessons=_ids(Schedule.objects.filter(subject_id=pk)))
+    if model is ExtraActivity:
+        return Affected(activities=[pk])
+    if model is ExtraSchedule:
+        return Affected(activities=_ids(ExtraSchedule.objects.filter(pk=pk), 'activity_id'))
+    if model is Schedule:
+        return Affected(lessons=[pk])
+    return Affected()
@@ -0,0 +1,83 @@
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from .models import Cabinet, ExtraActivity, ExtraSchedule, Schedule, SchoolGroup, Teacher
+
+# Версии расписаний отдельных классов, учителей и кабинетов.
+# Версия ресурса меняется, когда меняются его уроки или доп. занятия,
+# общая версия - когда меняются справочники (названия предметов, ФИО и т.п.).
+# Версии хранятся в общем кэше Django (settings.CACHES), поэтому условные
+# запросы проверяются без БД, а изменения из любого процесса и команд
+# manage.py видны всем процессам сервера. Версия заводится только для
+# существующего ресурса: перебор несуществующих id не засоряет кэш.
+
+MODELS = {'class': SchoolGroup, 'teacher': Teacher, 'cabinet': Cabinet}
+KINDS = tuple(MODELS)
+
+GLOBAL_KEY = 'timetable:stamp'
+
+Stamp = namedtuple('Stamp', ['etag', 'last_modified'])
+
+
+def _key(kind, pk):
+    return f'{GLOBAL_KEY}:{kind}:{pk}'
+
+
+def _new():
+    return uuid.uuid4().hex[:12], time.time()
+
+
+def _read(keys, values=None):
+    if values is None:
+        values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Первое обращение или версия вытеснена из кэша: начинаем новую
+            cache.add(key, _new(), timeout=None)
+            values[key] = cache.get(key) or _new()
+    return [values[key] for key in keys]
+
+
+def get(kind, pk):
+    """Версия расписания ресурса: ETag и время последнего изменения; None, если ресурса нет"""
+    keys = [GLOBAL_KEY, _key(kind, pk)]
+    values = cache.get_many(keys)
+    if keys[1] not in values and not MODELS[kind].objects.filter(pk=pk).exists():
+        return None
+    (global_token, global_time), (token, changed) = _read(keys, values)
+    return Stamp(f'{global_token}-{token}', max(global_time, changed))
+
+
+def get_global():
+    token, changed = _read([GLOBAL_KEY])[0]
+    return Stamp(token, changed)
+
+
+def touch(resources):
+    """Новые версии для пар (вид, id)"""
+    cache.set_many({_key(kind, pk): _new() for kind, pk in resources if pk is not None}, timeout=None)
+
+
+def touch_all():
+    cache.set(GLOBAL_KEY, _new(), timeout=None)
+
+
+def resources_of(instance):
+    """Классы, учителя и кабинеты, в расписании которых есть урок или доп. занятие"""
+    if isinstance(instance, Schedule):
+        return {('class', instance.school_class_id), ('teacher', instance.teacher_id),
+                ('cabinet', instance.cabinet_id)}
+    teacher_id = ExtraActivity.objects.filter(pk=instance.activity_id).values_list('teacher_id', flat=True).first()
+    return {('teacher', teacher_id), ('cabinet', instance.cabinet_id)}
+
+
+def stored_resources_of(model, pk):
+    """То же для сохраненной в БД версии записи (до изменения)"""
+    if model is Schedule:
+        row = Schedule.objects.filter(pk=pk).values_list('school_class_id', 'teacher_id', 'cabinet_id').first()
+        return {('class', row[0]), ('teacher', row[1]), ('cabinet', row[2])} if row else set()
+    row = ExtraSchedule.objects.filter(pk=pk).values_list('activity__teacher_id', 'cabinet_id').first()
+    return {('teacher', row[0]), ('cabinet', row[1])} if row else set()
@@ -0,0 +1,82 @@
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+# Раздача статики самим Django вместо django.conf.urls.static.static(),
+# который работает только при DEBUG. Файлы берутся из STATIC_ROOT после
+# collectstatic, а если его нет (разработка) - через finders из static/ приложений.
+
+# Имена с хэшем содержимого не меняются, поэтому кэшируются браузером на год
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Остальные файлы браузер перепроверяет по Last-Modified
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+# Расширения сжатых копий в порядке предпочтения
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _find(path):
+    if settings.STATIC_ROOT:
+        try:
+            fullpath = safe_join(settings.STATIC_ROOT, path)
+        except ValueError:
+            raise Http404('Файл не найден')
+        if os.path.isfile(fullpath):
+            return fullpath
+    return finders.find(path)
+
+
+def _accepted_encodings(request):
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.partition(';')
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _is_hashed(path):
+    return isinstance(staticfiles_storage, ManifestFilesMixin) and path in staticfiles_storage.hashed_files.values()
+
+
+@require_safe
+def serve(request, path):
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = _find(path) if path and not path.startswith('..') else None
+    if not fullpath:
+        raise Http404('Файл не найден')
+
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type, _ = mimetypes.guess_type(fullpath)
+        encoding = None
+        accepted = _accepted_encodings(request)
+        for coding, extension in ENCODINGS:
+            if coding in accepted and os.path.isfile(fullpath + extension):
+                encoding, fullpath = coding, fullpath + extension
+                break
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if _is_hashed(path) else REVALIDATE_CACHE_CONTROL
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,59 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Хранилище статики для продакшена: имена файлов с хэшем содержимого (manifest)
+# и заранее сжатые копии .gz и .br, которые отдает main.static_views.serve.
+# Пакет brotli необязателен: без него создаются только .gz.
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.json', '.html', '.map')
+
+# Файлы меньше этого размера не сжимаем: выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 256
+
+
+def compressed_variants(content):
+    """Пары (расширение, сжатые данные) для содержимого файла"""
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content, quality=11)))
+    return variants
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который при collectstatic сохраняет сжатые копии файлов"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        # Сжимаем исходные и хэшированные имена: шаблоны в DEBUG ссылаются на исходные
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self._compress(name)
+
+    def _compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        for extension, compressed in compressed_variants(content):
+            # Сжатая копия, которая не меньше оригинала, бесполезна
+            if len(compressed) >= len(content):
+                if os.path.exists(path + extension):
+                    os.remove(path + extension)
+                continue
+            with open(path + extension, 'wb') as target:
+                target.write(compressed)
+            # Время изменения как у оригинала, чтобы совпадал Last-Modified
+            stat = os.stat(path)
+            os.utime(path + extension, (stat.st_atime, stat.st_mtime))
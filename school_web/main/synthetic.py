@@ -0,0 +1,172 @@
+import random
+
+from . import snapshots
+from .models import (
+    Cabinet, Enrollment, ExtraActivity, ExtraSchedule, Schedule, SchoolGroup, Student,
+    StudyPlan, Subject, Teacher, TeacherSubject,
+)
+from .signals import refresh_after_bulk_change
+
+# Генератор синтетической школы для нагрузочных тестов и бенчмарков.
+# Все записи создаются через bulk_create, поэтому сигналы моделей не срабатывают.
+
+POSTS = ['Учитель', 'Старший учитель', 'Методист', 'Завуч', 'Педагог доп. образования']
+CATEGORIES = ['Высшая', 'Первая', 'Соответствие', None]
+SUBJECT_NAMES = [
+    'Математика', 'Алгебра', 'Геометрия', 'Русский язык', 'Литература',
+    'Английский язык', 'Немецкий язык', 'История', 'Обществознание', 'География',
+    'Биология', 'Химия', 'Физика', 'Информатика', 'Физкультура',
+    'Музыка', 'ИЗО', 'Технология', 'ОБЖ', 'Астрономия',
+]
+LETTERS = 'АБВГДЕЖИКЛ'
+# Уроков в неделю по предметам учебного плана класса
+PLAN_LESSONS = [5, 4, 4, 3, 3, 3, 2, 2, 2, 2]
+
+
+def populate_school(teachers=2000, classes=300, students=40000, schedules=20000,
+                    subjects=30, cabinets=None, activities=200, extra_schedules=600,
+                    enrollments=2000, seed=32, batch_size=2000):
+    """Заполняет БД синтетической школой заданного размера и возвращает количество записей"""
+    rnd = random.Random(seed)
+    cabinets = cabinets or max(classes, 1) + max(classes // 3, 1)
+
+    subject_objs = Subject.objects.bulk_create([
+        Subject(
+            full_name=f"{SUBJECT_NAMES[i % len(SUBJECT_NAMES)]} {i // len(SUBJECT_NAMES) + 1}",
+            short_name=f"П{i + 1}",
+        )
+        for i in range(subjects)
+    ], batch_size=batch_size)
+
+    teacher_objs = Teacher.objects.bulk_create([
+        Teacher(
+            full_name=f"Учитель {i + 1:05d}",
+            post=rnd.choice(POSTS),
+            category=rnd.choice(CATEGORIES),
+            education='Высшее педагогическое',
+            experience=f"{rnd.randint(1, 40)} лет",
+            prof_retrain=rnd.choice(['', None, 'Педагогика и методика']),
+        )
+        for i in range(teachers)
+    ], batch_size=batch_size)
+
+    # Связи учитель-предмет: и M2M Teacher.subjects, и отдельная таблица TeacherSubject
+    through = Teacher.subjects.through
+    links = set()
+    for teacher in teacher_objs:
+        for subject in rnd.sample(subject_objs, k=min(len(subject_objs), rnd.randint(1, 3))):
+            links.add((teacher.id, subject.id))
+    through.objects.bulk_create(
+        [through(teacher_id=t, subject_id=s) for t, s in links], batch_size=batch_size
+    )
+    TeacherSubject.objects.bulk_create(
+        [TeacherSubject(teacher_id=t, subject_id=s) for t, s in links], batch_size=batch_size
+    )
+
+    cabinet_objs = Cabinet.objects.bulk_create([
+        Cabinet(number=str(100 + i), teacher=teacher_objs[i % len(teacher_objs)])
+        for i in range(cabinets)
+    ], batch_size=batch_size)
+
+    class_objs = SchoolGroup.objects.bulk_create([
+        SchoolGroup(
+            number=f"{i % 11 + 1}{LETTERS[(i // 11) % len(LETTERS)]}{i // (11 * len(LETTERS)) or ''}",
+            teacher=teacher_objs[(i * 7) % len(teacher_objs)],
+            cabinet=cabinet_objs[i % len(cabinet_objs)],
+        )
+        for i in range(classes)
+    ], batch_size=batch_size)
+
+    student_objs = Student.objects.bulk_create([
+        Student(
+            full_name=f"Ученик {i + 1:06d}",
+            parent_name=f"Родитель {i + 1:06d}",
+            phone=f"89{i:09d}",
+            school_class=class_objs[i % len(class_objs)],
+        )
+        for i in range(students)
+    ], batch_size=batch_size)
+
+    StudyPlan.objects.bulk_create([
+        StudyPlan(school_class=school_class, subject=subject, lessons_per_week=count)
+        for school_class in class_objs
+        for subject, count in zip(rnd.sample(subject_objs, k=min(len(subject_objs), len(PLAN_LESSONS))), PLAN_LESSONS)
+    ], batch_size=batch_size)
+
+    teachers_by_subject = {}
+    for teacher_id, subject_id in sorted(links):
+        teachers_by_subject.setdefault(subject_id, []).append(teacher_id)
+
+    days = len(Schedule._meta.get_field('day_of_week').choices)
+    lessons = len(Schedule.LESSON_CHOICES)
+    schedule_objs = []
+    for i in range(schedules):
+        subject = rnd.choice(subject_objs)
+        schedule_objs.append(Schedule(
+            subject=subject,
+            teacher_id=rnd.choice(teachers_by_subject.get(subject.id, [None])),
+            cabinet=rnd.choice(cabinet_objs),
+            school_class=class_objs[i % len(class_objs)],
+            day_of_week=(i // len(class_objs)) % days + 1,
+            lesson_number=(i // (len(class_objs) * days)) % lessons + 1,
+        ))
+    Schedule.objects.bulk_create(schedule_objs, batch_size=batch_size)
+
+    activity_types = [code for code, _ in ExtraActivity.ACTIVITY_TYPES]
+    activity_objs = ExtraActivity.objects.bulk_create([
+        ExtraActivity(
+            name=f"Кружок {i + 1:04d}",
+            description='Синтетическое занятие для нагрузочного теста',
+            activity_type=rnd.choice(activity_types),
+            teacher=rnd.choice(teacher_objs),
+            max_students=rnd.randint(8, 30),
+            is_active=rnd.random() > 0.2,
+        )
+        for i in range(activities)
+    ], batch_size=batch_size)
+
+    extra_lessons = len(ExtraSchedule.LESSON_CHOICES)
+    if activity_objs:
+        ExtraSchedule.objects.bulk_create([
+            ExtraSchedule(
+                activity=activity_objs[i % len(activity_objs)],
+                cabinet=rnd.choice(cabinet_objs),
+                day_of_week=rnd.randint(1, days),
+                lesson_number=rnd.randint(extra_lessons - 3, extra_lessons),
+            )
+            for i in range(extra_schedules)
+        ], batch_size=batch_size)
+
+    # Записи на занятия: сверх max_students - в лист ожидания, счетчик мест совпадает с записями
+    enrollments = min(enrollments, len(activity_objs) * len(student_objs))
+    pairs = set()
+    while len(pairs) < enrollments:
+        pairs.add((rnd.randrange(len(activity_objs)), rnd.randrange(len(student_objs))))
+    enrollment_objs = []
+    for i, (activity_index, student_index) in enumerate(sorted(pairs)):
+        activity = activity_objs[activity_index]
+        enrolled = activity.seats_taken < activity.max_students
+        activity.seats_taken += enrolled
+        enrollment_objs.append(Enrollment(
+            activity=activity,
+            student=student_objs[student_index],
+            status=Enrollment.ENROLLED if enrolled else Enrollment.WAITLIST,
+            idempotency_key=f"synthetic-{i + 1:06d}",
+        ))
+    Enrollment.objects.bulk_create(enrollment_objs, batch_size=batch_size)
+    ExtraActivity.objects.bulk_update(activity_objs, ['seats_taken'], batch_size=batch_size)
+
+    # Сигналы не сработали, поэтому пересобираем снимки и сбрасываем кэши вручную
+    refresh_after_bulk_change(*snapshots.REFRESH)
+
+    return {
+        'teachers': teachers,
+        'subjects': subjects,
+        'cabinets': cabinets,
+        'classes': classes,
+        'students': students,
+        'schedules': schedules,
+        'activities': activities,
+        'extra_schedules': extra_schedules if activity_objs else 0,
+        'enrollments': enrollments,
+    }
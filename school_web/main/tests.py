@@ -1,3 +1,1918 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import BadRequest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db.models import Exists, OuterRef, Q
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import parse_http_date
+
+from . import enrollment, generator, ics, loadtest, occupancy, profiling, report_cache, snapshots, stamps, timetable, workload
+from .admin import TeacherAdmin
+from .async_reports import load_concurrently
+from .conflicts import conflicts_for, find_all_conflicts
+from .exports import ExportUnavailable
+from .forms import ScheduleForm
+from .importers import ScheduleImporter, StudentImporter, TeacherImporter
+from .pagination import decode_cursor, encode_cursor, keyset_list, keyset_page
+from .report_stats import ReportStats
+from .models import (
+    ActivitySnapshot, Cabinet, Enrollment, ExtraActivity, ExtraSchedule, LessonSnapshot, Schedule, SchoolGroup, Student,
+    StudyPlan, Subject, Task, Teacher, TeacherClassesSnapshot, TeacherSubject,
+)
+from .synthetic import populate_school
+
+
+class ReportQueryBudgetTests(TestCase):
+    """Бюджет SQL-запросов и времени для отчетов TeacherAdmin на большой школе"""
+
+    # Максимальное количество SQL-запросов на один отчет, включая сессию и пользователя
+    QUERY_BUDGET = {
+        'teachers_report': 12,
+        'subjects_teachers_report': 12,
+        'prof_retrain_report': 12,
+        'teachers_classes_report': 12,
+        'extra_activities_report': 12,
+        'schedule_report': 12,
+        'extra_schedule_report': 12,
+        'workload_report': 12,
+    }
+    # Максимальное время ответа отчета в секундах
+    TIME_BUDGET = 10.0
+
+    @classmethod
+    def setUpTestData(cls):
+        populate_school(teachers=2000, classes=300, students=40000, schedules=20000)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        # Откат транзакции теста не отправляет сигналы, поэтому кэши сбрасываем вручную
+        timetable.invalidate()
+        report_cache.invalidate()
+        self.client.force_login(self.user)
+
+    def assertWithinBudget(self, name, **params):
+        url = reverse(f'admin:{name}')
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), self.QUERY_BUDGET[name],
+            f"{name}: {len(queries)} SQL-запросов, бюджет {self.QUERY_BUDGET[name]}",
+        )
+        self.assertLessEqual(
+            elapsed, self.TIME_BUDGET,
+            f"{name}: {elapsed:.2f} с, бюджет {self.TIME_BUDGET} с",
+        )
+
+    def test_every_report_has_budget(self):
+        model_admin = admin.site._registry[Teacher]
+        report_names = {
+            pattern.name for pattern in model_admin.get_urls()
+            if pattern.name and not pattern.name.startswith('main_teacher_') and not pattern.name.endswith('_async')
+        }
+        self.assertEqual(report_names, set(self.QUERY_BUDGET))
+
+    def test_teachers_report(self):
+        self.assertWithinBudget('teachers_report')
+
+    def test_subjects_teachers_report(self):
+        self.assertWithinBudget('subjects_teachers_report')
+
+    def test_prof_retrain_report(self):
+        self.assertWithinBudget('prof_retrain_report', has_retrain='yes')
+
+    def test_teachers_classes_report(self):
+        self.assertWithinBudget('teachers_classes_report')
+
+    def test_extra_activities_report(self):
+        self.assertWithinBudget('extra_activities_report')
+
+    def test_schedule_report(self):
+        self.assertWithinBudget('schedule_report')
+
+    def test_extra_schedule_report(self):
+        self.assertWithinBudget('extra_schedule_report')
+
+    def test_workload_report(self):
+        self.assertWithinBudget('workload_report')
+
+    def test_csv_export_streams_all_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:schedule_report'), {'download': 'csv'})
+            lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(len(lines), 20000 + 1)
+        self.assertLessEqual(len(queries), self.QUERY_BUDGET['schedule_report'])
+
+
+class ChangelistQueryTests(TestCase):
+    """Количество SQL-запросов на страницу списка в админке не зависит от числа строк"""
+
+    # Сессия, пользователь, два COUNT, строки страницы, prefetch и значения list_filter
+    QUERY_BUDGET = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        populate_school(teachers=150, classes=40, students=300, schedules=300, subjects=12,
+                        activities=120, extra_schedules=150)
+        Task.objects.create(title='Проверка', task='Проверить журналы')
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertChangelistWithinBudget(self, model):
+        url = reverse(f'admin:main_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Страница заполнена, иначе N+1 мог бы не проявиться
+        model_admin = admin.site._registry[model]
+        self.assertEqual(
+            len(response.context['cl'].result_list),
+            min(model_admin.list_per_page, model.objects.count()),
+        )
+        self.assertLessEqual(
+            len(queries), self.QUERY_BUDGET,
+            f"{model.__name__}: {len(queries)} SQL-запросов, бюджет {self.QUERY_BUDGET}",
+        )
+
+    def test_every_admin_has_test(self):
+        tested = {name[len('test_'):] for name in dir(self) if name.startswith('test_')}
+        registered = {model._meta.model_name for model in admin.site._registry if model._meta.app_label == 'main'}
+        self.assertEqual(registered - tested, set())
+
+    def test_teacher(self):
+        self.assertChangelistWithinBudget(Teacher)
+
+    def test_cabinet(self):
+        self.assertChangelistWithinBudget(Cabinet)
+
+    def test_subject(self):
+        self.assertChangelistWithinBudget(Subject)
+        response = self.client.get(reverse('admin:main_subject_changelist'), {'o': '-3'})
+        subjects = response.context['cl'].result_list
+        self.assertEqual(subjects[0].teachers_count, subjects[0].teacher_set.count())
+
+    def test_schoolgroup(self):
+        self.assertChangelistWithinBudget(SchoolGroup)
+
+    def test_student(self):
+        self.assertChangelistWithinBudget(Student)
+
+    def test_schedule(self):
+        self.assertChangelistWithinBudget(Schedule)
+
+    def test_extraactivity(self):
+        self.assertChangelistWithinBudget(ExtraActivity)
+
+    def test_extraschedule(self):
+        self.assertChangelistWithinBudget(ExtraSchedule)
+
+    def test_task(self):
+        self.assertChangelistWithinBudget(Task)
+
+    def test_teachersubject(self):
+        self.assertChangelistWithinBudget(TeacherSubject)
+
+    def test_studyplan(self):
+        self.assertChangelistWithinBudget(StudyPlan)
+
+    def test_enrollment(self):
+        self.assertChangelistWithinBudget(Enrollment)
+
+
+class ScheduleTeacherTests(TestCase):
+    """Назначение учителя уроку и его вывод в отчете по расписанию"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.homeroom = Teacher.objects.create(full_name='Классный Руководитель', post='Учитель')
+        cls.other = Teacher.objects.create(full_name='Другой Учитель', post='Учитель')
+        cls.subject = Subject.objects.create(full_name='Математика')
+        cabinet = Cabinet.objects.create(number='101', teacher=cls.other)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.homeroom, cabinet=cabinet)
+        TeacherSubject.objects.create(teacher=cls.other, subject=cls.subject)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        cls.cabinet = cabinet
+
+    def make_lesson(self, **kwargs):
+        return Schedule.objects.create(
+            subject=self.subject, cabinet=self.cabinet, school_class=self.school_class, **kwargs
+        )
+
+    def test_teacher_resolved_through_teacher_subject(self):
+        self.assertEqual(self.make_lesson().teacher, self.other)
+
+    def test_homeroom_teacher_preferred(self):
+        TeacherSubject.objects.create(teacher=self.homeroom, subject=self.subject)
+        self.assertEqual(self.make_lesson().teacher, self.homeroom)
+
+    def test_explicit_teacher_kept(self):
+        lesson = self.make_lesson(teacher=self.homeroom)
+        self.assertEqual(lesson.teacher, self.homeroom)
+
+    def test_report_shows_assigned_teacher(self):
+        self.make_lesson(teacher=self.homeroom)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:schedule_report'))
+        self.assertContains(response, 'Классный Руководитель')
+        self.assertContains(response, 'Математика')
+
+
+class TimetableGridTests(TestCase):
+    """Сетка расписания в памяти и ее сброс по сигналам моделей"""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = Teacher.objects.create(full_name='Иванов И.И.', post='Учитель')
+        cls.math = Subject.objects.create(full_name='Математика')
+        cls.physics = Subject.objects.create(full_name='Физика')
+        cls.cabinet = Cabinet.objects.create(number='201', teacher=teacher)
+        cls.class_a = SchoolGroup.objects.create(number='7А', teacher=teacher, cabinet=cls.cabinet)
+        cls.class_b = SchoolGroup.objects.create(number='7Б', teacher=teacher, cabinet=cls.cabinet)
+        for school_class, day, lesson, subject in [
+            (cls.class_a, 1, 1, cls.math),
+            (cls.class_a, 1, 2, cls.physics),
+            (cls.class_b, 1, 1, cls.physics),
+            (cls.class_b, 3, 5, cls.math),
+        ]:
+            Schedule.objects.create(
+                subject=subject, cabinet=cls.cabinet, school_class=school_class,
+                day_of_week=day, lesson_number=lesson,
+            )
+
+    def setUp(self):
+        timetable.invalidate()
+
+    def test_slot_lookup(self):
+        grid = timetable.get_grid()
+        [lesson] = grid.slot(1, 2, self.class_a.id)
+        self.assertEqual(lesson.subject_name, 'Физика')
+        self.assertEqual(grid.slot(2, 2, self.class_a.id), [])
+
+    def test_report_statistics(self):
+        report = timetable.get_grid().report()
+        self.assertEqual(report['total_lessons'], 4)
+        self.assertEqual(report['day_stats'], [{'day_of_week': 1, 'count': 3}, {'day_of_week': 3, 'count': 1}])
+        self.assertEqual(report['class_stats'], [
+            {'school_class__number': '7А', 'count': 2},
+            {'school_class__number': '7Б', 'count': 2},
+        ])
+        self.assertEqual(report['sorted_days'], ['Понедельник', 'Среда'])
+
+    def test_report_filters(self):
+        report = timetable.get_grid().report(day=1, subject_id=self.math.id)
+        self.assertEqual(report['total_lessons'], 1)
+        self.assertEqual(list(report['schedule_by_day']['Понедельник']), ['7А'])
+
+    def test_warm_grid_needs_no_queries(self):
+        timetable.get_grid()
+        with self.assertNumQueries(0):
+            timetable.get_grid().report(class_id=self.class_b.id)
+
+    def test_invalidated_on_save_and_delete(self):
+        timetable.get_grid()
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson = Schedule.objects.create(
+                subject=self.math, cabinet=self.cabinet, school_class=self.class_a,
+                day_of_week=6, lesson_number=9,
+            )
+        self.assertEqual(len(timetable.get_grid().slot(6, 9, self.class_a.id)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.delete()
+        self.assertEqual(timetable.get_grid().slot(6, 9, self.class_a.id), [])
+
+    def test_invalidated_after_commit(self):
+        grid = timetable.get_grid()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Schedule.objects.create(
+                subject=self.math, cabinet=self.cabinet, school_class=self.class_a,
+                day_of_week=6, lesson_number=9,
+            )
+            self.assertIs(timetable.get_grid(), grid)
+        self.assertTrue(callbacks)
+        self.assertIsNot(timetable.get_grid(), grid)
+
+    def test_version_keys_are_per_database(self):
+        key = caches['default'].make_key(timetable.VERSION_KEY)
+        with mock.patch.dict(connection.settings_dict, NAME='other.sqlite3'):
+            self.assertNotEqual(caches['default'].make_key(timetable.VERSION_KEY), key)
+
+
+class ScheduleConflictTests(TestCase):
+    """Поиск накладок по реальным интервалам времени уроков и доп. занятий"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Петров П.П.', post='Учитель')
+        cls.other_teacher = Teacher.objects.create(full_name='Сидоров С.С.', post='Учитель')
+        cls.subject = Subject.objects.create(full_name='История')
+        cls.cabinet = Cabinet.objects.create(number='301', teacher=cls.teacher)
+        cls.other_cabinet = Cabinet.objects.create(number='302', teacher=cls.teacher)
+        cls.school_class = SchoolGroup.objects.create(number='9А', teacher=cls.teacher, cabinet=cls.cabinet)
+        cls.activity = ExtraActivity.objects.create(name='Шахматы', teacher=cls.other_teacher)
+
+    def lesson(self, **kwargs):
+        values = {
+            'subject': self.subject, 'teacher': self.teacher, 'cabinet': self.cabinet,
+            'school_class': self.school_class, 'day_of_week': 1, 'lesson_number': 1,
+        }
+        values.update(kwargs)
+        return Schedule.objects.create(**values)
+
+    def extra(self, **kwargs):
+        values = {'activity': self.activity, 'cabinet': self.cabinet, 'day_of_week': 1, 'lesson_number': 10}
+        values.update(kwargs)
+        return ExtraSchedule.objects.create(**values)
+
+    def test_no_conflicts(self):
+        self.lesson(lesson_number=1)
+        self.lesson(lesson_number=2)
+        self.extra(lesson_number=10)
+        self.assertEqual(find_all_conflicts(), [])
+
+    def test_cabinet_overlap_between_different_bell_schedules(self):
+        # Урок 3 (10:10-10:50) и доп. занятие 4 (10:45-11:30) пересекаются на 5 минут
+        self.lesson(lesson_number=3)
+        self.extra(lesson_number=4)
+        [conflict] = find_all_conflicts()
+        self.assertEqual(conflict.kind, 'cabinet')
+        self.assertEqual({conflict.first.source, conflict.second.source}, {'schedule', 'extra'})
+
+    def test_adjacent_intervals_do_not_conflict(self):
+        # Урок 1 (8:30-9:10) и доп. занятие 3 (9:50-10:35) не пересекаются
+        self.lesson(lesson_number=1)
+        self.extra(lesson_number=3)
+        self.assertEqual(find_all_conflicts(), [])
+
+    def test_class_and_teacher_double_booked(self):
+        self.lesson(lesson_number=5)
+        self.lesson(lesson_number=5, cabinet=self.other_cabinet)
+        kinds = sorted(conflict.kind for conflict in find_all_conflicts())
+        self.assertEqual(kinds, ['class', 'teacher'])
+
+    def test_teacher_in_two_places(self):
+        self.lesson(lesson_number=9, teacher=self.other_teacher)
+        self.extra(lesson_number=9, cabinet=self.other_cabinet)
+        [conflict] = find_all_conflicts()
+        self.assertEqual((conflict.kind, conflict.resource_id), ('teacher', self.other_teacher.id))
+
+    def test_conflicts_for_unsaved_lesson(self):
+        self.lesson(lesson_number=4)
+        candidate = Schedule(
+            subject=self.subject, teacher=self.other_teacher, cabinet=self.cabinet,
+            school_class=self.school_class, day_of_week=1, lesson_number=4,
+        )
+        kinds = sorted(conflict.kind for conflict in conflicts_for(candidate))
+        self.assertEqual(kinds, ['cabinet', 'class'])
+
+    def test_saved_lesson_does_not_conflict_with_itself(self):
+        self.assertEqual(conflicts_for(self.lesson()), [])
+
+    def test_admin_form_rejects_conflict(self):
+        self.lesson(lesson_number=6)
+        form = ScheduleForm(data={
+            'day_of_week': 1, 'lesson_number': 6, 'subject': self.subject.id,
+            'teacher': self.other_teacher.id, 'school_class': self.school_class.id,
+            'cabinet': self.other_cabinet.id,
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('Класс 9А', form.non_field_errors()[0])
+
+    def test_command_reports_conflicts(self):
+        self.lesson(lesson_number=7)
+        self.lesson(lesson_number=7, school_class=SchoolGroup.objects.create(
+            number='9Б', teacher=self.teacher, cabinet=self.cabinet))
+        out = StringIO()
+        call_command('check_schedule_conflicts', '--kind', 'cabinet', stdout=out)
+        self.assertIn('Кабинет 301', out.getvalue())
+        self.assertIn('Найдено накладок: 1', out.getvalue())
+
+
+class ExplainReportQueriesTests(TestCase):
+    """Команда explain_report_queries и индексы под фильтры отчетов"""
+
+    def test_schedule_filters_use_indexes(self):
+        for report in ['schedule_report', 'extra_schedule_report', 'workload_report']:
+            out = StringIO()
+            call_command('explain_report_queries', '--report', report, '--fail', stdout=out)
+            self.assertIn('Все отфильтрованные запросы используют индексы', out.getvalue())
+
+    def test_day_filter_plan_uses_composite_index(self):
+        plan = Schedule.objects.filter(day_of_week=1).order_by('day_of_week', 'lesson_number').explain()
+        self.assertIn('schedule_day_lesson_idx', plan)
+
+
+class ReportExportTests(TestCase):
+    """Выгрузка отчетов TeacherAdmin в CSV, XLSX и PDF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Орлова О.О.', post='Учитель', prof_retrain='Курсы 2024')
+        Teacher.objects.create(full_name='Зайцев З.З.', post='Завуч')
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_csv_export_respects_filters(self):
+        response = self.client.get(reverse('admin:prof_retrain_report'), {'has_retrain': 'yes', 'download': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="prof_retrain_report_', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines, [
+            'ФИО преподавателя;Должность;Категория;Профессиональная переподготовка;Статус',
+            'Орлова О.О.;Учитель;;Курсы 2024;Есть',
+        ])
+
+    def test_every_report_exports_csv(self):
+        for name in ReportQueryBudgetTests.QUERY_BUDGET:
+            with self.subTest(report=name):
+                response = self.client.get(reverse(f'admin:{name}'), {'download': 'csv'})
+                self.assertEqual(response.status_code, 200)
+                self.assertIsInstance(response, StreamingHttpResponse)
+
+    def test_unavailable_format_redirects_back(self):
+        with mock.patch('main.admin.export_response', side_effect=ExportUnavailable('Нет пакета')):
+            response = self.client.get(reverse('admin:teachers_report'), {'download': 'xlsx'})
+        self.assertRedirects(response, reverse('admin:teachers_report') + '?', fetch_redirect_response=False)
+
+
+class ReportCacheTests(TestCase):
+    """Кэш страниц отчетов и его сброс сигналами моделей"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Волков В.В.', post='Учитель', category='Высшая')
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        report_cache.invalidate()
+        report_cache.reset_stats()
+        self.client.force_login(self.user)
+
+    def get(self, name, **params):
+        return self.client.get(reverse(f'admin:{name}'), params)
+
+    def test_second_request_is_served_from_cache(self):
+        self.assertEqual(self.get('prof_retrain_report')['X-Report-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get('prof_retrain_report')
+        self.assertEqual(response['X-Report-Cache'], 'HIT')
+        self.assertContains(response, 'Волков В.В.')
+        # Остаются только запросы сессии и пользователя
+        self.assertLessEqual(len(queries), 2)
+        self.assertEqual(report_cache.stats()['prof_retrain_report'], {'hits': 1, 'misses': 1})
+
+    def test_filters_are_normalized(self):
+        self.get('schedule_report', day='all')
+        self.assertEqual(self.get('schedule_report')['X-Report-Cache'], 'HIT')
+        self.assertEqual(self.get('schedule_report', day='2')['X-Report-Cache'], 'MISS')
+
+    def test_save_invalidates_dependent_reports_only(self):
+        self.get('prof_retrain_report')
+        self.get('extra_schedule_report')
+        with self.captureOnCommitCallbacks(execute=True):
+            Teacher.objects.filter(pk=self.teacher.pk).get().save()
+        self.assertEqual(self.get('prof_retrain_report')['X-Report-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subject.objects.create(full_name='Химия')
+        self.assertEqual(self.get('prof_retrain_report')['X-Report-Cache'], 'HIT')
+
+    def test_invalidated_after_commit(self):
+        self.get('prof_retrain_report')
+        with self.captureOnCommitCallbacks(execute=True):
+            Teacher.objects.get(pk=self.teacher.pk).save()
+            # До фиксации страница с прежними данными остается под прежним поколением
+            self.assertEqual(self.get('prof_retrain_report')['X-Report-Cache'], 'HIT')
+        self.assertEqual(self.get('prof_retrain_report')['X-Report-Cache'], 'MISS')
+
+    def test_command_reads_shared_counters(self):
+        self.get('prof_retrain_report')
+        self.get('prof_retrain_report')
+        out = StringIO()
+        call_command('report_cache', '--clear', stdout=out)
+        self.assertIn('prof_retrain_report          попаданий:      1  промахов:      1  (50%)', out.getvalue())
+        self.assertEqual(self.get('prof_retrain_report')['X-Report-Cache'], 'MISS')
+
+    def test_m2m_change_invalidates(self):
+        self.get('teachers_report')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.subjects.add(Subject.objects.create(full_name='Химия'))
+        response = self.get('teachers_report')
+        self.assertEqual(response['X-Report-Cache'], 'MISS')
+        self.assertContains(response, 'Химия')
+
+    def test_downloads_bypass_cache(self):
+        response = self.get('prof_retrain_report', download='csv')
+        self.assertNotIn('X-Report-Cache', response)
+
+
+class ReportStatsTests(TestCase):
+    """Счетчики и группировки отчетов за один запрос"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = Teacher.objects.create(full_name='Орлов О.О.', post='Учитель', category='Высшая',
+                                           prof_retrain='Менеджмент')
+        cls.second = Teacher.objects.create(full_name='Лисина Л.Л.', post='Учитель', category='Первая')
+        cls.third = Teacher.objects.create(full_name='Зайцев З.З.', post='Завуч', category='Высшая',
+                                           prof_retrain='')
+        cabinet = Cabinet.objects.create(number='301', teacher=cls.first)
+        SchoolGroup.objects.create(number='5А', teacher=cls.first, cabinet=cabinet)
+        SchoolGroup.objects.create(number='6А', teacher=cls.first, cabinet=cabinet)
+        ExtraActivity.objects.create(name='Футбол', activity_type='sport', teacher=cls.first)
+        ExtraActivity.objects.create(name='Хор', activity_type='art', teacher=cls.second, is_active=False)
+        ExtraActivity.objects.create(name='Шахматы', activity_type='sport', teacher=cls.second)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        report_cache.invalidate()
+        self.client.force_login(self.user)
+
+    def test_single_query(self):
+        stats = ReportStats(ExtraActivity.objects.all())
+        stats.count('total')
+        stats.count('active', Q(is_active=True))
+        stats.breakdown('types', 'activity_type')
+        stats.breakdown('teachers', 'teacher__full_name', 'teacher__post')
+        with self.assertNumQueries(1):
+            result = stats.compute()
+
+        self.assertEqual(result['total'], 3)
+        self.assertEqual(result['active'], 2)
+        self.assertEqual(result['types'], [
+            {'activity_type': 'sport', 'count': 2},
+            {'activity_type': 'art', 'count': 1},
+        ])
+        self.assertEqual(result['teachers'][0], {
+            'teacher__full_name': 'Лисина Л.Л.', 'teacher__post': 'Учитель', 'count': 2,
+        })
+
+    def test_empty_queryset(self):
+        stats = ReportStats(Teacher.objects.none()).count('total').breakdown('posts', 'post')
+        self.assertEqual(stats.compute(), {'total': 0, 'posts': []})
+
+    def test_exists_condition_does_not_multiply_rows(self):
+        has_class = Exists(SchoolGroup.objects.filter(teacher=OuterRef('pk')))
+        result = ReportStats(Teacher.objects.all()).count('total').count('with_classes', has_class).compute()
+        self.assertEqual(result, {'total': 3, 'with_classes': 1})
+
+    def test_report_stats_follow_filters(self):
+        response = self.client.get(reverse('admin:teachers_classes_report'), {'has_classes': 'no'})
+        self.assertEqual(response.context['total_teachers'], 2)
+        self.assertEqual(response.context['with_classes'], 0)
+        self.assertEqual(len(response.context['teacher_data']), 2)
+
+        response = self.client.get(reverse('admin:prof_retrain_report'), {'has_retrain': 'yes'})
+        self.assertEqual(response.context['total_teachers'], 1)
+        self.assertEqual(response.context['with_retrain'], 1)
+        self.assertEqual(response.context['category_stats'], [{'category': 'Высшая', 'count': 1}])
+
+
+class KeysetPaginationTests(TestCase):
+    """Постраничный вывод отчетов по ключу и подгрузка строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Одинаковые ФИО проверяют, что строки с равным ключом не теряются на границе страниц
+        Teacher.objects.bulk_create(
+            [Teacher(full_name=f'Учитель {i % 4:02d}', post='Учитель') for i in range(25)]
+        )
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        report_cache.invalidate()
+        self.client.force_login(self.user)
+
+    def test_pages_cover_queryset_once(self):
+        seen = []
+        after = None
+        while True:
+            page = keyset_page(Teacher.objects.all(), ('full_name', 'id'), after, size=7)
+            self.assertEqual(page.start, len(seen))
+            seen += [teacher.pk for teacher in page.rows]
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        expected = list(Teacher.objects.order_by('full_name', 'id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_query_does_not_use_offset(self):
+        first = keyset_page(Teacher.objects.all(), ('full_name', 'id'), size=10)
+        with CaptureQueriesContext(connection) as queries:
+            keyset_page(Teacher.objects.all(), ('full_name', 'id'), first.next_cursor, size=10)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_list_pages_match_queryset_pages(self):
+        rows = list(Teacher.objects.order_by('full_name', 'id'))
+        after = None
+        while True:
+            page = keyset_page(Teacher.objects.all(), ('full_name', 'id'), after, size=6)
+            in_memory = keyset_list(rows, ('full_name', 'id'), after, size=6)
+            self.assertEqual(in_memory.rows, page.rows)
+            self.assertEqual((in_memory.start, in_memory.next_cursor), (page.start, page.next_cursor))
+            if not page.has_next:
+                break
+            after = page.next_cursor
+
+    def test_bad_cursor(self):
+        response = self.client.get(reverse('admin:teachers_report'), {'after': 'мусор'})
+        self.assertEqual(response.status_code, 400)
+        page = keyset_page(Teacher.objects.all(), ('full_name', 'id'), size=3)
+        values, position = decode_cursor(page.next_cursor, 2)
+        self.assertEqual((values, position), (['Учитель 00', page.rows[-1].pk], 3))
+
+    def test_cursor_values_must_be_scalars(self):
+        self.assertEqual(decode_cursor(encode_cursor([None, 1.5, True], 1), 3), ([None, 1.5, True], 1))
+        for values in ([['Учитель 00'], 1], [{'a': 1}, 1]):
+            with self.assertRaises(BadRequest):
+                decode_cursor(encode_cursor(values, 3), 2)
+        response = self.client.get(reverse('admin:teachers_report'), {'after': encode_cursor([[1, 2], 1], 3)})
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('main.pagination.PAGE_SIZE', 10)
+    def test_report_renders_first_page_and_fragments(self):
+        response = self.client.get(reverse('admin:prof_retrain_report'))
+        self.assertEqual(len(response.context['teachers']), 10)
+        # Статистика считается по всем строкам, а не по странице
+        self.assertEqual(response.context['total_teachers'], 25)
+        self.assertContains(response, 'Показать еще')
+
+        rows = 10
+        after = response.context['page'].next_cursor
+        while after:
+            fragment = self.client.get(reverse('admin:prof_retrain_report'), {'after': after})
+            self.assertNotContains(fragment, '<html')
+            self.assertContains(fragment, 'keyset-cursor')
+            rows += len(fragment.context['teachers'])
+            after = fragment.context['page'].next_cursor
+        self.assertEqual(rows, 25)
+
+
+class StaticFilesTests(TestCase):
+    """Общий CSS отчетов, сжатые копии после collectstatic и их раздача"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.settings_override = override_settings(
+            STATIC_ROOT=cls.static_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'main.storage.CompressedManifestStaticFilesStorage'},
+            },
+        )
+        cls.settings_override.enable()
+        cls.addClassCleanup(cls.settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def test_report_uses_shared_stylesheet(self):
+        self.client.force_login(self.user)
+        report_cache.invalidate()
+        response = self.client.get(reverse('admin:prof_retrain_report'))
+        self.assertNotContains(response, '<style>')
+        self.assertContains(response, staticfiles_storage.url('main/css/reports.css'))
+
+    def test_hashed_file_is_precompressed_and_immutable(self):
+        name = staticfiles_storage.stored_name('main/css/reports.css')
+        self.assertNotEqual(name, 'main/css/reports.css')
+        response = self.client.get(f'/static/{name}', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', response['Cache-Control'])
+        content = gzip.decompress(b''.join(response.streaming_content))
+        with open(staticfiles_storage.path(name), 'rb') as original:
+            self.assertEqual(content, original.read())
+
+    def test_plain_response_without_accept_encoding(self):
+        response = self.client.get('/static/main/css/reports.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        not_modified = self.client.get(
+            '/static/main/css/reports.css', headers={'If-Modified-Since': response['Last-Modified']},
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_missing_and_outside_files(self):
+        self.assertEqual(self.client.get('/static/main/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/static/%2e%2e/manage.py').status_code, 404)
+
+
+class SqliteProfileTests(TestCase):
+    """Профиль производительности SQLite и его бенчмарк"""
+
+    def test_pragmas_applied_on_connect(self):
+        if not settings.SQLITE_PERFORMANCE:
+            self.skipTest('Профиль SQLite отключен')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA temp_store')
+            # 2 - MEMORY
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_sqlite', rows=500, readers=2, writers=1, duration=0.2, stdout=out)
+        self.assertIn('Без профиля', out.getvalue())
+        self.assertIn('С профилем', out.getvalue())
+        self.assertIn('чтений/с', out.getvalue())
+
+
+class CsvImportTests(TestCase):
+    """Загрузка учеников, учителей и расписания из CSV"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.homeroom = Teacher.objects.create(full_name='Белова Б.Б.', post='Учитель')
+        cls.other = Teacher.objects.create(full_name='Чернов Ч.Ч.', post='Учитель')
+        cls.math = Subject.objects.create(full_name='Математика', short_name='Мат')
+        TeacherSubject.objects.create(teacher=cls.other, subject=cls.math)
+        TeacherSubject.objects.create(teacher=cls.homeroom, subject=cls.math)
+        cls.cabinet = Cabinet.objects.create(number='101', teacher=cls.other)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.homeroom, cabinet=cls.cabinet)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def run_import(self, importer_class, text, **kwargs):
+        return importer_class().run(StringIO(text), **kwargs)
+
+    def test_students_created_then_updated(self):
+        text = ('full_name;parent_name;birth_date;phone;school_class\n'
+                'Иванов Иван;Иванова Анна;01.09.2015;89990000001;5а\n'
+                'Петров Петр;;2015-03-02;89990000002;5А\n')
+        result = self.run_import(StudentImporter, text)
+        self.assertEqual((result.created, result.updated, result.errors), (2, 0, []))
+        student = Student.objects.get(full_name='Иванов Иван')
+        self.assertEqual(student.school_class, self.school_class)
+        self.assertEqual(str(student.birth_date), '2015-09-01')
+
+        result = self.run_import(StudentImporter, text.replace('89990000001', '89990000009'))
+        self.assertEqual((result.created, result.updated), (0, 2))
+        student.refresh_from_db()
+        self.assertEqual(student.phone, '89990000009')
+        # Колонки address нет в файле, поэтому значение не перезаписано
+        self.assertEqual(student.address, 'Не указан')
+
+    def test_errors_reported_per_row_and_nothing_saved(self):
+        text = ('full_name;birth_date;phone;school_class\n'
+                'Иванов Иван;01.09.2015;89990000001;5А\n'
+                'Петров Петр;31.02.2015;89990000002;5А\n'
+                'Сидоров Сидор;;89990000003;9Я\n'
+                'Иванов Иван;;89990000004;5А\n')
+        result = self.run_import(StudentImporter, text)
+        self.assertEqual(result.errors, [
+            (3, 'birth_date: неверная дата "31.02.2015"'),
+            (4, 'school_class: не найдено "9Я"'),
+            (5, 'Повторяет строку 2'),
+        ])
+        self.assertFalse(Student.objects.exists())
+
+    def test_missing_required_column(self):
+        result = self.run_import(StudentImporter, 'full_name;phone\nИванов;1\n')
+        self.assertEqual(result.errors, [(1, 'Нет обязательных колонок: school_class')])
+
+    def test_dry_run_counts_without_saving(self):
+        result = self.run_import(StudentImporter, 'full_name;phone;school_class\nИванов;1;5А\n', dry_run=True)
+        self.assertTrue(result.ok)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Student.objects.exists())
+
+    def test_schedule_resolves_names_and_suggests_teacher(self):
+        text = ('day_of_week;lesson_number;school_class;subject;cabinet;teacher\n'
+                'Понедельник;1;5А;Математика;101;\n'
+                '2;3;5А;математика;101;Чернов Ч.Ч.\n')
+        result = self.run_import(ScheduleImporter, text)
+        self.assertTrue(result.ok, result.errors)
+        first, second = Schedule.objects.order_by('day_of_week')
+        self.assertEqual((first.day_of_week, first.teacher), (1, self.homeroom))
+        self.assertEqual((second.lesson_number, second.teacher), (3, self.other))
+
+    def test_teachers_with_subjects_fill_both_link_tables(self):
+        text = 'full_name;post;subjects\nНовикова Н.Н.;Учитель;Мат\nБелова Б.Б.;Завуч;Математика\n'
+        result = self.run_import(TeacherImporter, text)
+        self.assertEqual((result.created, result.updated), (1, 1))
+        teacher = Teacher.objects.get(full_name='Новикова Н.Н.')
+        self.assertEqual(list(teacher.subjects.all()), [self.math])
+        self.assertTrue(TeacherSubject.objects.filter(teacher=teacher, subject=self.math).exists())
+        self.assertEqual(Teacher.objects.get(pk=self.homeroom.pk).post, 'Завуч')
+
+    def test_admin_upload(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:main_student_import_csv')
+        self.assertContains(self.client.get(reverse('admin:main_student_changelist')), url)
+
+        upload = SimpleUploadedFile('students.csv', 'full_name;phone;school_class\nИванов;1;5Б\n'.encode('utf-8-sig'))
+        response = self.client.post(url, {'file': upload, 'delimiter': ';'})
+        self.assertContains(response, 'не найдено')
+
+        upload = SimpleUploadedFile('students.csv', 'full_name,phone,school_class\nИванов,1,5А\n'.encode())
+        response = self.client.post(url, {'file': upload, 'delimiter': ','})
+        self.assertRedirects(response, reverse('admin:main_student_changelist'))
+        self.assertTrue(Student.objects.filter(full_name='Иванов').exists())
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as handle:
+            handle.write('full_name;phone;school_class\nИванов;1;5А\nПетров;2;7В\n')
+        self.addCleanup(os.remove, handle.name)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('import_csv', 'students', handle.name, stdout=out)
+        self.assertIn('Строка 3: school_class: не найдено "7В"', out.getvalue())
+        self.assertFalse(Student.objects.exists())
+
+
+class TimetableApiTests(TestCase):
+    """JSON API расписания и условные запросы по версиям ресурсов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Белова Б.Б.', post='Учитель')
+        cls.other = Teacher.objects.create(full_name='Чернов Ч.Ч.', post='Учитель')
+        cls.math = Subject.objects.create(full_name='Математика')
+        cls.cabinet = Cabinet.objects.create(number='101', teacher=cls.teacher)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.teacher, cabinet=cls.cabinet)
+        cls.other_class = SchoolGroup.objects.create(number='6Б', teacher=cls.other, cabinet=cls.cabinet)
+        cls.lesson = Schedule.objects.create(
+            school_class=cls.school_class, subject=cls.math, cabinet=cls.cabinet,
+            teacher=cls.teacher, day_of_week=1, lesson_number=2,
+        )
+        activity = ExtraActivity.objects.create(name='Шахматы', activity_type='sport', teacher=cls.teacher)
+        ExtraSchedule.objects.create(activity=activity, cabinet=cls.cabinet, day_of_week=3, lesson_number=10)
+
+    def setUp(self):
+        # Откат транзакции теста не меняет версии, а тела ответов кэшируются по ним
+        stamps.touch_all()
+
+    def url(self, kind, pk):
+        return reverse(f'api_{kind}_timetable', args=[pk])
+
+    def test_teacher_timetable(self):
+        response = self.client.get(self.url('teacher', self.teacher.pk))
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        data = response.json()
+        self.assertEqual(data['name'], 'Белова Б.Б.')
+        self.assertEqual(data['lessons']['rows'], [[1, 2, '9:20', '10:00', 'Математика', '5А', 'Белова Б.Б.', '101', None]])
+        self.assertEqual(data['extra']['rows'], [[3, 10, '16:15', '17:00', 'Шахматы', 'sport', 'Белова Б.Б.', '101']])
+        # Без пробелов после разделителей
+        self.assertNotIn(b', ', response.content)
+
+        data = self.client.get(self.url('class', self.school_class.pk)).json()
+        self.assertEqual(len(data['lessons']['rows']), 1)
+        self.assertNotIn('extra', data)
+        self.assertEqual(self.client.get(self.url('cabinet', 999999)).status_code, 404)
+
+    def test_not_modified_without_queries(self):
+        url = self.url('cabinet', self.cabinet.pk)
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+            # Повторный полный ответ берется из кэша
+            self.assertEqual(self.client.get(url).content, response.content)
+
+    def test_change_bumps_only_affected_resources(self):
+        etags = {
+            (kind, pk): self.client.get(self.url(kind, pk))['ETag']
+            for kind, pk in [('class', self.school_class.pk), ('class', self.other_class.pk),
+                             ('teacher', self.teacher.pk), ('teacher', self.other.pk)]
+        }
+        # Урок перенесли в другой класс к другому учителю: меняются и прежние, и новые
+        self.lesson.school_class = self.other_class
+        self.lesson.teacher = self.other
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        for (kind, pk), etag in etags.items():
+            response = self.client.get(self.url(kind, pk), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200, (kind, pk))
+        self.assertEqual(self.client.get(self.url('class', self.other_class.pk)).json()['lessons']['rows'][0][5], '6Б')
+
+        cabinet_etag = self.client.get(self.url('cabinet', self.cabinet.pk))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.create(school_class=self.other_class, subject=self.math, cabinet=self.cabinet,
+                                    teacher=self.other, day_of_week=2, lesson_number=1)
+        teacher_etag = self.client.get(self.url('teacher', self.teacher.pk))['ETag']
+        self.assertNotEqual(self.client.get(self.url('cabinet', self.cabinet.pk))['ETag'], cabinet_etag)
+        self.assertEqual(self.client.get(self.url('teacher', self.teacher.pk))['ETag'], teacher_etag)
+
+        # Переименование предмета меняет все расписания
+        self.math.full_name = 'Алгебра'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.math.save()
+        self.assertNotEqual(self.client.get(self.url('teacher', self.teacher.pk))['ETag'], teacher_etag)
+
+    def test_unknown_resource_gets_no_stamp(self):
+        self.assertEqual(self.client.get(self.url('class', 999999)).status_code, 404)
+        self.assertEqual(self.client.get(self.url('class', 999999), HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.assertIsNone(caches['default'].get(stamps._key('class', 999999)))
+
+    def test_change_is_published_after_commit(self):
+        etag = self.client.get(self.url('class', self.school_class.pk))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.lesson_number = 7
+            self.lesson.save()
+            # Тело ответа, собранное до фиксации, сохраняется под прежней версией
+            self.assertEqual(self.client.get(self.url('class', self.school_class.pk))['ETag'], etag)
+        self.assertNotEqual(self.client.get(self.url('class', self.school_class.pk))['ETag'], etag)
+
+    def test_index(self):
+        response = self.client.get(reverse('api_timetable_index'))
+        self.assertEqual(response.json()['class']['rows'], [[self.school_class.pk, '5А'], [self.other_class.pk, '6Б']])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.client.get(reverse('api_timetable_index'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304
+            )
+
+
+class CalendarFeedTests(TestCase):
+    """Готовые календари .ics на диске"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Белова Б.Б.', post='Учитель')
+        cls.math = Subject.objects.create(full_name='Математика')
+        cls.cabinet = Cabinet.objects.create(number='101', teacher=cls.teacher)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.teacher, cabinet=cls.cabinet)
+        cls.lesson = Schedule.objects.create(
+            school_class=cls.school_class, subject=cls.math, cabinet=cls.cabinet,
+            teacher=cls.teacher, day_of_week=3, lesson_number=2, info='Контрольная, 2 часть',
+        )
+        activity = ExtraActivity.objects.create(name='Шахматы', teacher=cls.teacher)
+        ExtraSchedule.objects.create(activity=activity, cabinet=cls.cabinet, day_of_week=1, lesson_number=10)
+
+    def setUp(self):
+        stamps.touch_all()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(ICS_FEED_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_render(self):
+        content = ics.render('teacher', self.teacher.pk, time.time(), today=datetime.date(2025, 10, 1)).decode()
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:schedule-{self.lesson.pk}@school32', content)
+        # 1 сентября 2025 - понедельник, первая среда - 3 сентября, 2 урок 9:20-10:00
+        self.assertIn('DTSTART:20250903T092000\r\nDTEND:20250903T100000\r\nRRULE:FREQ=WEEKLY;UNTIL=20260531T235959', content)
+        # Доп. занятие со временем из своего LESSON_CHOICES
+        self.assertIn('DTSTART:20250901T161500', content)
+        self.assertIn('DESCRIPTION:Класс 5А\\, Белова Б.Б.\\, Контрольная\\, 2 часть', content.replace('\r\n ', ''))
+        self.assertTrue(all(len(line.encode()) <= 75 for line in content.split('\r\n')))
+        self.assertNotIn('Шахматы', ics.render('class', self.school_class.pk, time.time()).decode())
+
+    def test_fold(self):
+        line = 'DESCRIPTION:' + 'Расписание ' * 20
+        folded = ics.fold(line)
+        self.assertEqual(folded.replace('\r\n ', ''), line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.split('\r\n')))
+
+    def test_feed_served_from_disk(self):
+        url = reverse('cabinet_calendar', args=[self.cabinet.pk])
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content)
+        self.assertIn('SUMMARY:Математика (5А)'.encode(), body)
+
+        # Пока расписание не менялось, файл отдается без запросов к БД
+        with self.assertNumQueries(0):
+            again = self.client.get(url)
+            self.assertEqual(b''.join(again.streaming_content), body)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        self.lesson.lesson_number = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn(b'T101000', b''.join(changed.streaming_content))
+        # Прежняя версия остается, пока ее может отдавать другой процесс
+        self.assertEqual(len(list((ics.feed_dir() / 'cabinet').glob('*.ics'))), 2)
+        self.assertEqual(ics.prune(), 0)
+        self.assertEqual(ics.prune(max_age=0), 1)
+        self.assertEqual(len(list((ics.feed_dir() / 'cabinet').glob('*.ics'))), 1)
+        self.assertEqual(self.client.get(reverse('class_calendar', args=[999999])).status_code, 404)
+
+    def test_new_school_year_invalidates_feed(self):
+        url = reverse('class_calendar', args=[self.school_class.pk])
+        school_year = ics.school_year
+        with mock.patch('main.ics.school_year', lambda today=None: school_year(today or datetime.date(2030, 6, 30))):
+            response = self.client.get(url)
+            self.assertIn(b'DTSTART:20290905T092000', b''.join(response.streaming_content))
+        # С 1 июля тот же ETag не подходит: календарь строится на следующий год
+        with mock.patch('main.ics.school_year', lambda today=None: school_year(today or datetime.date(2030, 7, 2))):
+            changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'],
+                                      HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(changed.status_code, 200)
+            self.assertIn(b'DTSTART:20300904T092000', b''.join(changed.streaming_content))
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 304)
+        self.assertGreater(parse_http_date(changed['Last-Modified']), parse_http_date(response['Last-Modified']))
+
+    def test_feed_served_when_file_is_missing(self):
+        url = reverse('class_calendar', args=[self.school_class.pk])
+        # Файл удален сразу после записи другим процессом
+        with mock.patch('main.ics.write_feed'):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:Математика'.encode(), b''.join(response.streaming_content))
+        self.assertEqual(list(ics.feed_dir().glob('*/*.ics')), [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('render_ics_feeds', stdout=out)
+        self.assertIn('Новых календарей: 3, удалено устаревших: 0', out.getvalue())
+        # Сервер отдает файлы, которые отрендерила команда
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('teacher_calendar', args=[self.teacher.pk]))
+            self.assertIn('SUMMARY:Шахматы'.encode(), b''.join(response.streaming_content))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        call_command('render_ics_feeds', '--max-age=0', stdout=out)
+        self.assertIn('Новых календарей: 3, удалено устаревших: 3', out.getvalue())
+        call_command('render_ics_feeds', stdout=out)
+        self.assertIn('Новых календарей: 0', out.getvalue())
+
+
+class RequestProfilingTests(TestCase):
+    """Server-Timing и журнал медленных запросов"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.log_path = os.path.join(directory, 'logs', 'slow.jsonl')
+
+    def test_disabled_middleware_not_used(self):
+        with override_settings(REQUEST_PROFILING=False):
+            response = self.client.get(reverse('home'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_server_timing_and_slow_log(self):
+        url = reverse('api_timetable_index')
+        with override_settings(REQUEST_PROFILING=True, SLOW_REQUEST_MS=0, SLOW_REQUEST_LOG=self.log_path):
+            response = self.client.get(url)
+            self.assertIn('tpl;dur=', self.client.get(reverse('home'))['Server-Timing'])
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('desc="3 queries"', timing)
+
+        with open(self.log_path, encoding='utf-8') as log:
+            entries = [json.loads(line) for line in log]
+        self.assertEqual([entry['path'] for entry in entries], [url, reverse('home')])
+        self.assertEqual(entries[0]['queries'], 3)
+        self.assertEqual(len(entries[0]['slowest']), 3)
+        self.assertIn('SELECT', entries[0]['slowest'][0]['sql'])
+
+    def test_fast_requests_not_logged(self):
+        with override_settings(REQUEST_PROFILING=True, SLOW_REQUEST_MS=60000, SLOW_REQUEST_LOG=self.log_path):
+            self.assertTrue(self.client.get(reverse('home')).has_header('Server-Timing'))
+        self.assertFalse(os.path.exists(self.log_path))
+
+    def test_duplicate_queries(self):
+        self.assertEqual(
+            profiling.fingerprint('SELECT 1 FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'x\''),
+            'SELECT ? FROM "t" WHERE "id" IN (...) AND "name" = ?',
+        )
+        profile = profiling.RequestProfile()
+        with connection.execute_wrapper(profile):
+            for pk in (1, 2, 3):
+                list(Task.objects.filter(pk=pk))
+            Task.objects.count()
+        self.assertEqual(profile.queries, 4)
+        self.assertEqual([count for count, _, _ in profile.duplicates], [3])
+        self.assertIn('dup;desc="2 duplicated"', profile.server_timing(0.1))
+
+
+class FullTextSearchTests(TestCase):
+    """Поиск в админке по индексам FTS5"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Фёдорова Анна', post='Учитель', education='МГУ, физика')
+        cls.other = Teacher.objects.create(full_name='Иванов Петр', post='Завуч')
+        cabinet = Cabinet.objects.create(number='101', teacher=cls.teacher)
+        school_class = SchoolGroup.objects.create(number='5А', teacher=cls.teacher, cabinet=cabinet)
+        cls.student = Student.objects.create(
+            full_name='Семёнов Илья', parent_name='Семёнова Ольга', phone='89991234567', school_class=school_class,
+        )
+        Student.objects.bulk_create([
+            Student(full_name=f'Ученик {i}', phone=f'8900000{i:04d}', school_class=school_class) for i in range(50)
+        ])
+        cls.chess = ExtraActivity.objects.create(name='Шахматы', description='Турниры по выходным', teacher=cls.other)
+        cls.choir = ExtraActivity.objects.create(name='Хор', teacher=cls.teacher)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def search(self, model, term):
+        model_admin = admin.site._registry[model]
+        queryset, may_have_duplicates = model_admin.get_search_results(None, model.objects.all(), term)
+        self.assertFalse(may_have_duplicates)
+        return set(queryset)
+
+    def test_prefix_and_yo(self):
+        self.assertEqual(self.search(Student, 'семен'), {self.student})
+        self.assertEqual(self.search(Student, 'СЕМЁНОВА ол'), {self.student})
+        self.assertEqual(self.search(Student, '8999123'), {self.student})
+        self.assertEqual(self.search(Teacher, 'федорова физ'), {self.teacher})
+        self.assertEqual(self.search(Teacher, 'федорова завуч'), set())
+        # Синтаксис FTS5 в запросе не ломает поиск
+        self.assertEqual(self.search(Teacher, 'завуч\" -('), {self.other})
+
+    def test_index_follows_changes(self):
+        self.student.full_name = 'Петров Илья'
+        self.student.save()
+        self.assertEqual(self.search(Student, 'семенов'), {self.student})  # по имени родителя
+        self.assertEqual(self.search(Student, 'петров'), {self.student})
+        Student.objects.filter(pk=self.student.pk).update(parent_name='Петрова Ольга')
+        self.assertEqual(self.search(Student, 'семенов'), set())
+        self.student.delete()
+        self.assertEqual(self.search(Student, 'петров'), set())
+
+    def test_counter_update_does_not_rewrite_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM "search_activity" WHERE rowid = %s', [self.chess.pk])
+        # Триггер срабатывает только на UPDATE индексируемых колонок
+        ExtraActivity.objects.filter(pk=self.chess.pk).update(seats_taken=1)
+        self.assertEqual(self.search(ExtraActivity, 'турнир'), set())
+        ExtraActivity.objects.filter(pk=self.chess.pk).update(name='Шахматы и шашки')
+        self.assertEqual(self.search(ExtraActivity, 'турнир'), {self.chess})
+
+    def test_triggers_after_migrate(self):
+        # 0018 пересоздает ExtraActivity, 0019 - триггеры обновления: после всех
+        # миграций у каждого индекса три триггера, обновление - по колонкам
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'search_%'")
+            triggers = dict(cursor.fetchall())
+        expected = {
+            f'{index}_{event}'
+            for index in ('search_student', 'search_teacher', 'search_activity')
+            for event in ('insert', 'update', 'delete')
+        }
+        self.assertEqual(set(triggers), expected)
+        for index in ('search_student', 'search_teacher', 'search_activity'):
+            self.assertIn('AFTER UPDATE OF', triggers[f'{index}_update'])
+
+    def test_activity_by_description_or_teacher(self):
+        self.assertEqual(self.search(ExtraActivity, 'турнир'), {self.chess})
+        self.assertEqual(self.search(ExtraActivity, 'федоров'), {self.choir})
+
+    def test_changelist(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:main_student_changelist'), {'q': 'семенов'})
+        self.assertContains(response, 'Семёнов Илья')
+        self.assertNotContains(response, 'Ученик 1')
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries.captured_queries))
+
+
+class AsyncReportTests(TransactionTestCase):
+    """Асинхронные варианты отчетов: те же страницы, запросы выполняются одновременно"""
+
+    def setUp(self):
+        populate_school(teachers=30, classes=10, students=50, schedules=120, subjects=8,
+                        activities=6, extra_schedules=12)
+        self.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        timetable.invalidate()
+        report_cache.invalidate()
+
+    def test_loaders_run_concurrently(self):
+        # Обе загрузки ждут друг друга: при последовательном выполнении барьер не пройти
+        barrier = threading.Barrier(2, timeout=5)
+
+        def loader(value):
+            barrier.wait()
+            return value
+
+        results = async_to_sync(load_concurrently)({'a': lambda: loader(1), 'b': lambda: loader(2)})
+        self.assertEqual(results, {'a': 1, 'b': 2})
+
+    async def test_async_pages_match_sync(self):
+        await self.async_client.aforce_login(self.user)
+        for name in TeacherAdmin.REPORTS:
+            url = reverse(f'admin:{name}')
+            async_url = reverse(f'admin:{name}_async')
+            self.assertEqual(async_url, url + 'async/')
+            await sync_to_async(report_cache.invalidate)()
+            sync_response = await sync_to_async(self.client_get)(url)
+            await sync_to_async(report_cache.invalidate)()
+            async_response = await self.async_client.get(async_url)
+            self.assertEqual(async_response.status_code, 200, name)
+            self.assertEqual(async_response['X-Report-Cache'], 'MISS')
+            self.assertEqual(async_response.content, sync_response.content, name)
+            # Повторный запрос отдается из общего с обычным отчетом кэша
+            self.assertEqual((await self.async_client.get(async_url))['X-Report-Cache'], 'HIT')
+
+    async def test_async_report_requires_staff(self):
+        response = await self.async_client.get(reverse('admin:teachers_report_async'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('admin:login'), response['Location'])
+
+    def client_get(self, url):
+        self.client.force_login(self.user)
+        return self.client.get(url)
+
+
+class ReportSnapshotTests(TestCase):
+    """Снимки отчетов: пересчет затронутых строк сигналами и полная пересборка"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = Teacher.objects.create(full_name='Белова Б.Б.', post='Учитель', category='Высшая')
+        cls.other = Teacher.objects.create(full_name='Чернов Ч.Ч.', post='Методист')
+        cls.math = Subject.objects.create(full_name='Математика')
+        cls.cabinet = Cabinet.objects.create(number='101', teacher=cls.teacher)
+        cls.other_cabinet = Cabinet.objects.create(number='202', teacher=cls.other)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.teacher, cabinet=cls.cabinet)
+        cls.lesson = Schedule.objects.create(
+            school_class=cls.school_class, subject=cls.math, cabinet=cls.cabinet,
+            teacher=cls.teacher, day_of_week=1, lesson_number=2,
+        )
+        cls.activity = ExtraActivity.objects.create(name='Шахматы', activity_type='sport', teacher=cls.other)
+        cls.extra = ExtraSchedule.objects.create(
+            activity=cls.activity, cabinet=cls.cabinet, day_of_week=3, lesson_number=10,
+        )
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        timetable.invalidate()
+        report_cache.invalidate()
+
+    def teacher_row(self, teacher):
+        return TeacherClassesSnapshot.objects.get(pk=teacher.pk)
+
+    def test_rows_built_from_signals(self):
+        row = self.teacher_row(self.teacher)
+        self.assertEqual((row.full_name, row.post, row.category), ('Белова Б.Б.', 'Учитель', 'Высшая'))
+        self.assertEqual(row.classes, [['5А', '101']])
+        self.assertEqual((row.classes_count, row.cabinet_numbers, row.cabinets_count), (1, '101', 1))
+        self.assertEqual(self.teacher_row(self.other).classes, [])
+
+        activity = ActivitySnapshot.objects.get(pk=self.activity.pk)
+        self.assertEqual((activity.teacher_name, activity.teacher_post), ('Чернов Ч.Ч.', 'Методист'))
+        self.assertEqual((activity.schedules, activity.schedule_count), ([[3, 10, '101']], 1))
+
+        lesson = LessonSnapshot.objects.get(pk=self.lesson.pk)
+        self.assertEqual(
+            (lesson.class_number, lesson.subject_name, lesson.teacher_name, lesson.cabinet_number),
+            ('5А', 'Математика', 'Белова Б.Б.', '101'),
+        )
+
+    def test_change_refreshes_only_affected_rows(self):
+        # Испорченная строка несвязанного учителя остается как есть
+        TeacherClassesSnapshot.objects.filter(pk=self.other.pk).update(full_name='не пересчитывалась')
+        self.cabinet.number = '303'
+        self.cabinet.save()
+        self.assertEqual(self.teacher_row(self.teacher).classes, [['5А', '303']])
+        self.assertEqual(self.teacher_row(self.other).full_name, 'не пересчитывалась')
+        self.assertEqual(ActivitySnapshot.objects.get(pk=self.activity.pk).schedules, [[3, 10, '303']])
+        self.assertEqual(LessonSnapshot.objects.get(pk=self.lesson.pk).cabinet_number, '303')
+
+        # Класс передали другому учителю: меняются строки прежнего и нового
+        self.school_class.teacher = self.other
+        self.school_class.save()
+        self.assertEqual(self.teacher_row(self.teacher).classes_count, 0)
+        row = self.teacher_row(self.other)
+        self.assertEqual((row.full_name, row.classes), ('Чернов Ч.Ч.', [['5А', '303']]))
+
+        self.extra.cabinet = self.other_cabinet
+        self.extra.save()
+        self.assertEqual(ActivitySnapshot.objects.get(pk=self.activity.pk).schedules, [[3, 10, '202']])
+
+    def test_delete_cascades(self):
+        self.extra.delete()
+        self.assertEqual(ActivitySnapshot.objects.get(pk=self.activity.pk).schedule_count, 0)
+
+        # Вместе с кабинетом удаляются класс и урок
+        self.cabinet.delete()
+        row = self.teacher_row(self.teacher)
+        self.assertEqual((row.classes, row.cabinet_numbers, row.cabinets_count), ([], '', 0))
+        self.assertFalse(LessonSnapshot.objects.exists())
+
+        self.other.delete()
+        self.assertFalse(TeacherClassesSnapshot.objects.filter(pk=self.other.pk).exists())
+        self.assertFalse(ActivitySnapshot.objects.exists())
+
+    def test_deleted_teacher_leaves_lesson_without_teacher(self):
+        # Schedule.teacher обнуляется UPDATE без сигналов урока
+        lesson = Schedule.objects.create(
+            school_class=self.school_class, subject=self.math, cabinet=self.cabinet,
+            teacher=self.other, day_of_week=2, lesson_number=1,
+        )
+        self.assertEqual(LessonSnapshot.objects.get(pk=lesson.pk).teacher_name, 'Чернов Ч.Ч.')
+        self.other.delete()
+        row = LessonSnapshot.objects.get(pk=lesson.pk)
+        self.assertEqual((row.teacher_id, row.teacher_name), (None, None))
+
+    def test_command_rebuilds(self):
+        TeacherClassesSnapshot.objects.all().delete()
+        LessonSnapshot.objects.update(subject_name='')
+        out = StringIO()
+        call_command('refresh_report_snapshots', stdout=out)
+        self.assertIn('teachers, activities, lessons', out.getvalue())
+        self.assertEqual(TeacherClassesSnapshot.objects.count(), 2)
+        self.assertEqual(LessonSnapshot.objects.get().subject_name, 'Математика')
+
+        call_command('refresh_report_snapshots', 'lessons', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('refresh_report_snapshots', 'students', stdout=StringIO())
+
+    def test_reports_read_snapshots(self):
+        self.client.force_login(self.user)
+        TeacherClassesSnapshot.objects.filter(pk=self.teacher.pk).update(classes=[['из снимка', '101']])
+        ActivitySnapshot.objects.filter(pk=self.activity.pk).update(teacher_name='Снимков С.С.')
+        LessonSnapshot.objects.filter(pk=self.lesson.pk).update(subject_name='Геометрия-снимок')
+
+        self.assertContains(self.client.get(reverse('admin:teachers_classes_report')), 'из снимка')
+        self.assertContains(self.client.get(reverse('admin:extra_activities_report')), 'Снимков С.С.')
+        self.assertContains(self.client.get(reverse('admin:schedule_report')), 'Геометрия-снимок')
+        response = self.client.get(reverse('admin:teachers_classes_report'), {'has_classes': 'no'})
+        self.assertNotContains(response, 'из снимка')
+        self.assertContains(response, 'Чернов Ч.Ч.')
+
+
+@mock.patch('main.workload.MIN_LESSONS', 2)
+@mock.patch('main.workload.MAX_LESSONS', 3)
+class WorkloadReportTests(TestCase):
+    """Отчет о нагрузке учителей по урокам и дополнительным занятиям"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.busy = Teacher.objects.create(full_name='Астахова А.А.', post='Учитель')
+        cls.normal = Teacher.objects.create(full_name='Борисов Б.Б.', post='Учитель')
+        cls.idle = Teacher.objects.create(full_name='Власов В.В.', post='Методист')
+        math = Subject.objects.create(full_name='Математика')
+        physics = Subject.objects.create(full_name='Физика')
+        cabinet = Cabinet.objects.create(number='101', teacher=cls.busy)
+        school_class = SchoolGroup.objects.create(number='5А', teacher=cls.busy, cabinet=cabinet)
+        slots = [
+            (cls.busy, math, 1, 1), (cls.busy, math, 1, 2), (cls.busy, physics, 2, 1), (cls.busy, math, 3, 1),
+            (cls.normal, physics, 2, 2), (cls.normal, physics, 4, 1),
+        ]
+        for teacher, subject, day, lesson_number in slots:
+            Schedule.objects.create(school_class=school_class, subject=subject, cabinet=cabinet,
+                                    teacher=teacher, day_of_week=day, lesson_number=lesson_number)
+        # Урок без подходящего учителя
+        Schedule.objects.create(school_class=school_class, subject=Subject.objects.create(full_name='ОБЖ'),
+                                cabinet=cabinet, day_of_week=5, lesson_number=1)
+        chess = ExtraActivity.objects.create(name='Шахматы', teacher=cls.idle)
+        ExtraSchedule.objects.create(activity=chess, cabinet=cabinet, day_of_week=6, lesson_number=10)
+        closed = ExtraActivity.objects.create(name='Хор', teacher=cls.idle, is_active=False)
+        ExtraSchedule.objects.create(activity=closed, cabinet=cabinet, day_of_week=6, lesson_number=11)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        report_cache.invalidate()
+        self.client.force_login(self.user)
+
+    def test_counts_and_flags(self):
+        rows = {row.id: row for row in workload.Workload.load().rows}
+        busy = rows[self.busy.pk]
+        self.assertEqual((busy.lessons, busy.extra, busy.days), (4, 0, [2, 1, 1, 0, 0, 0]))
+        self.assertEqual(busy.subjects, [('Математика', 3), ('Физика', 1)])
+        self.assertEqual(busy.status, workload.OVERLOAD)
+        self.assertEqual(rows[self.normal.pk].status, workload.NORMAL)
+        idle = rows[self.idle.pk]
+        # Неактивные занятия в нагрузку не входят
+        self.assertEqual((idle.lessons, idle.extra, idle.total, idle.status), (0, 1, 1, workload.UNDERLOAD))
+
+    def test_queries_do_not_depend_on_teachers(self):
+        with self.assertNumQueries(4):
+            workload.Workload.load()
+        Teacher.objects.bulk_create([Teacher(full_name=f'Учитель {i:03d}', post='Учитель') for i in range(300)])
+        with self.assertNumQueries(4):
+            self.assertEqual(len(workload.Workload.load().rows), 303)
+
+    def test_report(self):
+        response = self.client.get(reverse('admin:workload_report'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.context['total_teachers'], response.context['overloaded'],
+             response.context['normal_load'], response.context['underloaded']),
+            (3, 1, 1, 1),
+        )
+        self.assertEqual(response.context['unassigned_lessons'], 1)
+        self.assertContains(response, 'Математика (3)')
+
+        response = self.client.get(reverse('admin:workload_report'), {'load': 'over'})
+        self.assertEqual([row.full_name for row in response.context['teacher_data']], ['Астахова А.А.'])
+
+        lines = b''.join(self.client.get(
+            reverse('admin:workload_report'), {'load': 'under', 'download': 'csv'},
+        ).streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[1], 'Власов В.В.;Методист;0;0;0;0;0;0;;0;1;1;Недогрузка')
+
+    @mock.patch('main.pagination.PAGE_SIZE', 2)
+    def test_fragments(self):
+        response = self.client.get(reverse('admin:workload_report'))
+        self.assertEqual(len(response.context['teacher_data']), 2)
+        fragment = self.client.get(reverse('admin:workload_report'), {'after': response.context['page'].next_cursor})
+        self.assertEqual([row.full_name for row in fragment.context['teacher_data']], ['Власов В.В.'])
+        self.assertIsNone(fragment.context['page'].next_cursor)
+
+
+class TimetableGeneratorTests(TestCase):
+    """Генератор расписания по учебному плану"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.homeroom = Teacher.objects.create(full_name='Алексеева А.А.', post='Учитель')
+        cls.other = Teacher.objects.create(full_name='Борисов Б.Б.', post='Учитель')
+        cls.math = Subject.objects.create(full_name='Математика')
+        cls.physics = Subject.objects.create(full_name='Физика')
+        for teacher, subject in [(cls.homeroom, cls.math), (cls.other, cls.math), (cls.other, cls.physics)]:
+            TeacherSubject.objects.create(teacher=teacher, subject=subject)
+        cls.cabinet = Cabinet.objects.create(number='101', teacher=cls.homeroom)
+        cls.spare = Cabinet.objects.create(number='102', teacher=cls.other)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.homeroom, cabinet=cls.cabinet)
+        cls.other_class = SchoolGroup.objects.create(number='6Б', teacher=cls.other, cabinet=cls.spare)
+        StudyPlan.objects.create(school_class=cls.school_class, subject=cls.math, lessons_per_week=5)
+        StudyPlan.objects.create(school_class=cls.school_class, subject=cls.physics, lessons_per_week=3)
+        # Урок другого класса и кружок занимают учителя физики в понедельник
+        cls.fixed = Schedule.objects.create(school_class=cls.other_class, subject=cls.physics, cabinet=cls.spare,
+                                            teacher=cls.other, day_of_week=1, lesson_number=1)
+        chess = ExtraActivity.objects.create(name='Шахматы', teacher=cls.other)
+        ExtraSchedule.objects.create(activity=chess, cabinet=cls.spare, day_of_week=1, lesson_number=3)
+        Schedule.objects.create(school_class=cls.school_class, subject=cls.math, cabinet=cls.cabinet,
+                                teacher=cls.homeroom, day_of_week=6, lesson_number=9, info='Старый урок')
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def test_synthetic_school_without_conflicts(self):
+        result = generator.generate(generator.synthetic_problem(30))
+        self.assertEqual(len(result.lessons), 30 * sum(generator.BENCHMARK_PLAN))
+        self.assertEqual((result.unplaced, result.conflicts()), ([], []))
+
+    def test_tight_school_repaired_by_local_search(self):
+        result = generator.generate(generator.synthetic_problem(30, plan=generator.TIGHT_PLAN, fill=0.9))
+        self.assertGreater(result.repairs, 0)
+        self.assertEqual((result.unplaced, result.conflicts()), ([], []))
+
+    def test_impossible_plan_terminates(self):
+        # Уроков больше, чем слотов в неделе
+        problem = generator.Problem([(1, 1, generator.SLOTS + 6)], {1: [1]}, [1, 2])
+        result = generator.generate(problem)
+        self.assertEqual(len(result.placed), generator.SLOTS)
+        self.assertEqual(len(result.unplaced), 6)
+        self.assertEqual(result.conflicts(), [])
+
+    def test_from_db_respects_fixed_time(self):
+        problem = generator.Problem.from_db({self.school_class.pk})
+        self.assertEqual(problem.class_ids, [self.school_class.pk])
+        # Кружок 9:50-10:35 по своим звонкам занимает 2 и 3 уроки
+        busy = [bit for bit in range(generator.SLOTS) if problem.teacher_busy[self.other.pk] >> bit & 1]
+        self.assertEqual(busy, [generator.slot_bit(1, 1), generator.slot_bit(1, 2), generator.slot_bit(1, 3)])
+
+        result = generator.generate(problem)
+        teachers = {lesson.subject_id: lesson.teacher_id for lesson in result.placed}
+        # Математику ведет классный руководитель
+        self.assertEqual(teachers, {self.math.pk: self.homeroom.pk, self.physics.pk: self.other.pk})
+        self.assertEqual({lesson.cabinet_id for lesson in result.placed}, {self.cabinet.pk})
+        self.assertEqual(len(result.placed), 8)
+
+    def test_apply_replaces_class_lessons(self):
+        grid, stamp = timetable.get_grid(), stamps.get_global()
+        with self.captureOnCommitCallbacks(execute=True):
+            generator.apply(generator.generate(generator.Problem.from_db({self.school_class.pk})))
+            # Кэши сбрасываются один раз и только после фиксации
+            self.assertIs(timetable.get_grid(), grid)
+        self.assertIsNot(timetable.get_grid(), grid)
+        self.assertNotEqual(stamps.get_global(), stamp)
+        self.assertEqual(Schedule.objects.filter(school_class=self.school_class).count(), 8)
+        self.assertFalse(Schedule.objects.filter(info='Старый урок').exists())
+        self.assertTrue(Schedule.objects.filter(pk=self.fixed.pk).exists())
+        self.assertEqual(find_all_conflicts(), [])
+        # Снимок уроков пересобран, хотя bulk-операции не отправляют сигналы
+        self.assertEqual(LessonSnapshot.objects.filter(school_class_id=self.school_class.pk).count(), 8)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('generate_timetable', '5А', '--dry-run', stdout=out)
+        self.assertIn('уроков поставлено: 8 из 8', out.getvalue())
+        self.assertTrue(Schedule.objects.filter(info='Старый урок').exists())
+        with self.assertRaises(CommandError):
+            call_command('generate_timetable', '11Я', stdout=StringIO())
+
+        out = StringIO()
+        call_command('benchmark_timetable_generator', '--sizes', '10', '30', '--repeat', '1', stdout=out)
+        self.assertIn('не поставлено', out.getvalue())
+        # Тесный профиль по умолчанию доходит до локального поиска
+        tight = [line.split() for line in out.getvalue().splitlines() if line.startswith('tight')]
+        self.assertEqual(len(tight), 2)
+        self.assertGreater(int(tight[-1][-2]), 0)
+
+    def test_admin_action(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:main_studyplan_changelist'), {
+            'action': 'generate_timetable',
+            '_selected_action': list(StudyPlan.objects.values_list('pk', flat=True)),
+        }, follow=True)
+        self.assertContains(response, 'Расписание составлено')
+        self.assertEqual(Schedule.objects.filter(school_class=self.school_class).count(), 8)
+
+    def test_admin_action_refuses_conflicts(self):
+        self.client.force_login(self.user)
+        lessons = list(Schedule.objects.filter(school_class=self.school_class).values_list('pk', flat=True))
+        with mock.patch.object(generator.Result, 'conflicts', return_value=[('teacher', 1, 1)]):
+            response = self.client.post(reverse('admin:main_studyplan_changelist'), {
+                'action': 'generate_timetable',
+                '_selected_action': list(StudyPlan.objects.values_list('pk', flat=True)),
+            }, follow=True)
+        self.assertContains(response, 'Генератор вернул накладки: 1, расписание не изменено')
+        self.assertEqual(list(Schedule.objects.filter(school_class=self.school_class).values_list('pk', flat=True)),
+                         lessons)
+
+
+class FreeResourceTests(TestCase):
+    """Поиск свободных кабинетов и учителей по индексу занятости"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.math_teacher = Teacher.objects.create(full_name='Андреева А.А.', post='Учитель')
+        cls.coach = Teacher.objects.create(full_name='Борисов Б.Б.', post='Учитель')
+        cls.spare_teacher = Teacher.objects.create(full_name='Васильев В.В.', post='Учитель')
+        cls.math = Subject.objects.create(full_name='Математика')
+        for teacher in (cls.math_teacher, cls.spare_teacher):
+            TeacherSubject.objects.create(teacher=teacher, subject=cls.math)
+        cls.first = Cabinet.objects.create(number='101', teacher=cls.math_teacher)
+        cls.second = Cabinet.objects.create(number='102', teacher=cls.coach)
+        cls.gym = Cabinet.objects.create(number='Спортзал', teacher=cls.coach)
+        cls.school_class = SchoolGroup.objects.create(number='5А', teacher=cls.math_teacher, cabinet=cls.first)
+        cls.lesson = Schedule.objects.create(school_class=cls.school_class, subject=cls.math, cabinet=cls.first,
+                                             teacher=cls.math_teacher, day_of_week=1, lesson_number=2)
+        # Кружок 9:50-10:35 по своим звонкам занимает 2 и 3 уроки
+        cls.activity = ExtraActivity.objects.create(name='Баскетбол', activity_type='sport', teacher=cls.coach)
+        cls.extra = ExtraSchedule.objects.create(activity=cls.activity, cabinet=cls.gym,
+                                                 day_of_week=1, lesson_number=3)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def setUp(self):
+        # Индекс живет в памяти процесса, а откат транзакции теста сигналов не отправляет
+        occupancy.invalidate()
+
+    def free(self, grid, day, number, subject=None):
+        index = occupancy.get_index()
+        return ([number for _, number in index.free_cabinets(grid, day, number)],
+                [name for _, name in index.free_teachers(grid, day, number, subject)])
+
+    def test_free_resources(self):
+        self.assertEqual(self.free('schedule', 1, 2), (['102'], ['Васильев В.В.']))
+        self.assertEqual(self.free('schedule', 1, 3), (['101', '102'], ['Андреева А.А.', 'Васильев В.В.']))
+        # Кружок по своей сетке звонков пересекается с уроками, но не с 1 уроком
+        self.assertEqual(self.free('extra', 1, 3)[1], ['Васильев В.В.'])
+        self.assertEqual(self.free('schedule', 1, 1)[0], ['101', '102', 'Спортзал'])
+        self.assertEqual(self.free('schedule', 2, 2)[1], ['Андреева А.А.', 'Борисов Б.Б.', 'Васильев В.В.'])
+        self.assertEqual(self.free('schedule', 1, 3, self.math.pk)[1], ['Андреева А.А.', 'Васильев В.В.'])
+        self.assertEqual(self.free('schedule', 1, 3, 999999)[1], [])
+        self.assertEqual(self.free('schedule', 1, 10), ([], []))
+
+    def test_inactive_activity_is_free(self):
+        self.activity.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.activity.save()
+        self.assertIn('Борисов Б.Б.', self.free('schedule', 1, 3)[1])
+
+    def test_lesson_changes_update_index_in_place(self):
+        index = occupancy.get_index()
+        self.lesson.day_of_week = 2
+        self.lesson.cabinet = self.second
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.save()
+        self.assertIs(occupancy.get_index(), index)
+        self.assertEqual(self.free('schedule', 1, 2), (['101', '102'], ['Андреева А.А.', 'Васильев В.В.']))
+        self.assertEqual(self.free('schedule', 2, 2), (['101', 'Спортзал'], ['Борисов Б.Б.', 'Васильев В.В.']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.extra.delete()
+        self.assertIs(occupancy.get_index(), index)
+        self.assertIn('Спортзал', self.free('schedule', 1, 2)[0])
+        self.assertIn('Борисов Б.Б.', self.free('schedule', 1, 2)[1])
+
+    def test_index_changes_after_commit(self):
+        index = occupancy.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Schedule.objects.create(school_class=self.school_class, subject=self.math, cabinet=self.second,
+                                    teacher=self.spare_teacher, day_of_week=1, lesson_number=2)
+            self.assertEqual(self.free('schedule', 1, 2), (['102'], ['Васильев В.В.']))
+        self.assertIs(occupancy.get_index(), index)
+        self.assertEqual(self.free('schedule', 1, 2), ([], []))
+
+    def test_api(self):
+        url = reverse('api_free_resources')
+        self.client.get(url, {'day': 1, 'lesson': 2})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'day': 1, 'lesson': 2, 'subject': self.math.pk})
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        data = response.json()
+        self.assertEqual((data['grid'], data['subject']), ('schedule', self.math.pk))
+        self.assertEqual(data['cabinets']['rows'], [[self.second.pk, '102']])
+        self.assertEqual(data['teachers']['rows'], [[self.spare_teacher.pk, 'Васильев В.В.']])
+
+        data = self.client.get(url, {'day': 1, 'lesson': 11, 'grid': 'extra'}).json()
+        self.assertEqual(len(data['teachers']['rows']), 3)
+        for params in [{'day': 1}, {'day': 7, 'lesson': 1}, {'day': 1, 'lesson': 10}, {'day': 1, 'lesson': 1, 'grid': 'x'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_admin_page(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('admin:main_schedule_changelist')), 'Свободные кабинеты')
+        response = self.client.get(reverse('admin:main_schedule_free_resources'), {'day': 1, 'lesson': 2})
+        self.assertContains(response, 'Свободные кабинеты: 1')
+        self.assertContains(response, 'Васильев В.В.')
+
+
+class EnrollmentTests(TestCase):
+    """Запись на дополнительные занятия: места, лист ожидания и повторы запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = Teacher.objects.create(full_name='Андреева А.А.', post='Учитель')
+        cabinet = Cabinet.objects.create(number='101', teacher=teacher)
+        school_class = SchoolGroup.objects.create(number='5А', teacher=teacher, cabinet=cabinet)
+        cls.activity = ExtraActivity.objects.create(name='Шахматы', teacher=teacher, max_students=2)
+        cls.students = [
+            Student.objects.create(full_name=f'Ученик {i}', phone=f'8900000000{i}', school_class=school_class)
+            for i in range(4)
+        ]
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+
+    def enroll(self, student, key=None, **extra):
+        return self.client.post(reverse('api_enroll'), {
+            'activity': self.activity.pk, 'student': student.pk, 'phone': student.phone, 'key': key or f'k{student.pk}',
+            **extra,
+        })
+
+    def seats(self):
+        self.activity.refresh_from_db()
+        return self.activity.seats_taken
+
+    def test_seats_then_waitlist(self):
+        statuses = [enrollment.enroll(self.activity.pk, student.pk, f'k{i}')[0].status
+                    for i, student in enumerate(self.students)]
+        self.assertEqual(statuses, [Enrollment.ENROLLED] * 2 + [Enrollment.WAITLIST] * 2)
+        self.assertEqual(self.seats(), 2)
+        last = Enrollment.objects.get(student=self.students[3])
+        self.assertEqual(enrollment.waitlist_position(last), 2)
+
+    def test_cancel_promotes_waitlist(self):
+        items = [enrollment.enroll(self.activity.pk, student.pk, f'k{i}')[0] for i, student in enumerate(self.students)]
+        enrollment.cancel(items[0])
+        self.assertEqual(
+            list(Enrollment.objects.order_by('id').values_list('status', flat=True)),
+            [Enrollment.CANCELLED, Enrollment.ENROLLED, Enrollment.ENROLLED, Enrollment.WAITLIST],
+        )
+        self.assertEqual(self.seats(), 2)
+        # Удаление ученика освобождает место каскадом
+        self.students[1].delete()
+        self.assertEqual(Enrollment.objects.get(student=self.students[3]).status, Enrollment.ENROLLED)
+        self.assertEqual(self.seats(), 2)
+        # Отмененная запись не мешает записаться снова
+        self.assertEqual(enrollment.enroll(self.activity.pk, self.students[0].pk, 'again')[1], False)
+
+    def test_more_seats_promote_waitlist(self):
+        for i, student in enumerate(self.students):
+            enrollment.enroll(self.activity.pk, student.pk, f'k{i}')
+        self.activity.max_students = 3
+        self.activity.save()
+        self.assertEqual(Enrollment.objects.filter(status=Enrollment.ENROLLED).count(), 3)
+        self.assertEqual(self.seats(), 3)
+
+    def test_admin_save_keeps_counter(self):
+        stale = ExtraActivity.objects.get(pk=self.activity.pk)
+        enrollment.enroll(self.activity.pk, self.students[0].pk, 'k')
+        stale.name = 'Шахматы и шашки'
+        stale.save()
+        self.assertEqual(self.seats(), 1)
+
+    def test_api(self):
+        response = self.enroll(self.students[0], 'abc')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], Enrollment.ENROLLED)
+        # Повтор с тем же ключом: та же запись, место не занимается второй раз
+        replay = self.enroll(self.students[0], 'abc')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(self.seats(), 1)
+
+        self.enroll(self.students[1])
+        response = self.client.post(reverse('api_enroll'), {
+            'activity': self.activity.pk, 'student': self.students[2].pk, 'phone': '8 (900) 000-00-02',
+        }, HTTP_IDEMPOTENCY_KEY='header-key')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['status'], response.json()['position']), (Enrollment.WAITLIST, 1))
+        self.assertEqual(Enrollment.objects.get(student=self.students[2]).idempotency_key, 'header-key')
+
+        self.assertEqual(self.enroll(self.students[3], 'abc').status_code, 409)
+        self.assertEqual(self.enroll(self.students[3], phone='89999999999').status_code, 404)
+        self.assertEqual(self.enroll(self.students[3], activity=999999).status_code, 404)
+        self.assertEqual(self.enroll(self.students[3], activity='x').status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_enroll')).status_code, 405)
+
+    def test_inactive_activity_closed(self):
+        self.activity.is_active = False
+        self.activity.save()
+        with self.assertRaises(enrollment.ActivityClosed):
+            enrollment.enroll(self.activity.pk, self.students[0].pk, 'k')
+        self.assertFalse(Enrollment.objects.exists())
+
+    def test_admin_cancel_action(self):
+        items = [enrollment.enroll(self.activity.pk, student.pk, f'k{i}')[0] for i, student in enumerate(self.students)]
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:main_enrollment_changelist'), {
+            'action': 'cancel_enrollments', '_selected_action': [items[0].pk, items[3].pk],
+        }, follow=True)
+        self.assertContains(response, 'Отменено записей: 2')
+        self.assertEqual(Enrollment.objects.get(pk=items[2].pk).status, Enrollment.ENROLLED)
+        self.assertEqual(self.seats(), 2)
+
+
+class OccupancyProcessTests(TransactionTestCase):
+    """Изменения расписания из другого процесса доходят до индекса занятости этого"""
+
+    # Другой процесс: отдельный интерпретатор с теми же настройками и тестовой БД
+    SCRIPT = (
+        'import sys\n'
+        'import django\n'
+        'from django.conf import settings\n'
+        'settings.DATABASES["default"]["NAME"] = sys.argv[1]\n'
+        'django.setup()\n'
+        'from main.models import Schedule\n'
+        'class_id, subject_id, cabinet_id, teacher_id = map(int, sys.argv[2:])\n'
+        'Schedule.objects.create(school_class_id=class_id, subject_id=subject_id, cabinet_id=cabinet_id,\n'
+        '                        teacher_id=teacher_id, day_of_week=1, lesson_number=2)\n'
+    )
+
+    def setUp(self):
+        self.teacher = Teacher.objects.create(full_name='Андреева А.А.', post='Учитель')
+        self.subject = Subject.objects.create(full_name='Математика')
+        self.cabinet = Cabinet.objects.create(number='101', teacher=self.teacher)
+        self.school_class = SchoolGroup.objects.create(number='5А', teacher=self.teacher, cabinet=self.cabinet)
+
+    def test_lesson_saved_by_other_process(self):
+        index = occupancy.get_index()
+        self.assertEqual([number for _, number in index.free_cabinets('schedule', 1, 2)], ['101'])
+        subprocess.run(
+            [sys.executable, '-c', self.SCRIPT, str(connection.settings_dict['NAME']),
+             *map(str, [self.school_class.pk, self.subject.pk, self.cabinet.pk, self.teacher.pk])],
+            cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'school_web.settings'},
+            check=True, timeout=60,
+        )
+        self.assertIsNot(occupancy.get_index(), index)
+        self.assertEqual(occupancy.get_index().free_cabinets('schedule', 1, 2), [])
+        self.assertEqual(occupancy.get_index().free_teachers('schedule', 1, 2), [])
+
+
+class ConcurrentEnrollmentTests(TransactionTestCase):
+    """Одновременная запись сотен учеников не выдает мест больше max_students"""
+
+    REQUESTS = 500
+
+    def setUp(self):
+        teacher = Teacher.objects.create(full_name='Андреева А.А.', post='Учитель')
+        cabinet = Cabinet.objects.create(number='101', teacher=teacher)
+        school_class = SchoolGroup.objects.create(number='5А', teacher=teacher, cabinet=cabinet)
+        self.activity = ExtraActivity.objects.create(name='Шахматы', teacher=teacher, max_students=30)
+        self.students = Student.objects.bulk_create([
+            Student(full_name=f'Ученик {i}', phone=f'89{i:09d}', school_class=school_class)
+            for i in range(self.REQUESTS // 2)
+        ])
+        # 500 потоков одного процесса стоят в очереди на запись дольше busy_timeout
+        # по умолчанию: запросы по очереди получают GIL, пока держат блокировку
+        options = settings.DATABASES['default'].setdefault('OPTIONS', {})
+        patcher = mock.patch.dict(options, {
+            'timeout': 120,
+            'init_command': re.sub(r'busy_timeout=\d+', 'busy_timeout=120000', options.get('init_command', '')),
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_overbooking(self):
+        # Каждого ученика записывают дважды с одним ключом - как при повторе после обрыва связи
+        barrier = threading.Barrier(self.REQUESTS, timeout=60)
+        statuses = [None] * self.REQUESTS
+
+        def request(i):
+            student = self.students[i // 2]
+            try:
+                barrier.wait()
+                statuses[i] = self.client_class().post(reverse('api_enroll'), {
+                    'activity': self.activity.pk, 'student': student.pk, 'phone': student.phone,
+                    'key': f'key-{student.pk}',
+                }).status_code
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(self.REQUESTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(set(statuses)), [200, 201])
+        self.assertEqual(statuses.count(201), len(self.students))
+        self.activity.refresh_from_db()
+        self.assertEqual(self.activity.seats_taken, 30)
+        self.assertEqual(Enrollment.objects.filter(status=Enrollment.ENROLLED).count(), 30)
+        self.assertEqual(Enrollment.objects.filter(status=Enrollment.WAITLIST).count(), len(self.students) - 30)
+
+
+class LoadTestTests(TransactionTestCase):
+    """Нагрузочный тест страниц: метрики, сохранение и сравнение результатов"""
+
+    def setUp(self):
+        populate_school(teachers=20, classes=4, students=40, schedules=60, subjects=6,
+                        activities=4, extra_schedules=8, enrollments=10)
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        report_cache.invalidate()
+
+    def test_command_saves_and_compares(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'baseline.json')
+        out = StringIO()
+        call_command('load_test', '--current', '--workers', '3', '--requests', '6', '--save', path, stdout=out)
+
+        document = loadtest.load(path)
+        self.assertEqual(set(document['results']), {target.name for target in loadtest.targets()})
+        self.assertEqual((document['workers'], document['requests'], document['dataset']), (3, 6, None))
+        for name, result in document['results'].items():
+            self.assertEqual((result['requests'], result['errors']), (6, 0), name)
+            self.assertLessEqual(result['p50'], result['p95'])
+            self.assertLessEqual(result['p95'], result['p99'])
+            self.assertGreater(result['throughput'], 0)
+        # Каждая отправка формы создала задачу: 6 замеренных и 3 прогревочных
+        self.assertEqual(Task.objects.count(), 9)
+
+        call_command('load_test', 'teachers_report', '--current', '--workers', '2', '--requests', '4',
+                     '--compare', path, stdout=out)
+        self.assertIn('Сравнение с результатами', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('load_test', 'unknown', '--current', stdout=StringIO())
+
+    def test_diff_reports_regressions(self):
+        old = {'index': {'p95': 10.0, 'queries': 1.0}, 'about': {'p95': 10.0, 'queries': 0.0}}
+        new = {'index': {'p95': 13.0, 'queries': 1.0}, 'about': {'p95': 11.0, 'queries': 2.0}, 'create': {}}
+        rows, regressions = loadtest.diff(new, old, threshold=20)
+        self.assertEqual([row[0] for row in rows], ['index', 'about'])
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('index: p95', regressions[0])
+        self.assertIn('about: SQL', regressions[1])
+        self.assertEqual(loadtest.diff(new, old)[1], regressions[1:])
+
+    def test_diff_reports_errors(self):
+        old = {'index': {'p95': 10.0, 'queries': 1.0, 'errors': 0}}
+        new = {'index': {'p95': 5.0, 'queries': 1.0, 'errors': 3}}
+        self.assertEqual(loadtest.diff(new, old)[1], ['index: ошибок 0 -> 3'])
+        # Ошибки остаются регрессией, даже если были и в прошлый раз
+        self.assertEqual(loadtest.diff(new, new)[1], ['index: ошибок 3 -> 3'])
+
+    def test_command_fails_on_errors(self):
+        missing = [loadtest.Target('missing', '/no-such-page/')]
+        out = StringIO()
+        with mock.patch('main.loadtest.targets', return_value=missing):
+            with self.assertRaisesMessage(CommandError, 'missing'):
+                call_command('load_test', '--current', '--workers', '1', '--requests', '2', stdout=out)
+        self.assertIn('missing', out.getvalue())
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([loadtest.percentile(values, q) for q in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(loadtest.percentile([], 50), 0.0)
 
-# Create your tests here.
@@ -0,0 +1,161 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from .models import LessonSnapshot, Schedule, SchoolGroup, Subject
+
+# Сетка расписания в памяти процесса: все уроки загружаются одним запросом
+# в плоский массив с индексом (день недели, номер урока, класс).
+
+DAY_CHOICES = Schedule._meta.get_field('day_of_week').choices
+DAY_NAMES = dict(DAY_CHOICES)
+LESSON_NUMBERS = [number for number, _ in Schedule.LESSON_CHOICES]
+# Время урока без префикса "N урок", например "(8:30-9:10)"
+LESSON_TIMES = {number: label[7:] for number, label in Schedule.LESSON_CHOICES}
+
+VERSION_KEY = 'timetable_grid_version'
+
+
+class GridLesson:
+    """Урок в сетке: только поля, нужные отчету, без моделей Django"""
+    __slots__ = (
+        'id', 'day_of_week', 'lesson_number', 'school_class_id', 'subject_id',
+        'subject_name', 'teacher_name', 'cabinet_number', 'info',
+    )
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @property
+    def time(self):
+        return LESSON_TIMES.get(self.lesson_number, '')
+
+
+class GridClass:
+    __slots__ = ('id', 'number')
+
+    def __init__(self, id, number):
+        self.id = id
+        self.number = number
+
+
+class TimetableGrid:
+    """Расписание уроков с доступом к ячейке (день, урок, класс) за O(1)"""
+
+    def __init__(self, lessons, classes, subjects):
+        self.classes = classes
+        self.subjects = subjects
+        self.class_index = {school_class.id: i for i, school_class in enumerate(classes)}
+        self.lesson_index = {number: i for i, number in enumerate(LESSON_NUMBERS)}
+        self.day_index = {day: i for i, (day, _) in enumerate(DAY_CHOICES)}
+        self.cells = [None] * (len(DAY_CHOICES) * len(LESSON_NUMBERS) * len(classes))
+        self.size = 0
+
+        for lesson in lessons:
+            position = self._position(lesson.day_of_week, lesson.lesson_number, lesson.school_class_id)
+            if position is None:
+                continue
+            # В ячейке обычно один урок, список нужен для накладок в расписании
+            if self.cells[position] is None:
+                self.cells[position] = [lesson]
+            else:
+                self.cells[position].append(lesson)
+            self.size += 1
+
+    @classmethod
+    def load(cls):
+        # Уроки из снимка: названия уже в строке, без JOIN с четырьмя таблицами
+        lessons = [
+            GridLesson(*row) for row in LessonSnapshot.objects.values_list(
+                'lesson_id', 'day_of_week', 'lesson_number', 'school_class_id', 'subject_id',
+                'subject_name', 'teacher_name', 'cabinet_number', 'info',
+            ).order_by()
+        ]
+        classes = [GridClass(*row) for row in SchoolGroup.objects.order_by('number').values_list('id', 'number')]
+        subjects = list(Subject.objects.order_by('full_name').only('id', 'full_name'))
+        return cls(lessons, classes, subjects)
+
+    def _position(self, day, lesson_number, class_id):
+        day_i = self.day_index.get(day)
+        lesson_i = self.lesson_index.get(lesson_number)
+        class_i = self.class_index.get(class_id)
+        if day_i is None or lesson_i is None or class_i is None:
+            return None
+        return (day_i * len(LESSON_NUMBERS) + lesson_i) * len(self.classes) + class_i
+
+    def slot(self, day, lesson_number, class_id):
+        """Уроки класса в указанный день и урок"""
+        position = self._position(day, lesson_number, class_id)
+        if position is None:
+            return []
+        return self.cells[position] or []
+
+    def report(self, day=None, class_id=None, subject_id=None):
+        """Группировка для отчета и статистика за один проход по сетке"""
+        days = [d for d, _ in DAY_CHOICES if day is None or d == day]
+        if class_id is None:
+            classes = self.classes
+        else:
+            classes = [c for c in self.classes if c.id == class_id]
+
+        schedule_by_day = {}
+        day_counts = {}
+        class_counts = {}
+        total = 0
+        for d in days:
+            by_class = {}
+            for school_class in classes:
+                lessons = []
+                for lesson_number in LESSON_NUMBERS:
+                    for lesson in self.slot(d, lesson_number, school_class.id):
+                        if subject_id is None or lesson.subject_id == subject_id:
+                            lessons.append(lesson)
+                if lessons:
+                    by_class[school_class.number] = lessons
+                    class_counts[school_class.number] = class_counts.get(school_class.number, 0) + len(lessons)
+                    day_counts[d] = day_counts.get(d, 0) + len(lessons)
+                    total += len(lessons)
+            if by_class:
+                schedule_by_day[DAY_NAMES[d]] = by_class
+
+        return {
+            'schedule_by_day': schedule_by_day,
+            'sorted_days': list(schedule_by_day),
+            'total_lessons': total,
+            'day_stats': [{'day_of_week': d, 'count': n} for d, n in sorted(day_counts.items())],
+            'class_stats': [
+                {'school_class__number': c.number, 'count': class_counts[c.number]}
+                for c in self.classes if c.number in class_counts
+            ],
+        }
+
+
+_lock = threading.Lock()
+_grid = None
+_grid_version = None
+
+
+def get_grid():
+    """Возвращает актуальную сетку, перестраивая ее после изменения расписания"""
+    global _grid, _grid_version
+    # Версия хранится в общем кэше Django (settings.CACHES), поэтому сброс
+    # в любом процессе или команде manage.py виден всем процессам сервера
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    with _lock:
+        if _grid is None or _grid_version != version:
+            _grid = TimetableGrid.load()
+            _grid_version = version
+        return _grid
+
+
+def invalidate():
+    """Новая версия сетки; вызывается после фиксации транзакции с изменениями"""
+    global _grid
+    with _lock:
+        _grid = None
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
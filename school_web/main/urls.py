@@ -1,8 +1,17 @@
 from django.urls import path, include
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.index, name='home'),
     path('about-us', views.about, name='about'),
     path('create', views.create, name='create'),
+    path('api/timetable/', api.timetable_index, name='api_timetable_index'),
+    path('api/timetable/class/<int:pk>/', api.timetable, {'kind': 'class'}, name='api_class_timetable'),
+    path('api/timetable/teacher/<int:pk>/', api.timetable, {'kind': 'teacher'}, name='api_teacher_timetable'),
+    path('api/timetable/cabinet/<int:pk>/', api.timetable, {'kind': 'cabinet'}, name='api_cabinet_timetable'),
+    path('api/free/', api.free_resources, name='api_free_resources'),
+    path('api/enroll/', api.enroll_activity, name='api_enroll'),
+    path('calendar/class/<int:pk>.ics', api.timetable_ics, {'kind': 'class'}, name='class_calendar'),
+    path('calendar/teacher/<int:pk>.ics', api.timetable_ics, {'kind': 'teacher'}, name='teacher_calendar'),
+    path('calendar/cabinet/<int:pk>.ics', api.timetable_ics, {'kind': 'cabinet'}, name='cabinet_calendar'),
 ]
\ No newline at end of file
@@ -0,0 +1,119 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import ExtraSchedule, LessonSnapshot, Teacher
+from .timetable import DAY_CHOICES
+
+# Недельная нагрузка учителей по урокам расписания и дополнительным занятиям.
+# Группировки по учителю и дню, учителю и предмету и по учителю для
+# дополнительных занятий считает сама БД (GROUP BY) - по запросу на каждую,
+# а не на каждого учителя. Python только раскладывает готовые счетчики по строкам.
+
+# Норма уроков в неделю: меньше - недогрузка, больше - перегрузка
+MIN_LESSONS = getattr(settings, 'WORKLOAD_MIN_LESSONS', 18)
+MAX_LESSONS = getattr(settings, 'WORKLOAD_MAX_LESSONS', 27)
+
+UNDERLOAD, NORMAL, OVERLOAD = 'under', 'normal', 'over'
+STATUS_NAMES = {UNDERLOAD: 'Недогрузка', NORMAL: 'Норма', OVERLOAD: 'Перегрузка'}
+
+DAYS = [day for day, _ in DAY_CHOICES]
+
+
+def status_of(lessons):
+    if lessons < MIN_LESSONS:
+        return UNDERLOAD
+    if lessons > MAX_LESSONS:
+        return OVERLOAD
+    return NORMAL
+
+
+class TeacherWorkload:
+    """Строка отчета: нагрузка одного учителя"""
+    __slots__ = ('id', 'full_name', 'post', 'lessons', 'extra', 'days', 'subjects', 'status')
+
+    def __init__(self, id, full_name, post, lessons, extra, days, subjects):
+        self.id = id
+        self.full_name = full_name
+        self.post = post
+        self.lessons = lessons
+        self.extra = extra
+        # Уроков в каждый день недели по порядку DAY_CHOICES
+        self.days = days
+        # Пары (предмет, уроков в неделю), больше уроков - раньше
+        self.subjects = subjects
+        self.status = status_of(lessons)
+
+    @property
+    def total(self):
+        return self.lessons + self.extra
+
+    @property
+    def status_name(self):
+        return STATUS_NAMES[self.status]
+
+
+class Workload:
+    """Нагрузка всех учителей, отсортированных по ФИО"""
+
+    def __init__(self, teachers, lesson_days, lesson_subjects, extra):
+        # lesson_days: (учитель, день, уроков), lesson_subjects: (учитель,
+        # предмет, уроков), extra: (учитель, занятий); учитель NULL - это 0
+        lesson_counts = Counter()
+        lesson_day_counts = Counter()
+        for teacher_id, day, count in lesson_days:
+            lesson_counts[teacher_id or 0] += count
+            lesson_day_counts[teacher_id or 0, day] += count
+        subject_counts = {}
+        for teacher_id, subject_name, count in lesson_subjects:
+            subject_counts.setdefault(teacher_id or 0, []).append((subject_name, count))
+        extra_counts = Counter()
+        for teacher_id, count in extra:
+            extra_counts[teacher_id or 0] += count
+
+        # Уроки без учителя (teacher_id = 0) в строки не попадают
+        self.unassigned_lessons = lesson_counts.get(0, 0)
+        self.rows = [
+            TeacherWorkload(
+                teacher_id, full_name, post, lesson_counts.get(teacher_id, 0), extra_counts.get(teacher_id, 0),
+                [lesson_day_counts.get((teacher_id, day), 0) for day in DAYS],
+                sorted(subject_counts.get(teacher_id, ()), key=lambda pair: (-pair[1], pair[0])),
+            )
+            for teacher_id, full_name, post in teachers
+        ]
+
+    @classmethod
+    def load(cls):
+        teachers = list(Teacher.objects.order_by('full_name', 'id').values_list('id', 'full_name', 'post'))
+        # Уроки из снимка расписания: без JOIN, название предмета уже в строке
+        lessons = LessonSnapshot.objects.order_by()
+        lesson_days = lessons.values_list('teacher_id', 'day_of_week').annotate(count=Count('lesson_id'))
+        lesson_subjects = (
+            lessons.values_list('teacher_id', 'subject_id', 'subject_name').annotate(count=Count('lesson_id'))
+            .values_list('teacher_id', 'subject_name', 'count')
+        )
+        extra = (
+            ExtraSchedule.objects.filter(activity__is_active=True).order_by()
+            .values_list('activity__teacher_id').annotate(count=Count('id'))
+        )
+        return cls(teachers, lesson_days, lesson_subjects, extra)
+
+    def filtered(self, status=None):
+        if status is None:
+            return self.rows
+        return [row for row in self.rows if row.status == status]
+
+    def stats(self, rows):
+        statuses = Counter(row.status for row in rows)
+        lessons = sum(row.lessons for row in rows)
+        return {
+            'total_teachers': len(rows),
+            'underloaded': statuses[UNDERLOAD],
+            'normal_load': statuses[NORMAL],
+            'overloaded': statuses[OVERLOAD],
+            'total_lessons': lessons,
+            'total_extra': sum(row.extra for row in rows),
+            'average_lessons': lessons / len(rows) if rows else 0,
+            'unassigned_lessons': self.unassigned_lessons,
+        }
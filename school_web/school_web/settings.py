@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время запроса включало все остальные middleware
+    'main.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +54,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Профилирование запросов (main.profiling): заголовок Server-Timing и журнал
+# медленных запросов. Выключенное middleware не участвует в обработке запросов
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '0') == '1'
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+SLOW_REQUEST_LOG = os.environ.get('SLOW_REQUEST_LOG', BASE_DIR / 'logs' / 'slow_requests.jsonl')
+
 ROOT_URLCONF = 'school_web.urls'
 
 TEMPLATES = [
@@ -73,13 +83,87 @@ WSGI_APPLICATION = 'school_web.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Профиль производительности SQLite (отключается SQLITE_PERFORMANCE=0):
+# WAL позволяет читать во время записи, busy_timeout ждет блокировку вместо
+# ошибки "database is locked", IMMEDIATE-транзакции берут блокировку записи сразу
+# и не упираются в нее посреди транзакции.
+SQLITE_PERFORMANCE = os.environ.get('SQLITE_PERFORMANCE', '1') != '0'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Отрицательное значение - размер в КиБ, а не в страницах
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Тестовая БД в файле, а не в общей памяти: там SQLite блокирует таблицы
+        # без ожидания busy_timeout, и тесты одновременной записи падают с "table is locked";
+        # к файлу подключается и другой процесс (OccupancyProcessTests). pid в имени -
+        # чтобы одновременные прогоны тестов не удаляли и не затирали БД друг друга
+        'TEST': {'NAME': os.environ.get(
+            'SQLITE_TEST_NAME', os.path.join(tempfile.gettempdir(), f'school_web_test_{os.getpid()}.sqlite3'),
+        )},
     }
 }
 
+if SQLITE_PERFORMANCE:
+    DATABASES['default'].update({
+        # Соединение живет между запросами, чтобы не выполнять PRAGMA заново
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Кэши общие для всех процессов сервера и команд manage.py: в них версии
+# сетки расписания, индекса занятости и расписаний API (main.stamps),
+# страницы отчетов.
+# Файловый кэш в CACHE_DIR общий для процессов одной машины; если серверов
+# несколько, укажите здесь Redis или Memcached. Кэш в памяти процесса
+# (LocMemCache) не подходит: изменения в других процессах его не сбросят.
+CACHE_DIR = Path(os.environ.get('CACHE_DIR', BASE_DIR / 'cache'))
+
+# Кэш отчетов (алиас 'reports') - отдельный каталог, чтобы страницы отчетов
+# не вытесняли версии расписаний
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', CACHE_DIR / 'reports')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'default',
+        # Ключи разделены по БД (main.caches)
+        'KEY_FUNCTION': 'main.caches.make_key',
+        # Версии расписаний (main.stamps) - по ключу на каждого учителя, класс и кабинет;
+        # при вытеснении версия меняется и календари рендерятся заново
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': REPORT_CACHE_DIR,
+        'KEY_FUNCTION': 'main.caches.make_key',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,6 +205,28 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Сюда collectstatic собирает статику, отсюда ее раздает main.static_views.serve
+STATIC_ROOT = os.environ.get('STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+# В продакшене имена файлов с хэшем содержимого и сжатые копии .gz/.br;
+# при DEBUG (и в тестах) manifest не нужен, файлы берутся из static/ приложений
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'main.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
+# Готовые календари .ics (main.ics), по одному файлу на класс, учителя и кабинет
+ICS_FEED_DIR = os.environ.get('ICS_FEED_DIR', BASE_DIR / 'feeds')
+# Прежние версии календаря удаляются, когда им больше стольких секунд
+ICS_FEED_MAX_AGE = int(os.environ.get('ICS_FEED_MAX_AGE', 10 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
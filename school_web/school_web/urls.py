@@ -1,14 +1,12 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from main import static_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', include('main.urls'))
-] + static(settings.STATIC_URL, document_root=settings.STATIC_URL)
-
-
-if settings.DEBUG:
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path('', include('main.urls')),
+    # Статика с заранее сжатыми копиями и долгим кэшированием хэшированных имен
+    re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.*)$', static_views.serve, name='static'),
+]
\ No newline at end of file